@@ -1,67 +1,75 @@
+import threading
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor, IsolationForest
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
-from database import get_yakit_data, get_arac_takip_data, get_agirlik_data
-import pickle
-import os
-from datetime import datetime, timedelta
+from snapshot_store import load_table, watermark
+import feature_store
+from model_registry import kaydet, yukle, guncel_mi, veri_watermark, egitim_kilidi
 
 class YakitTahminModeli:
     """Yakıt tüketim tahmini için AI modeli"""
 
+    MODEL_ADI = 'yakit_tahmin'
+    TABLOLAR = ('yakit', 'arac_takip')
+
     def __init__(self):
         self.model = None
         self.scaler = StandardScaler()
         self.feature_names = []
+        self.egitim_sonucu = None
+        self._plaka_ozellikleri = None
+
+    def hazirla(self):
+        """Kayıtlı modeli yükle; kayıt yoksa veya veri değiştiyse yeniden eğit"""
+        if self.model is not None:
+            return self.egitim_sonucu
+
+        with egitim_kilidi(self.MODEL_ADI):
+            nesne, meta = yukle(self.MODEL_ADI)
+            if nesne is not None and guncel_mi(meta, self.TABLOLAR):
+                self.model = nesne['model']
+                self.scaler = nesne['scaler']
+                self.feature_names = list(nesne['feature_names'])
+                self.egitim_sonucu = meta['sonuc']
+                return self.egitim_sonucu
+
+            return self.egit()
 
     def veri_hazirla(self):
         """Veritabanından veri çek ve özellik mühendisliği yap"""
-        yakit_data = get_yakit_data()
-        arac_takip_data = get_arac_takip_data()
+        # Tipli snapshot'lar: tarihler datetime, sayısal kolonlar float, plaka categorical
+        df_yakit = load_table('yakit')
+        # Plaka özellikleri tahminle aynı kaynaktan (feature_store)
+        ozellikler = feature_store.plaka_ozellikleri()
+        takip_var = watermark('arac_takip')['satir_sayisi'] > 0
 
-        if not yakit_data or len(yakit_data) < 10:
+        if len(df_yakit) < 10:
             return None, None
 
-        df_yakit = pd.DataFrame(yakit_data)
-        df_arac = pd.DataFrame(arac_takip_data) if arac_takip_data else pd.DataFrame()
+        # get_yakit_data ile aynı sıra (islem_tarihi.desc); train/test bölmesi değişmesin
+        df_yakit = df_yakit.sort_values('islem_tarihi', ascending=False, kind='stable',
+                                        na_position='first', ignore_index=True)
 
         # Tarih özelliklerini çıkar
-        df_yakit['islem_tarihi'] = pd.to_datetime(df_yakit['islem_tarihi'], errors='coerce')
         df_yakit['gun'] = df_yakit['islem_tarihi'].dt.day
         df_yakit['ay'] = df_yakit['islem_tarihi'].dt.month
         df_yakit['haftanin_gunu'] = df_yakit['islem_tarihi'].dt.dayofweek
 
-        # Plaka bazlı özellikler
-        plaka_stats = df_yakit.groupby('plaka').agg({
-            'yakit_miktari': ['mean', 'std', 'count'],
-            'km_bilgisi': 'mean'
-        }).reset_index()
-
-        plaka_stats.columns = ['plaka', 'ort_yakit', 'std_yakit', 'sefer_sayisi', 'ort_km']
-        df_yakit = df_yakit.merge(plaka_stats, on='plaka', how='left')
-
-        # Araç takip verisiyle birleştir
-        if not df_arac.empty:
-            df_arac['tarih'] = pd.to_datetime(df_arac['tarih'], errors='coerce')
-            df_arac_grouped = df_arac.groupby('plaka').agg({
-                'toplam_kilometre': 'mean',
-                'maksimum_hiz': 'mean',
-                'gunluk_yakit_tuketimi_l': 'mean'
-            }).reset_index()
-
-            df_arac_grouped.columns = ['plaka', 'ort_km_takip', 'ort_max_hiz', 'ort_gunluk_yakit']
-            df_yakit = df_yakit.merge(df_arac_grouped, on='plaka', how='left')
+        # Plaka bazlı özellikler (araç takip ortalamaları dahil)
+        kolonlar = feature_store.OZELLIKLER + (feature_store.TAKIP_OZELLIKLERI if takip_var else [])
+        df_yakit = df_yakit.join(ozellikler[kolonlar], on='plaka')
 
-        # Eksik değerleri doldur
-        df_yakit = df_yakit.fillna(0)
+        # Eksik değerleri doldur (categorical/tarih kolonlarına 0 yazılamaz, sadece sayısallar)
+        sayisal = df_yakit.select_dtypes(include='number').columns
+        df_yakit[sayisal] = df_yakit[sayisal].fillna(0)
 
         # Özellikler ve hedef
         feature_cols = ['gun', 'ay', 'haftanin_gunu', 'ort_yakit', 'std_yakit',
                        'sefer_sayisi', 'ort_km']
 
-        if not df_arac.empty:
+        if takip_var:
             feature_cols.extend(['ort_km_takip', 'ort_max_hiz', 'ort_gunluk_yakit'])
 
         self.feature_names = feature_cols
@@ -78,7 +86,9 @@ class YakitTahminModeli:
         return X, y
 
     def egit(self):
-        """Modeli eğit"""
+        """Modeli eğit ve model kaydına yeni sürüm olarak yaz"""
+        # Watermark veriden önce alınır: arada yeni satır gelirse model eski sayılır
+        wm = veri_watermark(self.TABLOLAR)
         X, y = self.veri_hazirla()
 
         if X is None or len(X) < 10:
@@ -110,9 +120,9 @@ class YakitTahminModeli:
         test_score = self.model.score(X_test, y_test)
 
         # Özellik önemleri
-        feature_importance = dict(zip(self.feature_names, self.model.feature_importances_))
+        feature_importance = dict(zip(self.feature_names, self.model.feature_importances_.tolist()))
 
-        return {
+        self.egitim_sonucu = {
             'status': 'success',
             'train_score': round(train_score, 3),
             'test_score': round(test_score, 3),
@@ -121,109 +131,209 @@ class YakitTahminModeli:
             'test_samples': len(X_test)
         }
 
-    def tahmin_yap(self, plaka, tarih=None):
-        """Belirli bir plaka için yakıt tüketimi tahmini yap"""
-        if self.model is None:
-            egit_result = self.egit()
-            if egit_result['status'] == 'error':
-                return egit_result
-
-        yakit_data = get_yakit_data()
-        df_yakit = pd.DataFrame(yakit_data)
-
-        # Plaka istatistikleri
-        plaka_data = df_yakit[df_yakit['plaka'] == plaka]
-
-        if plaka_data.empty:
+        try:
+            kaydet(self.MODEL_ADI,
+                   {'model': self.model, 'scaler': self.scaler, 'feature_names': self.feature_names},
+                   {'watermark': wm, 'feature_names': self.feature_names, 'sonuc': self.egitim_sonucu})
+        except Exception as e:
+            print(f"⚠️ Yakıt tahmin modeli kaydedilemedi: {e}")
+
+        return self.egitim_sonucu
+
+    def plaka_ozellikleri(self):
+        """
+        Plaka başına sabit tahmin özellikleri (feature_store, eğitimle aynı değerler)
+
+        Sonuç örnek içinde saklanır; aynı model nesnesiyle yapılan tahminler
+        özellik tablosunu yeniden kontrol etmez. Eksik değerler NaN bırakılır,
+        matris kurulurken eğitimdeki gibi 0 yazılır.
+        """
+        if self._plaka_ozellikleri is None:
+            self._plaka_ozellikleri = feature_store.plaka_ozellikleri()
+        return self._plaka_ozellikleri
+
+    def _ozellik_matrisi(self, ozellik, tarihler):
+        """Bir plakanın özellik satırını verilen tarihler için matrise aç (satır başına bir gün)"""
+        tarihler = pd.DatetimeIndex(tarihler)
+        kolonlar = {
+            'gun': tarihler.day,
+            'ay': tarihler.month,
+            'haftanin_gunu': tarihler.dayofweek,
+        }
+        sabit = ozellik.fillna(0)
+        return np.column_stack([
+            np.asarray(kolonlar[col], dtype=float) if col in kolonlar
+            else np.full(len(tarihler), float(sabit[col]))
+            for col in self.feature_names
+        ])
+
+    def tahmin_araligi(self, plaka, baslangic=None, gun_sayisi=30, bitis=None):
+        """
+        Bir plaka için ardışık günlerin tahmini: tek matris, tek predict çağrısı
+
+        bitis verilirse baslangic-bitis aralığı (dahil), verilmezse baslangic'tan
+        itibaren gun_sayisi gün tahmin edilir.
+        """
+        egit_result = self.hazirla()
+        if egit_result['status'] == 'error':
+            return egit_result
+
+        ozellikler = self.plaka_ozellikleri()
+        if plaka not in ozellikler.index:
             return {
                 'status': 'error',
                 'message': f'Plaka {plaka} için veri bulunamadı'
             }
 
-        # Tarih bilgisi
-        if tarih is None:
-            tarih = datetime.now()
+        baslangic = pd.Timestamp.now() if baslangic is None else pd.to_datetime(baslangic)
+        if bitis is not None:
+            tarihler = pd.date_range(baslangic.normalize(), pd.to_datetime(bitis).normalize(), freq='D')
         else:
-            tarih = pd.to_datetime(tarih)
-
-        # Özellikler
-        features = {
-            'gun': tarih.day,
-            'ay': tarih.month,
-            'haftanin_gunu': tarih.dayofweek,
-            'ort_yakit': plaka_data['yakit_miktari'].mean(),
-            'std_yakit': plaka_data['yakit_miktari'].std(),
-            'sefer_sayisi': len(plaka_data),
-            'ort_km': plaka_data['km_bilgisi'].mean()
+            tarihler = pd.date_range(baslangic, periods=int(gun_sayisi), freq='D')
+
+        if len(tarihler) == 0:
+            return {
+                'status': 'error',
+                'message': 'Geçersiz tarih aralığı'
+            }
+
+        X = self._ozellik_matrisi(ozellikler.loc[plaka], tarihler)
+        tahminler = self.model.predict(self.scaler.transform(X))
+
+        sonuc = [
+            {'gun': i + 1, 'tarih': tarih, 'tahmin': round(float(tahmin), 2)}
+            for i, (tarih, tahmin) in enumerate(zip(tarihler.strftime('%Y-%m-%d'), tahminler))
+        ]
+
+        return {
+            'status': 'success',
+            'plaka': plaka,
+            'gun_sayisi': len(sonuc),
+            'tahminler': sonuc,
+            'toplam_tahmin': round(sum(t['tahmin'] for t in sonuc), 2)
         }
 
-        # Araç takip verisi varsa ekle
-        arac_takip = get_arac_takip_data()
-        if arac_takip:
-            df_arac = pd.DataFrame(arac_takip)
-            plaka_arac = df_arac[df_arac['plaka'] == plaka]
-
-            if not plaka_arac.empty:
-                features['ort_km_takip'] = plaka_arac['toplam_kilometre'].mean()
-                features['ort_max_hiz'] = plaka_arac['maksimum_hiz'].mean()
-                features['ort_gunluk_yakit'] = plaka_arac['gunluk_yakit_tuketimi_l'].mean()
-            else:
-                features['ort_km_takip'] = 0
-                features['ort_max_hiz'] = 0
-                features['ort_gunluk_yakit'] = 0
-        else:
-            features['ort_km_takip'] = 0
-            features['ort_max_hiz'] = 0
-            features['ort_gunluk_yakit'] = 0
+    def tahmin_yap(self, plaka, tarih=None):
+        """Belirli bir plaka için yakıt tüketimi tahmini yap"""
+        sonuc = self.tahmin_araligi(plaka, baslangic=tarih, gun_sayisi=1)
+        if sonuc['status'] == 'error':
+            return sonuc
 
-        # Özellikleri sırala
-        X = np.array([[features[col] for col in self.feature_names]])
-        X_scaled = self.scaler.transform(X)
+        ozellik = self.plaka_ozellikleri().loc[plaka]
+        tarih = pd.to_datetime(sonuc['tahminler'][0]['tarih'])
+        tahmin = sonuc['tahminler'][0]['tahmin']
 
-        # Tahmin
-        tahmin = self.model.predict(X_scaled)[0]
+        features = {'gun': tarih.day, 'ay': tarih.month, 'haftanin_gunu': tarih.dayofweek}
+        features.update(ozellik.to_dict())
 
         # Güven aralığı (basit yaklaşım)
-        gercek_ort = plaka_data['yakit_miktari'].mean()
-        gercek_std = plaka_data['yakit_miktari'].std()
+        gercek_ort = ozellik['ort_yakit']
+        gercek_std = ozellik['std_yakit']
 
         return {
             'status': 'success',
             'plaka': plaka,
-            'tarih': tarih.strftime('%Y-%m-%d'),
-            'tahmin': round(tahmin, 2),
+            'tarih': sonuc['tahminler'][0]['tarih'],
+            'tahmin': tahmin,
             'gercek_ortalama': round(gercek_ort, 2),
             'min_tahmin': round(tahmin - gercek_std, 2),
             'max_tahmin': round(tahmin + gercek_std, 2),
             'features': features
         }
 
-    def gelecek_ay_tahmini(self, plaka):
-        """Gelecek 30 gün için tahmin"""
-        tahminler = []
-        bugun = datetime.now()
-
-        for i in range(30):
-            tarih = bugun + timedelta(days=i)
-            tahmin = self.tahmin_yap(plaka, tarih)
-            if tahmin['status'] == 'success':
-                tahminler.append({
-                    'gun': i + 1,
-                    'tarih': tahmin['tarih'],
-                    'tahmin': tahmin['tahmin']
+    def gelecek_ay_tahmini(self, plaka, gun_sayisi=30):
+        """Bugünden itibaren gun_sayisi gün (varsayılan 30) için tahmin"""
+        return self.tahmin_araligi(plaka, gun_sayisi=gun_sayisi)
+
+    def toplu_tahmin_parcalari(self, plakalar=None, gun_sayisi=30, baslangic=None, parca_boyutu=500):
+        """
+        Plakalar x günler tahmini, parça parça üretilir (generator)
+
+        Her parça için (plaka sayısı * gün sayısı) satırlık özellik matrisi
+        np.repeat/np.tile ile kurulur ve tek predict çağrısıyla tahmin edilir.
+        Her yield bir liste döndürür: [{'plaka', 'tahminler', 'toplam_tahmin'}, ...]
+        Verisi olmayan plakalar atlanır.
+        """
+        ozellikler = self.plaka_ozellikleri()
+        if plakalar is None:
+            plakalar = sorted(ozellikler.index)
+        else:
+            plakalar = [p for p in plakalar if p in ozellikler.index]
+
+        baslangic = pd.Timestamp.now() if baslangic is None else pd.to_datetime(baslangic)
+        tarihler = pd.date_range(baslangic, periods=int(gun_sayisi), freq='D')
+        tarih_metinleri = list(tarihler.strftime('%Y-%m-%d'))
+        gun_kolonlari = {
+            'gun': np.asarray(tarihler.day, dtype=float),
+            'ay': np.asarray(tarihler.month, dtype=float),
+            'haftanin_gunu': np.asarray(tarihler.dayofweek, dtype=float),
+        }
+        gun = len(tarihler)
+
+        for i in range(0, len(plakalar), parca_boyutu):
+            parca = plakalar[i:i + parca_boyutu]
+            sabit = ozellikler.loc[parca].fillna(0)
+
+            X = np.column_stack([
+                np.tile(gun_kolonlari[col], len(parca)) if col in gun_kolonlari
+                else np.repeat(sabit[col].to_numpy(dtype=float), gun)
+                for col in self.feature_names
+            ])
+            tahminler = self.model.predict(self.scaler.transform(X)).reshape(len(parca), gun)
+
+            sonuclar = []
+            for plaka, satir in zip(parca, tahminler):
+                gunluk = [round(float(t), 2) for t in satir]
+                sonuclar.append({
+                    'plaka': plaka,
+                    'tahminler': [{'gun': j + 1, 'tarih': tarih, 'tahmin': t}
+                                  for j, (tarih, t) in enumerate(zip(tarih_metinleri, gunluk))],
+                    'toplam_tahmin': round(sum(gunluk), 2)
                 })
+            yield sonuclar
+
+    def toplu_tahmin(self, plakalar=None, gun_sayisi=30, baslangic=None):
+        """toplu_tahmin_parcalari sonuçlarının tamamı tek liste olarak"""
+        egit_result = self.hazirla()
+        if egit_result['status'] == 'error':
+            return egit_result
+
+        sonuclar = []
+        for parca in self.toplu_tahmin_parcalari(plakalar, gun_sayisi, baslangic):
+            sonuclar.extend(parca)
 
         return {
             'status': 'success',
-            'plaka': plaka,
-            'tahminler': tahminler,
-            'toplam_tahmin': round(sum(t['tahmin'] for t in tahminler), 2)
+            'gun_sayisi': int(gun_sayisi),
+            'sonuclar': sonuclar
         }
 
 
+class AnomaliReferans:
+    """
+    Anomali açıklamaları için referans istatistikleri
+
+    Skorlama başına bir kez hesaplanır ve _anomali_sebebi/_anomali_sebep_analiz'e
+    verilir; her anomali satırı için tablo yeniden okunmaz.
+    """
+
+    def __init__(self, df):
+        self.ort_yakit = df['yakit_miktari'].mean()
+        self.std_yakit = df['yakit_miktari'].std()
+        self.ort_fiyat = df['birim_fiyat'].mean()
+        self.plaka_ort_yakit = df.groupby('plaka', observed=True)['yakit_miktari'].mean().to_dict()
+
+    def plaka_ortalamasi(self, plaka):
+        """Plakanın ortalama yakıtı; plakanın kaydı yoksa genel ortalama"""
+        return self.plaka_ort_yakit.get(plaka, self.ort_yakit)
+
+
 class AnomalTespitModeli:
     """Anormal yakıt tüketimi tespiti için AI modeli"""
 
+    MODEL_ADI = 'anomali_tespit'
+    TABLOLAR = ('yakit',)
+
     def __init__(self):
         self.model = IsolationForest(
             contamination=0.1,  # %10 anomali bekliyoruz
@@ -232,43 +342,43 @@ class AnomalTespitModeli:
         )
         self.scaler = StandardScaler()
         self.egitildi = False
+        self.egitim_sonucu = None
+
+    def hazirla(self):
+        """Kayıtlı modeli yükle; kayıt yoksa veya veri değiştiyse yeniden eğit"""
+        if self.egitildi:
+            return self.egitim_sonucu
+
+        with egitim_kilidi(self.MODEL_ADI):
+            nesne, meta = yukle(self.MODEL_ADI)
+            if nesne is not None and guncel_mi(meta, self.TABLOLAR):
+                self.model = nesne['model']
+                self.scaler = nesne['scaler']
+                self.egitildi = True
+                self.egitim_sonucu = meta['sonuc']
+                return self.egitim_sonucu
+
+            return self.egit()
 
     def egit(self):
-        """Modeli eğit"""
-        yakit_data = get_yakit_data()
+        """Modeli eğit ve model kaydına yeni sürüm olarak yaz"""
+        wm = veri_watermark(self.TABLOLAR)
+        df = load_table('yakit')
 
-        if not yakit_data or len(yakit_data) < 20:
+        if len(df) < 20:
             return {
                 'status': 'error',
                 'message': 'Yetersiz veri. En az 20 kayıt gerekli.'
             }
 
-        df = pd.DataFrame(yakit_data)
-
-        # Özellikler: yakıt miktarı, km bilgisi, birim fiyat
-        features = []
-        valid_indices = []
-
-        for idx, row in df.iterrows():
-            yakit = row.get('yakit_miktari')
-            km = row.get('km_bilgisi')
-            fiyat = row.get('birim_fiyat')
+        X = self._ozellikler(self._gecerli_kayitlar(df))
 
-            if yakit and yakit > 0:
-                features.append([
-                    float(yakit),
-                    float(km) if km else 0,
-                    float(fiyat) if fiyat else 0
-                ])
-                valid_indices.append(idx)
-
-        if len(features) < 20:
+        if len(X) < 20:
             return {
                 'status': 'error',
                 'message': 'Geçerli veri yetersiz'
             }
 
-        X = np.array(features)
         X_scaled = self.scaler.fit_transform(X)
 
         # Modeli eğit
@@ -279,74 +389,120 @@ class AnomalTespitModeli:
         predictions = self.model.predict(X_scaled)
         anomaly_count = (predictions == -1).sum()
 
-        return {
+        self.egitim_sonucu = {
             'status': 'success',
-            'total_samples': len(features),
+            'total_samples': len(X),
             'anomaly_count': int(anomaly_count),
-            'anomaly_percentage': round(anomaly_count / len(features) * 100, 2)
+            'anomaly_percentage': round(float(anomaly_count / len(X) * 100), 2)
+        }
+
+        try:
+            kaydet(self.MODEL_ADI,
+                   {'model': self.model, 'scaler': self.scaler},
+                   {'watermark': wm, 'feature_names': ['yakit_miktari', 'km_bilgisi', 'birim_fiyat'],
+                    'sonuc': self.egitim_sonucu})
+        except Exception as e:
+            print(f"⚠️ Anomali modeli kaydedilemedi: {e}")
+
+        return self.egitim_sonucu
+
+    @staticmethod
+    def _gecerli_kayitlar(df):
+        """yakit_miktari > 0 olan kayıtlar, get_yakit_data ile aynı sırada (islem_tarihi.desc)"""
+        df = df.sort_values('islem_tarihi', ascending=False, kind='stable',
+                            na_position='first', ignore_index=True)
+        return df[df['yakit_miktari'] > 0].reset_index(drop=True)
+
+    @staticmethod
+    def _ozellikler(df):
+        """Özellik matrisi: yakıt miktarı, km bilgisi, birim fiyat (eksik km/fiyat 0)"""
+        return df[['yakit_miktari', 'km_bilgisi', 'birim_fiyat']].fillna(0).to_numpy(dtype=float)
+
+    def _skorla(self, df):
+        """
+        Tüm geçerli yakıt kayıtlarını tek seferde skorla
+
+        Özellik matrisi bir kez kurulur; score_samples tek çağrıda çalışır ve
+        predict ile aynı eşik (offset_) kullanılarak anomaliler işaretlenir.
+        """
+        df = self._gecerli_kayitlar(df)
+
+        if df.empty:
+            df['anomali_skoru'] = pd.Series(dtype='float64')
+            df['anomali'] = pd.Series(dtype='bool')
+            return df
+
+        skorlar = self.model.score_samples(self.scaler.transform(self._ozellikler(df)))
+
+        df['anomali_skoru'] = skorlar
+        df['anomali'] = skorlar - self.model.offset_ < 0
+        return df
+
+    @staticmethod
+    def _kayitlar(df):
+        """Anomali satırlarını sebep fonksiyonlarının beklediği dict'lere çevir (NaN -> None)"""
+        df = df.copy()
+        df['islem_tarihi'] = df['islem_tarihi'].dt.strftime('%Y-%m-%d')
+        df['plaka'] = df['plaka'].astype(object)
+        return df.astype(object).where(df.notna(), None).to_dict('records')
+
+    @staticmethod
+    def _anomali_kaydi(row):
+        km = row.get('km_bilgisi')
+        fiyat = row.get('birim_fiyat')
+        return {
+            'plaka': row.get('plaka'),
+            'tarih': row.get('islem_tarihi'),
+            'yakit_miktari': float(row['yakit_miktari']),
+            'km_bilgisi': float(km) if km else 0,
+            'birim_fiyat': float(fiyat) if fiyat else 0,
+            'anomali_skoru': round(float(row['anomali_skoru']), 3)
         }
 
     def anomali_tespit(self):
         """Tüm verilerde anomali tespit et"""
-        if not self.egitildi:
-            egit_result = self.egit()
-            if egit_result['status'] == 'error':
-                return egit_result
+        egit_result = self.hazirla()
+        if egit_result['status'] == 'error':
+            return egit_result
 
-        yakit_data = get_yakit_data()
-        df = pd.DataFrame(yakit_data)
+        tum_kayitlar = load_table('yakit')
+        referans = AnomaliReferans(tum_kayitlar)
+        df = self._skorla(tum_kayitlar)
+        kayitlar = self._kayitlar(df[df['anomali']])
 
-        anomaliler = []
+        anomaliler = [(self._anomali_kaydi(row), row) for row in kayitlar]
 
-        for idx, row in df.iterrows():
-            yakit = row.get('yakit_miktari')
-            km = row.get('km_bilgisi')
-            fiyat = row.get('birim_fiyat')
-
-            if yakit and yakit > 0:
-                X = np.array([[
-                    float(yakit),
-                    float(km) if km else 0,
-                    float(fiyat) if fiyat else 0
-                ]])
-                X_scaled = self.scaler.transform(X)
-
-                prediction = self.model.predict(X_scaled)[0]
-                score = self.model.score_samples(X_scaled)[0]
-
-                if prediction == -1:
-                    anomaliler.append({
-                        'plaka': row.get('plaka'),
-                        'tarih': row.get('islem_tarihi'),
-                        'yakit_miktari': float(yakit),
-                        'km_bilgisi': float(km) if km else 0,
-                        'birim_fiyat': float(fiyat) if fiyat else 0,
-                        'anomali_skoru': round(float(score), 3),
-                        'sebep': self._anomali_sebebi(row)
-                    })
-
-        # En kötü 20 anomaliyi döndür
-        anomaliler.sort(key=lambda x: x['anomali_skoru'])
+        # En kötü 20 anomaliyi döndür (sebep sadece gösterilenler için hesaplanır)
+        anomaliler.sort(key=lambda x: x[0]['anomali_skoru'])
+        ilk_20 = []
+        for anomali, row in anomaliler[:20]:
+            anomali['sebep'] = self._anomali_sebebi(row, referans)
+            ilk_20.append(anomali)
 
         return {
             'status': 'success',
             'toplam_anomali': len(anomaliler),
-            'anomaliler': anomaliler[:20]
+            'anomaliler': ilk_20
         }
 
     def anomali_tespit_detayli(self, plaka_filtre=None, tip_filtre=None, baslangic_tarihi=None, bitis_tarihi=None):
         """Dashboard için detaylı anomali analizi - filtreleme destekli"""
-        if not self.egitildi:
-            egit_result = self.egit()
-            if egit_result['status'] == 'error':
-                return egit_result
-
-        yakit_data = get_yakit_data()
-        df = pd.DataFrame(yakit_data)
-
-        # Tarih filtreleme için tarihleri datetime'a çevir
-        if baslangic_tarihi or bitis_tarihi:
-            df['islem_tarihi_dt'] = pd.to_datetime(df['islem_tarihi'], errors='coerce')
+        egit_result = self.hazirla()
+        if egit_result['status'] == 'error':
+            return egit_result
+
+        tum_kayitlar = load_table('yakit')
+        referans = AnomaliReferans(tum_kayitlar)
+        df = self._skorla(tum_kayitlar)
+
+        # Plaka ve tarih filtreleri maske olarak uygulanır (tarihi olmayan kayıtlar elenmez)
+        maske = df['anomali'].copy()
+        if plaka_filtre:
+            maske &= df['plaka'] == plaka_filtre
+        if baslangic_tarihi:
+            maske &= df['islem_tarihi'].isna() | (df['islem_tarihi'] >= pd.to_datetime(baslangic_tarihi))
+        if bitis_tarihi:
+            maske &= df['islem_tarihi'].isna() | (df['islem_tarihi'] <= pd.to_datetime(bitis_tarihi))
 
         anomaliler = []
         plaka_anomali_sayisi = {}
@@ -357,71 +513,27 @@ class AnomalTespitModeli:
             'anormal_fiyat': 0
         }
 
-        for idx, row in df.iterrows():
-            yakit = row.get('yakit_miktari')
-            km = row.get('km_bilgisi')
-            fiyat = row.get('birim_fiyat')
+        for row in self._kayitlar(df[maske]):
+            sebep_data = self._anomali_sebep_analiz(row, referans)
+
+            # Tip filtresi
+            if tip_filtre and sebep_data['tip'] != tip_filtre:
+                continue
+
+            anomali = self._anomali_kaydi(row)
+            anomali['sebep'] = sebep_data['sebep_text']
+            anomali['tip'] = sebep_data['tip']
+            anomaliler.append(anomali)
+
+            # Plaka bazlı sayım
             plaka = row.get('plaka')
+            if plaka not in plaka_anomali_sayisi:
+                plaka_anomali_sayisi[plaka] = 0
+            plaka_anomali_sayisi[plaka] += 1
 
-            if yakit and yakit > 0:
-                X = np.array([[
-                    float(yakit),
-                    float(km) if km else 0,
-                    float(fiyat) if fiyat else 0
-                ]])
-                X_scaled = self.scaler.transform(X)
-
-                prediction = self.model.predict(X_scaled)[0]
-                score = self.model.score_samples(X_scaled)[0]
-
-                if prediction == -1:
-                    sebep_data = self._anomali_sebep_analiz(row)
-
-                    # Filtreleme kontrolü
-                    anomali_gecerli = True
-
-                    # Plaka filtresi
-                    if plaka_filtre and plaka != plaka_filtre:
-                        anomali_gecerli = False
-
-                    # Tip filtresi
-                    if tip_filtre and sebep_data['tip'] != tip_filtre:
-                        anomali_gecerli = False
-
-                    # Tarih filtresi
-                    if baslangic_tarihi or bitis_tarihi:
-                        tarih_dt = row.get('islem_tarihi_dt')
-                        if pd.notna(tarih_dt):
-                            if baslangic_tarihi:
-                                baslangic_dt = pd.to_datetime(baslangic_tarihi)
-                                if tarih_dt < baslangic_dt:
-                                    anomali_gecerli = False
-                            if bitis_tarihi:
-                                bitis_dt = pd.to_datetime(bitis_tarihi)
-                                if tarih_dt > bitis_dt:
-                                    anomali_gecerli = False
-
-                    if anomali_gecerli:
-                        anomali = {
-                            'plaka': plaka,
-                            'tarih': row.get('islem_tarihi'),
-                            'yakit_miktari': float(yakit),
-                            'km_bilgisi': float(km) if km else 0,
-                            'birim_fiyat': float(fiyat) if fiyat else 0,
-                            'anomali_skoru': round(float(score), 3),
-                            'sebep': sebep_data['sebep_text'],
-                            'tip': sebep_data['tip']
-                        }
-                        anomaliler.append(anomali)
-
-                        # Plaka bazlı sayım
-                        if plaka not in plaka_anomali_sayisi:
-                            plaka_anomali_sayisi[plaka] = 0
-                        plaka_anomali_sayisi[plaka] += 1
-
-                        # Tip bazlı sayım
-                        if sebep_data['tip']:
-                            anomali_tipleri[sebep_data['tip']] += 1
+            # Tip bazlı sayım
+            if sebep_data['tip']:
+                anomali_tipleri[sebep_data['tip']] += 1
 
         # Anomalileri skora göre sırala
         anomaliler.sort(key=lambda x: x['anomali_skoru'])
@@ -452,30 +564,20 @@ class AnomalTespitModeli:
             'tarih_dagilim': tarih_dagilim
         }
 
-    def _anomali_sebebi(self, row):
-        """Anomalinin muhtemel sebebini belirle"""
+    def _anomali_sebebi(self, row, referans=None):
+        """Anomalinin muhtemel sebebini belirle (referans verilmezse yakit tablosundan hesaplanır)"""
         yakit = row.get('yakit_miktari', 0)
         km = row.get('km_bilgisi', 0)
         fiyat = row.get('birim_fiyat', 0)
-        plaka = row.get('plaka', '')
 
         sebepler = []
         detaylar = []
 
-        # Ortalamaları hesapla
-        yakit_data = get_yakit_data()
-        df = pd.DataFrame(yakit_data)
+        if referans is None:
+            referans = AnomaliReferans(load_table('yakit'))
 
-        ort_yakit = df['yakit_miktari'].mean()
-        std_yakit = df['yakit_miktari'].std()
-        ort_fiyat = df['birim_fiyat'].mean()
-
-        # Plaka bazlı ortalamalar
-        plaka_df = df[df['plaka'] == plaka]
-        if not plaka_df.empty:
-            plaka_ort_yakit = plaka_df['yakit_miktari'].mean()
-        else:
-            plaka_ort_yakit = ort_yakit
+        ort_yakit = referans.ort_yakit
+        ort_fiyat = referans.ort_fiyat
 
         # 1. AŞIRI YÜKSEK YAKIT TÜKETİMİ (KRİTİK)
         if yakit > ort_yakit * 2:
@@ -516,20 +618,21 @@ class AnomalTespitModeli:
 
         return f"{sebep_text}\n{detay_text}" if detay_text else sebep_text
 
-    def _anomali_sebep_analiz(self, row):
+    def _anomali_sebep_analiz(self, row, referans=None):
         """Anomalinin sebebini ve tipini belirle (dashboard için)"""
         yakit = row.get('yakit_miktari', 0)
         km = row.get('km_bilgisi', 0)
         fiyat = row.get('birim_fiyat', 0)
         plaka = row.get('plaka', '')
 
-        yakit_data = get_yakit_data()
-        df = pd.DataFrame(yakit_data)
-        ort_yakit = df['yakit_miktari'].mean()
-        ort_fiyat = df['birim_fiyat'].mean()
+        if referans is None:
+            referans = AnomaliReferans(load_table('yakit'))
+
+        ort_yakit = referans.ort_yakit
+        ort_fiyat = referans.ort_fiyat
 
         tip = None
-        sebep_text = self._anomali_sebebi(row)
+        sebep_text = self._anomali_sebebi(row, referans)
 
         # Anomali tipini belirle
         if yakit > ort_yakit * 1.5:
@@ -547,37 +650,55 @@ class AnomalTespitModeli:
         }
 
 
+def _yuvarla(dizi, basamak):
+    """
+    Vektörel round(x, basamak)
+
+    np.round .5 sınırındaki değerleri Python round()'dan farklı yuvarlayabilir
+    (7377.95 -> 7378.0 / 7377.9); raporların eski çıktıyla aynı kalması için
+    sadece sınırdaki değerler Python round() ile yuvarlanır.
+    """
+    dizi = np.asarray(dizi, dtype=float)
+    sonuc = np.round(dizi, basamak)
+    olcek = dizi * 10.0 ** basamak
+    sinir = np.abs(olcek - np.floor(olcek) - 0.5) < 1e-6
+    if sinir.any():
+        sonuc[sinir] = [round(v, basamak) for v in dizi[sinir].tolist()]
+    return sonuc
+
+
 class PerformansAnalizi:
-    """Araç performans analizi - Yakıt/KM oranı ve tonaj"""
+    """
+    Araç performans analizi - Yakıt/KM oranı ve tonaj
+
+    Yüklenen DataFrame'ler salt okunurdur; aynı nesne get_performans_analizi()
+    ile eşzamanlı isteklerde paylaşılır.
+    """
+
+    TABLOLAR = ('yakit', 'agirlik')
 
     def __init__(self):
         self.yakit_data = None
         self.agirlik_data = None
+        self._ozet = None
+        self._ozet_lock = threading.Lock()
 
     def veri_yukle(self):
         """Verileri yükle"""
-        self.yakit_data = pd.DataFrame(get_yakit_data())
-        self.agirlik_data = pd.DataFrame(get_agirlik_data())
-
-        if not self.yakit_data.empty:
-            self.yakit_data['islem_tarihi'] = pd.to_datetime(self.yakit_data['islem_tarihi'], errors='coerce')
-
-        if not self.agirlik_data.empty:
-            self.agirlik_data['tarih'] = pd.to_datetime(self.agirlik_data['tarih'], errors='coerce')
-
-    def plaka_performans_karsilastirma(self, ana_malzeme_filtre=None, arac_tipi_filtre=None):
-        """Tüm plakaların performansını karşılaştır"""
-        if self.yakit_data is None:
-            self.veri_yukle()
-
-        if self.yakit_data.empty:
-            return {
-                'status': 'error',
-                'message': 'Yakıt verisi bulunamadı'
-            }
-
+        # Tipli snapshot'lar (islem_tarihi/tarih zaten datetime)
+        self.yakit_data = load_table('yakit')
+        self.agirlik_data = load_table('agirlik')
+
+    def _plaka_ozeti(self):
+        """Filtreden bağımsız plaka toplamları (yakıt, km, tutar, tonaj); bir kez hesaplanır"""
+        with self._ozet_lock:
+            if self._ozet is None:
+                self._ozet = self._plaka_ozeti_hesapla()
+            return self._ozet
+
+    def _plaka_ozeti_hesapla(self):
         # Plaka bazlı yakıt ve KM bilgileri
-        yakit_stats = self.yakit_data.groupby('plaka').agg({
+        yakit_stats = self.yakit_data.groupby('plaka', observed=True).agg({
             'yakit_miktari': 'sum',
             'km_bilgisi': 'sum',
             'satir_tutari': 'sum'
@@ -585,17 +706,17 @@ class PerformansAnalizi:
 
         # Plaka bazlı tonaj ve ANA MALZEME bilgileri
         if not self.agirlik_data.empty:
-            # miktar sütununu numeric'e çevir
-            self.agirlik_data['miktar'] = pd.to_numeric(self.agirlik_data['miktar'], errors='coerce')
+            # miktar sütununu numeric'e çevir (paylaşılan DataFrame değiştirilmez)
+            miktar = pd.to_numeric(self.agirlik_data['miktar'], errors='coerce')
 
             # Sadece miktar > 0 ve birim = 'Kg' olanları al
             agirlik_filtered = self.agirlik_data[
-                (self.agirlik_data['miktar'].notna()) &
-                (self.agirlik_data['miktar'] > 0) &
+                (miktar.notna()) &
+                (miktar > 0) &
                 (self.agirlik_data['birim'] == 'Kg')
-            ].copy()
+            ].assign(miktar=miktar)
 
-            tonaj_stats = agirlik_filtered.groupby('plaka').agg({
+            tonaj_stats = agirlik_filtered.groupby('plaka', observed=True).agg({
                 'miktar': 'sum',
                 'ana_malzeme': 'first'
             }).reset_index()
@@ -607,13 +728,24 @@ class PerformansAnalizi:
         performans = yakit_stats.merge(tonaj_stats, on='plaka', how='left')
         performans['toplam_tonaj'] = performans['toplam_tonaj'].fillna(0)
         performans['ana_malzeme'] = performans['ana_malzeme'].fillna('Bilinmiyor')
+        return performans
 
-        # Araç tipi bilgisini araclar tablosundan ekle
-        from database import fetch_all_paginated
-        araclar_data = fetch_all_paginated('araclar', select='plaka,arac_tipi')
-        araclar_df = pd.DataFrame(araclar_data)
+    def plaka_performans_karsilastirma(self, ana_malzeme_filtre=None, arac_tipi_filtre=None):
+        """Tüm plakaların performansını karşılaştır"""
+        if self.yakit_data is None:
+            self.veri_yukle()
+
+        if self.yakit_data.empty:
+            return {
+                'status': 'error',
+                'message': 'Yakıt verisi bulunamadı'
+            }
+
+        # Araç tipi bilgisini araclar tablosundan ekle (araç ekleme/güncellemede önbellek silinir)
+        from database import get_all_araclar
+        araclar_df = pd.DataFrame(get_all_araclar(), columns=['plaka', 'arac_tipi'])
 
-        performans = performans.merge(araclar_df, on='plaka', how='left')
+        performans = self._plaka_ozeti().merge(araclar_df, on='plaka', how='left')
         performans['arac_tipi'] = performans['arac_tipi'].fillna('KARGO ARACI')
 
         # ARAÇ TİPİ FİLTRESİ UYGULA (ÇOK ÖNEMLİ!)
@@ -654,11 +786,9 @@ class PerformansAnalizi:
                 'message': 'Seçili kriterlerde geçerli veri bulunamadı (yakıt ve km verisi olan araç yok)'
             }
 
-        # Hesaplamalar
-        performans['km_litre_orani'] = performans.apply(
-            lambda row: round(row['km_bilgisi'] / row['yakit_miktari'], 2)
-            if row['yakit_miktari'] > 0 else 0, axis=1
-        )
+        # Hesaplamalar (yakıt ve km burada her zaman > 0)
+        performans = performans.copy()
+        performans['km_litre_orani'] = _yuvarla(performans['km_bilgisi'] / performans['yakit_miktari'], 2)
 
         # ANORMAL YÜKSEK KM/L ORANLARINI FİLTRELE (büyük ihtimalle hatalı veri)
         # Kamyonlar için maksimum 50 km/L, iş makineleri için 30 km/L, binek için 100 km/L mantıklı
@@ -671,7 +801,7 @@ class PerformansAnalizi:
         else:
             max_km_litre = 100
 
-        performans = performans[performans['km_litre_orani'] <= max_km_litre]
+        performans = performans[performans['km_litre_orani'] <= max_km_litre].copy()
 
         # Eğer filtrelemeden sonra veri kalmadıysa
         if performans.empty:
@@ -680,21 +810,13 @@ class PerformansAnalizi:
                 'message': 'Geçerli veri bulunamadı (tüm veriler anormal yüksek veya düşük değerlere sahip)'
             }
 
-        performans['km_basina_maliyet'] = performans.apply(
-            lambda row: round(row['satir_tutari'] / row['km_bilgisi'], 2)
-            if row['km_bilgisi'] > 0 else 0, axis=1
-        )
+        km_litre = performans['km_litre_orani'].to_numpy()
+        performans['km_basina_maliyet'] = _yuvarla(performans['satir_tutari'] / performans['km_bilgisi'], 2)
+        performans['ton_basina_yakit'] = _yuvarla((performans['toplam_tonaj'] / 1000) / performans['yakit_miktari'], 2)
 
-        performans['ton_basina_yakit'] = performans.apply(
-            lambda row: round((row['toplam_tonaj'] / 1000) / row['yakit_miktari'], 2)
-            if row['yakit_miktari'] > 0 else 0, axis=1
-        )
-
-        # Verimlilik skoru (yüksek = iyi, ters çevir)
-        performans['verimlilik_skoru'] = performans.apply(
-            lambda row: round(100 / row['km_litre_orani'], 2) if row['km_litre_orani'] > 0 else 999,
-            axis=1
-        )
+        # Verimlilik skoru (yüksek = iyi, ters çevir); km/L 0'a yuvarlandıysa 999
+        with np.errstate(divide='ignore'):
+            performans['verimlilik_skoru'] = np.where(km_litre > 0, _yuvarla(100 / km_litre, 2), 999)
 
         # Sıralama
         performans = performans.sort_values('verimlilik_skoru', ascending=False)
@@ -703,36 +825,35 @@ class PerformansAnalizi:
         en_verimli = performans.nsmallest(5, 'verimlilik_skoru').to_dict('records')
         en_verimsiz = performans.nlargest(5, 'verimlilik_skoru').to_dict('records')
 
-        veriler = []
-        for _, row in performans.iterrows():
-            veri = {
-                'plaka': row['plaka'],
-                'arac_tipi': row['arac_tipi'],
-                'toplam_yakit': round(row['yakit_miktari'], 1),
-                'toplam_km': round(row['km_bilgisi'], 0),
-                'km_litre': round(row['km_litre_orani'], 2) if row['km_litre_orani'] > 0 else None,
-                'km_maliyet': round(row['km_basina_maliyet'], 2) if row['km_basina_maliyet'] > 0 else None,
-                'verimlilik': 'İyi' if row['km_litre_orani'] > performans['km_litre_orani'].mean() else 'Kötü'
-            }
-
-            # KARGO ARACI ise ana malzeme ve tonaj ekle
-            if row['arac_tipi'] == 'KARGO ARACI':
-                veri['ana_malzeme'] = row['ana_malzeme']
-                veri['toplam_tonaj'] = round(row['toplam_tonaj'] / 1000, 2)
-                veri['ton_yakit'] = round(row['ton_basina_yakit'], 2) if row['ton_basina_yakit'] > 0 else None
-            else:
-                veri['ana_malzeme'] = row['arac_tipi']
-                veri['toplam_tonaj'] = None
-                veri['ton_yakit'] = None
-
-            veriler.append(veri)
+        # Tablo satırları kolon bazlı kurulur; ortalama bir kez hesaplanır
+        ort_km_litre = performans['km_litre_orani'].mean()
+        km_litre = performans['km_litre_orani'].to_numpy()
+        km_maliyet = performans['km_basina_maliyet'].to_numpy()
+        ton_yakit = performans['ton_basina_yakit'].to_numpy()
+        kargo = (performans['arac_tipi'] == 'KARGO ARACI').to_numpy()
+        yok = np.full(len(performans), None, dtype=object)
+
+        kolonlar = {
+            'plaka': performans['plaka'].astype(object).to_numpy(),
+            'arac_tipi': performans['arac_tipi'].to_numpy(),
+            'toplam_yakit': _yuvarla(performans['yakit_miktari'], 1),
+            'toplam_km': _yuvarla(performans['km_bilgisi'], 0),
+            'km_litre': np.where(km_litre > 0, km_litre.astype(object), yok),
+            'km_maliyet': np.where(km_maliyet > 0, km_maliyet.astype(object), yok),
+            'verimlilik': np.where(km_litre > ort_km_litre, 'İyi', 'Kötü'),
+            # KARGO ARACI ise ana malzeme ve tonaj, değilse araç tipi
+            'ana_malzeme': np.where(kargo, performans['ana_malzeme'].to_numpy(), performans['arac_tipi'].to_numpy()),
+            'toplam_tonaj': np.where(kargo, _yuvarla(performans['toplam_tonaj'] / 1000, 2).astype(object), yok),
+            'ton_yakit': np.where(kargo & (ton_yakit > 0), ton_yakit.astype(object), yok),
+        }
+        veriler = [dict(zip(kolonlar, satir)) for satir in zip(*(k.tolist() for k in kolonlar.values()))]
 
         return {
             'status': 'success',
             'tum_araclar': performans.to_dict('records'),
             'en_verimli': en_verimli,
             'en_verimsiz': en_verimsiz,
-            'ortalama_km_litre': round(performans['km_litre_orani'].mean(), 2),
+            'ortalama_km_litre': round(ort_km_litre, 2),
             'ortalama_km_maliyet': round(performans['km_basina_maliyet'].mean(), 2),
             'ortalama_ton_yakit': round(performans['ton_basina_yakit'].mean(), 2) if len(performans) > 0 else 0,
             'toplam_arac': len(performans),
@@ -818,31 +939,53 @@ class PerformansAnalizi:
         }
 
 
-def tum_plakalar_tahmini():
-    """Tüm plakalar için toplu tahmin"""
+_performans_lock = threading.Lock()
+_performans = (None, None)
+
+
+def get_performans_analizi():
+    """
+    Worker başına paylaşılan PerformansAnalizi
+
+    Veriler bir kez yüklenir ve yakit/agirlik snapshot watermark'ı değişene kadar
+    sonraki istekler (karşılaştırma, detay, PDF/Excel export) aynı nesneyi kullanır.
+    """
+    global _performans
+    surum = veri_watermark(PerformansAnalizi.TABLOLAR)
+
+    with _performans_lock:
+        if _performans[0] != surum:
+            analiz = PerformansAnalizi()
+            analiz.veri_yukle()
+            _performans = (surum, analiz)
+        return _performans[1]
+
+
+def tum_plakalar_tahmini(gun_sayisi=30):
+    """Tüm plakalar için toplu tahmin (tek model, parça başına tek predict)"""
     from database import get_all_plakas
 
     plakalar = get_all_plakas()
     model = YakitTahminModeli()
 
-    # Modeli bir kez eğit
-    egit_result = model.egit()
+    # Kayıtlı modeli kullan (veri değiştiyse bir kez eğitilir)
+    egit_result = model.hazirla()
     if egit_result['status'] == 'error':
         return egit_result
 
-    sonuclar = []
+    toplu = model.toplu_tahmin(plakalar, gun_sayisi=gun_sayisi)
+    if toplu['status'] == 'error':
+        return toplu
 
-    for plaka in plakalar[:20]:  # İlk 20 plaka
-        tahmin = model.gelecek_ay_tahmini(plaka)
-        if tahmin['status'] == 'success':
-            sonuclar.append({
-                'plaka': plaka,
-                'gelecek_ay_toplam': tahmin['toplam_tahmin']
-            })
+    sonuclar = [
+        {'plaka': sonuc['plaka'], 'gelecek_ay_toplam': sonuc['toplam_tahmin']}
+        for sonuc in toplu['sonuclar']
+    ]
 
     return {
         'status': 'success',
         'model_performansi': egit_result,
+        'gun_sayisi': toplu['gun_sayisi'],
         'plaka_tahminleri': sonuclar,
         'toplam_tahmin': round(sum(s['gelecek_ay_toplam'] for s in sonuclar), 2)
     }
@@ -1,5 +1,5 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session, Response, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
 import logging
@@ -13,38 +13,10 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-import hashlib
 import json
-import urllib.request
 
 load_dotenv()
 
-# Helper functions for data upload
-def create_record_hash(record: dict) -> str:
-    """Kayıt için benzersiz hash oluştur (duplicate kontrolü için)"""
-    key_parts = []
-    for key in sorted(record.keys()):
-        if record[key] is not None:
-            key_parts.append(f"{key}:{record[key]}")
-    hash_string = '|'.join(key_parts)
-    return hashlib.md5(hash_string.encode()).hexdigest()
-
-def get_existing_hashes(table: str) -> set:
-    """Tablodaki mevcut kayıtların hash'lerini al"""
-    try:
-        from database import SUPABASE_URL, SUPABASE_KEY
-        url = f'{SUPABASE_URL}/rest/v1/{table}?select=record_hash'
-
-        req = urllib.request.Request(url, method='GET')
-        req.add_header('apikey', SUPABASE_KEY)
-        req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
-
-        with urllib.request.urlopen(req) as response:
-            data = json.loads(response.read().decode())
-            return {row.get('record_hash') for row in data if row.get('record_hash')}
-    except:
-        return set()
-
 app = Flask(__name__)
 CORS(app)
 app.secret_key = 'your-secret-key-here'
@@ -63,6 +35,13 @@ logger.info(f"SUPABASE_URL var mı: {bool(os.environ.get('VITE_SUPABASE_URL') or
 logger.info(f"SUPABASE_KEY var mı: {bool(os.environ.get('VITE_SUPABASE_ANON_KEY') or os.environ.get('SUPABASE_ANAHTAR'))}")
 logger.info("=" * 50)
 
+# Yarım kalan Excel yükleme işleri (yeniden başlatma) bu process'te devam etsin
+try:
+    import upload_jobs
+    upload_jobs.baslat()
+except Exception as e:
+    logger.error(f"Upload job worker başlatılamadı: {e}")
+
 @app.route('/health')
 def health_check():
     """Health check endpoint for Railway"""
@@ -153,215 +132,37 @@ def api_upload_excel():
         if not file.filename.endswith(('.xlsx', '.xls')):
             return jsonify({'error': 'Sadece Excel dosyaları (.xlsx, .xls) desteklenir'}), 400
 
-        # Excel dosyasını oku
-        df = pd.read_excel(file)
-
-        # Sütun isimlerini normalize et (Türkçe karakter + boşluk temizle)
-        df.columns = df.columns.str.strip().str.lower()
-        df.columns = df.columns.str.replace('ı', 'i').str.replace('ğ', 'g').str.replace('ü', 'u').str.replace('ş', 's').str.replace('ö', 'o').str.replace('ç', 'c')
-        df.columns = df.columns.str.replace(' ', '_').str.replace('.', '')
-
-        logger.info(f"Excel kolonları: {', '.join(df.columns.tolist()[:15])}")
-
-        total = len(df)
-        inserted = 0
-        duplicates = 0
-        skipped = 0
-
-        # Dosya tipine göre işle
-        if file_type == 'yakit':
-            from database import supabase_insert_batch
-
-            # Mevcut hash'leri al
-            existing_hashes = get_existing_hashes('yakit')
-
-            records = []
-            for _, row in df.iterrows():
-                # Sütun isimlerini esnek ara
-                plaka = None
-                for col in ['plaka', 'plate', 'arac', 'arac_plaka']:
-                    if col in df.columns and pd.notna(row.get(col)):
-                        plaka = str(row.get(col, '')).strip()
-                        break
-
-                yakit_miktari = None
-                for col in ['yakit_miktari', 'miktar', 'litre', 'lt', 'yakit']:
-                    if col in df.columns and pd.notna(row.get(col)):
-                        val = float(row.get(col, 0))
-                        if val > 0:
-                            yakit_miktari = val
-                            break
-
-                # Boş kayıtları atla
-                if not plaka or not yakit_miktari:
-                    skipped += 1
-                    continue
-
-                birim_fiyat = 0.0
-                for col in ['birim_fiyat', 'fiyat', 'birim', 'price']:
-                    if col in df.columns and pd.notna(row.get(col)):
-                        birim_fiyat = float(row.get(col, 0))
-                        break
-
-                satir_tutari = 0.0
-                for col in ['satir_tutari', 'tutar', 'total', 'toplam']:
-                    if col in df.columns and pd.notna(row.get(col)):
-                        satir_tutari = float(row.get(col, 0))
-                        break
-
-                record = {
-                    'plaka': plaka,
-                    'islem_tarihi': str(row.get('islem_tarihi', '')) if pd.notna(row.get('islem_tarihi')) else None,
-                    'saat': str(row.get('saat', '')) if pd.notna(row.get('saat')) else None,
-                    'yakit_miktari': str(yakit_miktari),
-                    'birim_fiyat': str(birim_fiyat),
-                    'satir_tutari': str(satir_tutari),
-                    'stok_adi': str(row.get('stok_adi', 'MOTORİN')) if pd.notna(row.get('stok_adi')) else 'MOTORİN',
-                    'km_bilgisi': str(float(row.get('km_bilgisi', 0))) if pd.notna(row.get('km_bilgisi')) and float(row.get('km_bilgisi', 0)) > 0 else None
-                }
-
-                record_hash = create_record_hash(record)
-                if record_hash in existing_hashes:
-                    duplicates += 1
-                    continue
-
-                record['record_hash'] = record_hash
-                records.append(record)
-
-            # Batch insert
-            batch_size = 1000
-            for i in range(0, len(records), batch_size):
-                batch = records[i:i+batch_size]
-                if supabase_insert_batch('yakit', batch):
-                    inserted += len(batch)
-                else:
-                    logger.error(f"Batch insert failed for yakit records {i}-{i+len(batch)}")
-
-        elif file_type == 'agirlik':
-            from database import supabase_insert_batch
-
-            existing_hashes = get_existing_hashes('agirlik')
-
-            records = []
-            for _, row in df.iterrows():
-                # Esnek sütun arama
-                plaka = None
-                for col in ['plaka', 'plate', 'arac']:
-                    if col in df.columns and pd.notna(row.get(col)):
-                        plaka = str(row.get(col, '')).strip()
-                        break
-
-                net_agirlik = None
-                for col in ['net_agirlik', 'agirlik', 'net', 'tonaj', 'ton']:
-                    if col in df.columns and pd.notna(row.get(col)):
-                        val = float(row.get(col, 0))
-                        if val > 0:
-                            net_agirlik = val
-                            break
-
-                # Boş kayıtları atla
-                if not plaka or not net_agirlik:
-                    skipped += 1
-                    continue
-
-                record = {
-                    'tarih': str(row.get('tarih', '')) if pd.notna(row.get('tarih')) else None,
-                    'miktar': str(float(row.get('miktar', 0))) if pd.notna(row.get('miktar')) else None,
-                    'birim': str(row.get('birim', '')) if pd.notna(row.get('birim')) else None,
-                    'net_agirlik': str(net_agirlik),
-                    'plaka': plaka,
-                    'adres': str(row.get('adres', '')) if pd.notna(row.get('adres')) else None,
-                    'islem_noktasi': str(row.get('islem_noktasi', '')) if pd.notna(row.get('islem_noktasi')) else None,
-                    'cari_adi': str(row.get('cari_adi', '')) if pd.notna(row.get('cari_adi')) else None
-                }
-
-                record_hash = create_record_hash(record)
-                if record_hash in existing_hashes:
-                    duplicates += 1
-                    continue
-
-                record['record_hash'] = record_hash
-                records.append(record)
-
-            batch_size = 1000
-            for i in range(0, len(records), batch_size):
-                batch = records[i:i+batch_size]
-                if supabase_insert_batch('agirlik', batch):
-                    inserted += len(batch)
-                else:
-                    logger.error(f"Batch insert failed for agirlik records {i}-{i+len(batch)}")
-
-        elif file_type == 'arac-takip':
-            from database import supabase_insert_batch
-
-            existing_hashes = get_existing_hashes('arac_takip')
-
-            records = []
-            for _, row in df.iterrows():
-                # Esnek sütun arama
-                plaka = None
-                for col in ['plaka', 'plate', 'arac']:
-                    if col in df.columns and pd.notna(row.get(col)):
-                        plaka = str(row.get(col, '')).strip()
-                        break
-
-                toplam_km = None
-                for col in ['toplam_kilometre', 'kilometre', 'km', 'mesafe']:
-                    if col in df.columns and pd.notna(row.get(col)):
-                        val = float(row.get(col, 0))
-                        if val > 0:
-                            toplam_km = val
-                            break
-
-                # Boş kayıtları atla
-                if not plaka or not toplam_km:
-                    skipped += 1
-                    continue
+        from excel_ingest import DOSYA_TIPLERI
+        from upload_jobs import is_ekle
 
-                record = {
-                    'plaka': plaka,
-                    'sofor_adi': str(row.get('sofor_adi', '')) if pd.notna(row.get('sofor_adi')) else None,
-                    'arac_gruplari': str(row.get('arac_gruplari', '')) if pd.notna(row.get('arac_gruplari')) else None,
-                    'tarih': str(row.get('tarih', '')) if pd.notna(row.get('tarih')) else None,
-                    'hareket_baslangic_tarihi': str(row.get('hareket_baslangic_tarihi', '')) if pd.notna(row.get('hareket_baslangic_tarihi')) else None,
-                    'hareket_bitis_tarihi': str(row.get('hareket_bitis_tarihi', '')) if pd.notna(row.get('hareket_bitis_tarihi')) else None,
-                    'baslangic_adresi': str(row.get('baslangic_adresi', '')) if pd.notna(row.get('baslangic_adresi')) else None,
-                    'bitis_adresi': str(row.get('bitis_adresi', '')) if pd.notna(row.get('bitis_adresi')) else None,
-                    'toplam_kilometre': str(toplam_km),
-                    'hareket_suresi': str(row.get('hareket_suresi', '')) if pd.notna(row.get('hareket_suresi')) else None,
-                    'rolanti_suresi': str(row.get('rolanti_suresi', '')) if pd.notna(row.get('rolanti_suresi')) else None,
-                    'park_suresi': str(row.get('park_suresi', '')) if pd.notna(row.get('park_suresi')) else None,
-                    'gunluk_yakit_tuketimi_l': str(float(row.get('gunluk_yakit_tuketimi_l', 0))) if pd.notna(row.get('gunluk_yakit_tuketimi_l')) else None
-                }
-
-                record_hash = create_record_hash(record)
-                if record_hash in existing_hashes:
-                    duplicates += 1
-                    continue
-
-                record['record_hash'] = record_hash
-                records.append(record)
+        if file_type not in DOSYA_TIPLERI:
+            return jsonify({'error': 'Geçersiz dosya tipi'}), 400
 
-            batch_size = 1000
-            for i in range(0, len(records), batch_size):
-                batch = records[i:i+batch_size]
-                if supabase_insert_batch('arac_takip', batch):
-                    inserted += len(batch)
-                else:
-                    logger.error(f"Batch insert failed for arac_takip records {i}-{i+len(batch)}")
+        # Dosya diske kaydedilip (MD5'i aynı geçişte hesaplanır) kuyruğa alınır;
+        # okuma ve yazma arka planda yapılır
+        kuyruk = is_ekle(file, file_type)
 
-        else:
-            return jsonify({'error': 'Geçersiz dosya tipi'}), 400
+        if kuyruk['onceki'] is not None:
+            # Aynı içerikli dosya daha önce yüklendi: okumadan dön
+            from upload_manifest import onceki_sonuc
+            onceki = kuyruk['onceki']
+            logger.info(f"Upload skipped - File: {file.filename} already processed as {onceki.get('filename')}")
+            return jsonify({
+                'success': True,
+                'bilinen_dosya': True,
+                'onceki_dosya': onceki.get('filename'),
+                'onceki_tarih': onceki.get('created_at'),
+                **onceki_sonuc(onceki)
+            })
 
-        logger.info(f"Upload summary - Total: {total}, Inserted: {inserted}, Duplicates: {duplicates}, Skipped: {skipped}")
+        job_id = kuyruk['job_id']
+        logger.info(f"Upload queued - Job: {job_id}, File: {file.filename}, Type: {file_type}")
 
         return jsonify({
             'success': True,
-            'inserted': inserted,
-            'duplicates': duplicates,
-            'skipped': skipped,
-            'total': total
-        })
+            'job_id': job_id,
+            'status_url': url_for('api_upload_status', job_id=job_id)
+        }), 202
 
     except Exception as e:
         logger.error(f"Upload error: {e}")
@@ -369,6 +170,21 @@ def api_upload_excel():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/upload-status/<job_id>')
+def api_upload_status(job_id):
+    """Excel yükleme işinin durumu ve sayaçları"""
+    try:
+        from upload_jobs import is_durumu
+
+        durum = is_durumu(job_id)
+        if durum is None:
+            return jsonify({'error': 'Yükleme işi bulunamadı'}), 404
+        return jsonify(durum)
+
+    except Exception as e:
+        logger.error(f"Upload status error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/plakalar')
 def api_plakalar():
     """Plaka listesi API - araç tipine göre filtrelenebilir"""
@@ -394,7 +210,7 @@ def api_plakalar():
 def analyze():
     """Veritabanından analiz yap"""
     try:
-        from database import get_database_info, hesapla_gercek_km, fetch_all_paginated, get_aktif_kargo_araclari
+        from database import get_database_info, hesapla_gercek_km_toplu, fetch_all_paginated, get_aktif_kargo_araclari
 
         # Model analyzer opsiyonel - yoksa devam et
         try:
@@ -467,12 +283,14 @@ def analyze():
 
             arac_detaylari = []
 
+            # KM hesaplama - tüm plakalar için tek sorgu
+            km_by_plaka = hesapla_gercek_km_toplu(list(yakit_by_plaka.keys()), baslangic_tarihi, bitis_tarihi)
+
             for plaka_key, yakit_list in yakit_by_plaka.items():
                 toplam_yakit = sum(yakit_list)
                 ortalama_yakit = toplam_yakit / len(yakit_list) if yakit_list else 0
 
-                # KM hesaplama
-                toplam_km = hesapla_gercek_km(plaka_key, baslangic_tarihi, bitis_tarihi)
+                toplam_km = km_by_plaka.get(plaka_key, 0)
 
                 # Ağırlık verilerini çek
                 agirlik_data = fetch_all_paginated('agirlik',
@@ -637,9 +455,12 @@ def debug_info():
         except Exception as e:
             stats = {'error': str(e)}
 
+    from query_cache import cache_stats
+
     return jsonify({
         'database': db_info,
-        'statistics': stats
+        'statistics': stats,
+        'cache': cache_stats()
     })
 
 @app.route('/ai-analysis')
@@ -694,7 +515,8 @@ def ai_predict():
         model = YakitTahminModeli()
 
         if tahmin_tipi == 'gelecek_ay':
-            result = model.gelecek_ay_tahmini(plaka)
+            gun_sayisi = request.form.get('gun_sayisi', 30, type=int)
+            result = model.gelecek_ay_tahmini(plaka, gun_sayisi=min(max(gun_sayisi, 1), 366))
         else:
             result = model.tahmin_yap(plaka, tarih)
 
@@ -735,7 +557,12 @@ def anomaly_dashboard():
         from database import get_all_plakas
 
         model = AnomalTespitModeli()
-        result = model.anomali_tespit_detayli()
+        result = model.anomali_tespit_detayli(
+            plaka_filtre=request.args.get('plaka') or None,
+            tip_filtre=request.args.get('tip') or None,
+            baslangic_tarihi=request.args.get('baslangic') or None,
+            bitis_tarihi=request.args.get('bitis') or None
+        )
 
         if result['status'] == 'success':
             plakalar = get_all_plakas()
@@ -755,7 +582,8 @@ def ai_bulk_predict():
     try:
         from ai_model import tum_plakalar_tahmini
 
-        result = tum_plakalar_tahmini()
+        gun_sayisi = request.form.get('gun_sayisi', 30, type=int)
+        result = tum_plakalar_tahmini(gun_sayisi=min(max(gun_sayisi, 1), 366))
 
         if result['status'] == 'success':
             return render_template('ai_bulk_result.html', result=result)
@@ -767,6 +595,27 @@ def ai_bulk_predict():
         flash(f'❌ Hata: {str(e)}', 'error')
         return redirect(url_for('ai_analysis'))
 
+@app.route('/api/ai-bulk-predict')
+def api_ai_bulk_predict():
+    """Tüm plakalar için günlük tahminler - parça parça akan NDJSON (satır başına bir plaka)"""
+    try:
+        from ai_model import YakitTahminModeli
+
+        gun_sayisi = min(max(request.args.get('gun_sayisi', 30, type=int), 1), 366)
+
+        model = YakitTahminModeli()
+        egit_result = model.hazirla()
+        if egit_result['status'] == 'error':
+            return jsonify(egit_result)
+
+        def uret():
+            for parca in model.toplu_tahmin_parcalari(gun_sayisi=gun_sayisi):
+                yield ''.join(json.dumps(sonuc, ensure_ascii=False) + '\n' for sonuc in parca)
+
+        return Response(stream_with_context(uret()), mimetype='application/x-ndjson')
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
 @app.route('/performans-analizi')
 def performans_analizi():
     """Performans analizi sayfası"""
@@ -778,11 +627,11 @@ def performans_analizi():
 def performans_karsilastirma():
     """Tüm araçların performans karşılaştırması"""
     try:
-        from ai_model import PerformansAnalizi
+        from ai_model import get_performans_analizi
 
         ana_malzeme = request.form.get('ana_malzeme', '').strip()
 
-        analiz = PerformansAnalizi()
+        analiz = get_performans_analizi()
         result = analiz.plaka_performans_karsilastirma(ana_malzeme_filtre=ana_malzeme if ana_malzeme else None)
 
         if result['status'] == 'success':
@@ -799,13 +648,13 @@ def performans_karsilastirma():
 def performans_detay():
     """Belirli bir araç için detaylı performans analizi"""
     try:
-        from ai_model import PerformansAnalizi
+        from ai_model import get_performans_analizi
 
         plaka = request.form.get('plaka')
         baslangic_tarihi = request.form.get('baslangic_tarihi') or None
         bitis_tarihi = request.form.get('bitis_tarihi') or None
 
-        analiz = PerformansAnalizi()
+        analiz = get_performans_analizi()
         result = analiz.plaka_detay_analiz(plaka, baslangic_tarihi, bitis_tarihi)
 
         if result['status'] == 'success':
@@ -822,7 +671,7 @@ def performans_detay():
 def performans_export_pdf():
     """Performans karşılaştırma PDF export"""
     try:
-        from ai_model import PerformansAnalizi
+        from ai_model import get_performans_analizi
         from reportlab.lib import colors
         from reportlab.lib.pagesizes import A4, landscape
         from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
@@ -834,7 +683,7 @@ def performans_export_pdf():
 
         ana_malzeme = request.form.get('ana_malzeme', '').strip()
 
-        analiz = PerformansAnalizi()
+        analiz = get_performans_analizi()
         result = analiz.plaka_performans_karsilastirma(ana_malzeme_filtre=ana_malzeme if ana_malzeme else None)
 
         if result['status'] != 'success':
@@ -928,13 +777,13 @@ def performans_export_pdf():
 def performans_export_excel():
     """Performans karşılaştırma Excel export"""
     try:
-        from ai_model import PerformansAnalizi
+        from ai_model import get_performans_analizi
         import pandas as pd
         import io
 
         ana_malzeme = request.form.get('ana_malzeme', '').strip()
 
-        analiz = PerformansAnalizi()
+        analiz = get_performans_analizi()
         result = analiz.plaka_performans_karsilastirma(ana_malzeme_filtre=ana_malzeme if ana_malzeme else None)
 
         if result['status'] != 'success':
@@ -1583,7 +1432,7 @@ def assistant_clear():
 def binek_arac_analizi():
     """Binek araç analizi sayfası"""
     try:
-        from database import get_aktif_binek_araclar, hesapla_gercek_km, fetch_all_paginated
+        from database import get_aktif_binek_araclar, hesapla_gercek_km_toplu, fetch_all_paginated
         import urllib.parse
 
         # Filtreleri al
@@ -1655,13 +1504,15 @@ def binek_arac_analizi():
         arac_detaylari = []
         toplam_yakit_genel = 0
 
+        # KM hesaplama - tüm plakalar için tek sorgu
+        km_by_plaka = hesapla_gercek_km_toplu(list(yakit_by_plaka.keys()), baslangic_tarihi, bitis_tarihi)
+
         for plaka_key, yakit_list in yakit_by_plaka.items():
             toplam_yakit = sum(yakit_list)
             ortalama_yakit = toplam_yakit / len(yakit_list) if yakit_list else 0
             yakit_alimlari = len(yakit_list)
 
-            # KM hesaplama
-            toplam_km = hesapla_gercek_km(plaka_key, baslangic_tarihi, bitis_tarihi)
+            toplam_km = km_by_plaka.get(plaka_key, 0)
 
             tuketim = (toplam_yakit / toplam_km * 100) if toplam_km > 0 else 0
 
@@ -1708,7 +1559,7 @@ def binek_arac_analizi():
 def kargo_arac_analizi():
     """Kargo araç analizi sayfası"""
     try:
-        from database import get_aktif_kargo_araclari, hesapla_gercek_km, fetch_all_paginated
+        from database import get_aktif_kargo_araclari, hesapla_gercek_km_toplu, fetch_all_paginated
         import urllib.parse
 
         # Filtreleri al
@@ -1817,13 +1668,15 @@ def kargo_arac_analizi():
         toplam_yakit_genel = 0
         toplam_sefer = 0
 
+        # KM hesaplama - tüm plakalar için tek sorgu
+        km_by_plaka = hesapla_gercek_km_toplu(list(yakit_by_plaka.keys()), baslangic_tarihi, bitis_tarihi)
+
         for plaka_key, yakit_list in yakit_by_plaka.items():
             toplam_yakit = sum(yakit_list)
             ortalama_yakit = toplam_yakit / len(yakit_list) if yakit_list else 0
             sefer_sayisi = len(yakit_list)
 
-            # KM hesaplama
-            toplam_km = hesapla_gercek_km(plaka_key, baslangic_tarihi, bitis_tarihi)
+            toplam_km = km_by_plaka.get(plaka_key, 0)
 
             # Kargo verileri
             kargo_info = kargo_by_plaka.get(plaka_key, {})
@@ -1886,7 +1739,7 @@ def kargo_arac_analizi():
 def is_makinesi_analizi():
     """İş makinesi analizi sayfası"""
     try:
-        from database import get_aktif_is_makineleri, hesapla_gercek_km, fetch_all_paginated
+        from database import get_aktif_is_makineleri, hesapla_gercek_km_toplu, fetch_all_paginated
         import urllib.parse
 
         # Filtreleri al
@@ -1932,13 +1785,15 @@ def is_makinesi_analizi():
         arac_detaylari = []
         toplam_yakit_genel = 0
 
+        # KM hesaplama - tüm plakalar için tek sorgu
+        km_by_plaka = hesapla_gercek_km_toplu(list(yakit_by_plaka.keys()), baslangic_tarihi, bitis_tarihi)
+
         for plaka_key, yakit_list in yakit_by_plaka.items():
             toplam_yakit = sum(yakit_list)
             ortalama_yakit = toplam_yakit / len(yakit_list) if yakit_list else 0
             yakit_alimlari = len(yakit_list)
 
-            # KM hesaplama
-            toplam_km = hesapla_gercek_km(plaka_key, baslangic_tarihi, bitis_tarihi)
+            toplam_km = km_by_plaka.get(plaka_key, 0)
 
             tuketim = (toplam_yakit / toplam_km * 100) if toplam_km > 0 else 0
 
@@ -0,0 +1,267 @@
+"""
+Supabase'e toplu yazma: paralel batch'ler, tekrar deneme, hatalı satır ayıklama
+
+Kayıtlar satır sayısı (BULK_BATCH_ROWS) ve JSON boyutu (BULK_BATCH_BYTES)
+sınırına göre batch'lere bölünür ve BULK_WRITE_WORKERS thread'lik havuzda
+gönderilir. Aynı anda en fazla 2 x worker batch bekler; kayıtlar generator
+olarak verilirse okuma yazmanın önüne geçmez.
+
+- 429 ve 5xx yanıtları (ve bağlantı hataları) üstel bekleme ile
+  BULK_RETRIES kez tekrar denenir; Retry-After başlığı varsa ona uyulur.
+  on_conflict olmayan düz insert'te sadece isteğin işlenmediği kesin olan
+  hatalar (429, bağlantı kurulamadı) tekrar denenir: yazılmış bir batch'in
+  tekrarı unique index olmayan tabloda satırları iki kez ekler
+- Satır verisinden kaynaklanan hatalarda (400/409/422, 413) batch ikiye
+  bölünüp tekrar gönderilir; sonunda sadece hatalı satırlar reddedilir.
+  Unique ihlali (23505) bölünmez
+- Şema/yetki hataları (42xxx, PGRST, 401/403/404) bölünmez, batch olduğu gibi
+  hata sayılır
+- Başarılı her batch için yazma_sonrasi (önbellek, aylık özet, snapshot) çağrılır
+
+Kullanım:
+    rapor = yaz('yakit', records)                            # düz insert
+    rapor = yaz('yakit', records, on_conflict='record_hash') # çakışanları atla
+    rapor['inserted'], rapor['duplicates'], rapor['failed']
+    rapor['batches']   # batch başına satır, bayt, deneme, süre, hatalar
+    rapor['hatalar']   # [{'baslangic', 'satir', 'status', 'kod', 'mesaj'}]
+"""
+import os
+import json
+import time
+import random
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+BULK_WRITE_WORKERS = int(os.environ.get('BULK_WRITE_WORKERS', '4'))
+BULK_BATCH_ROWS = int(os.environ.get('BULK_BATCH_ROWS', '1000'))
+# Batch başına hedef JSON boyutu (bayt); geniş satırlarda batch küçülür
+BULK_BATCH_BYTES = int(os.environ.get('BULK_BATCH_BYTES', str(1024 * 1024)))
+BULK_RETRIES = 5
+BULK_RETRY_BACKOFF = 0.5
+BULK_MAX_BACKOFF = 30
+
+# Bölünerek satır satır ayıklanabilen (veriden kaynaklanan) hata kodları
+BOLUNEBILIR_STATUS = {400, 409, 413, 422}
+
+
+def batchlere_bol(records: Iterable[Dict], max_rows: int = None,
+                  max_bytes: int = None) -> Iterator[Tuple[int, List[Dict], int]]:
+    """(ilk satırın sırası, batch, JSON bayt) üret; satır ve bayt sınırı aşılmaz"""
+    max_rows = max_rows or BULK_BATCH_ROWS
+    max_bytes = max_bytes or BULK_BATCH_BYTES
+
+    batch, bayt, baslangic = [], 2, 0
+    for i, record in enumerate(records):
+        boyut = len(json.dumps(record).encode()) + 1
+        if batch and (len(batch) >= max_rows or bayt + boyut > max_bytes):
+            yield baslangic, batch, bayt
+            batch, bayt, baslangic = [], 2, i
+        batch.append(record)
+        bayt += boyut
+    if batch:
+        yield baslangic, batch, bayt
+
+
+def _retry_after(response) -> Optional[float]:
+    try:
+        return min(float(response.headers.get('Retry-After')), BULK_MAX_BACKOFF)
+    except (TypeError, ValueError):
+        return None
+
+
+def _hata_bilgisi(response) -> Tuple[Optional[str], str]:
+    """PostgREST hata gövdesinden (kod, mesaj)"""
+    try:
+        govde = response.json()
+        return govde.get('code'), govde.get('message') or response.text[:200]
+    except ValueError:
+        return None, response.text[:200]
+
+
+def _baglanilamadi(e: requests.RequestException) -> bool:
+    """İstek sunucuya hiç gitmedi mi (bağlantı kurulamadı ya da zaman aşımına uğradı)"""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    neden = getattr(e.args[0], 'reason', None) if e.args else None
+    return isinstance(e, requests.ConnectionError) and isinstance(neden, NewConnectionError)
+
+
+def _gonder(url: str, batch: List[Dict], prefer: str, tekrar_guvenli: bool):
+    """
+    Batch'i gönder; 429/5xx ve bağlantı hatalarında üstel bekleme ile tekrar dene
+
+    tekrar_guvenli değilse (düz insert) 5xx, okuma zaman aşımı ve kopan
+    bağlantıda tekrar denenmez; batch sunucuda yazılmış olabilir.
+
+    (yanıt, deneme sayısı, hata, belirsiz) döndürür. Denemeler biterse yanıt
+    son hatalı yanıttır (bağlantı hatasında None). belirsiz: cevabı alınamayan
+    bir deneme sunucuya ulaşmış, batch'i yazmış olabilir.
+    """
+    from database import supabase_http
+
+    deneme = 0
+    belirsiz = False
+    while True:
+        deneme += 1
+        bekle = None
+        try:
+            response = supabase_http('POST', url, data=batch, headers={'Prefer': prefer})
+            if response.status_code != 429 and response.status_code < 500:
+                return response, deneme, None, belirsiz
+            hata = f'{response.status_code} - {response.text[:200]}'
+            bekle = _retry_after(response)
+            # 429 istek işlenmeden döner
+            islenmedi = response.status_code == 429
+        except requests.RequestException as e:
+            response, hata = None, str(e)
+            islenmedi = _baglanilamadi(e)
+
+        belirsiz = belirsiz or not islenmedi
+        if not (tekrar_guvenli or islenmedi):
+            return response, deneme, f'{hata} (tekrar denenmedi, batch yazılmış olabilir)', belirsiz
+        if deneme >= BULK_RETRIES:
+            return response, deneme, hata, belirsiz
+        if bekle is None:
+            # Aynı anda düşen thread'ler aynı anda tekrar denemesin
+            bekle = min(BULK_RETRY_BACKOFF * (2 ** (deneme - 1)), BULK_MAX_BACKOFF) * random.uniform(0.5, 1)
+        time.sleep(bekle)
+
+
+def _bolunebilir(status: Optional[int], kod: Optional[str]) -> bool:
+    # Unique ihlali bölünmez: batch'teki her satır için ayrı istek gider
+    if status not in BOLUNEBILIR_STATUS or kod == '23505':
+        return False
+    # Şema hataları (ör. 42P10 unique index yok, 42703/PGRST204 kolon yok) her satırda tekrarlanır
+    return status == 413 or not (kod or '').startswith(('42', 'PGRST'))
+
+
+def _parca_yaz(table: str, url: str, prefer: str, baslangic: int, batch: List[Dict],
+               upsert: bool, rapor: Dict):
+    from database import yazma_sonrasi
+
+    response, deneme, hata, belirsiz = _gonder(url, batch, prefer, upsert)
+    rapor['deneme'] += deneme
+
+    if response is not None and response.status_code < 300:
+        eklenen = len(response.json()) if upsert else len(batch)
+        rapor['inserted'] += eklenen
+        rapor['duplicates'] += len(batch) - eklenen
+        # Belirsiz denemeden sonra "duplicate" dönen satırları o deneme yazmış olabilir
+        if eklenen or belirsiz:
+            yazma_sonrasi(table, batch)
+        return
+
+    status = response.status_code if response is not None else None
+    kod, mesaj = _hata_bilgisi(response) if response is not None else (None, hata)
+    if kod == '23505':
+        if belirsiz:
+            # Cevabı alınamayan önceki deneme batch'i yazmış; tekrarı unique index'e takıldı
+            rapor['inserted'] += len(batch)
+            yazma_sonrasi(table, batch)
+            return
+        if len(batch) == 1:
+            # Unique ihlali: satır tabloda zaten var
+            rapor['duplicates'] += 1
+            return
+    elif _bolunebilir(status, kod) and len(batch) > 1:
+        orta = len(batch) // 2
+        _parca_yaz(table, url, prefer, baslangic, batch[:orta], upsert, rapor)
+        _parca_yaz(table, url, prefer, baslangic + orta, batch[orta:], upsert, rapor)
+        return
+
+    if belirsiz:
+        # Yazılmış olabilir: önbellekler ve aylık özet yine de yenilensin
+        yazma_sonrasi(table, batch)
+    rapor['failed'] += len(batch)
+    rapor['hatalar'].append({'baslangic': baslangic, 'satir': len(batch), 'status': status,
+                             'kod': kod, 'mesaj': hata or mesaj})
+
+
+def _batch_yaz(table: str, url: str, prefer: str, baslangic: int, batch: List[Dict],
+               bayt: int, upsert: bool) -> Dict:
+    rapor = {'baslangic': baslangic, 'satir': len(batch), 'bayt': bayt, 'deneme': 0,
+             'inserted': 0, 'duplicates': 0, 'failed': 0, 'hatalar': []}
+    t0 = time.time()
+    try:
+        _parca_yaz(table, url, prefer, baslangic, batch, upsert, rapor)
+    except Exception as e:
+        # Beklenmeyen hata (ör. bozuk yanıt): batch'in yazılmamış kısmı hata sayılır
+        kalan = len(batch) - rapor['inserted'] - rapor['duplicates'] - rapor['failed']
+        rapor['failed'] += kalan
+        rapor['hatalar'].append({'baslangic': baslangic, 'satir': kalan, 'status': None,
+                                 'kod': None, 'mesaj': str(e)})
+    rapor['sure'] = round(time.time() - t0, 3)
+
+    for h in rapor['hatalar']:
+        logger.error(f"{table} kayıt {h['baslangic']}-{h['baslangic'] + h['satir']} yazılamadı: "
+                     f"{h['status']} {h['kod'] or ''} {h['mesaj']}")
+    return rapor
+
+
+def yaz(table: str, records: Iterable[Dict], on_conflict: str = None, workers: int = None,
+        max_rows: int = None, max_bytes: int = None) -> Dict:
+    """
+    Kayıtları paralel batch'lerle yaz ve rapor döndür
+
+    on_conflict verilirse (ör. 'record_hash') çakışan satırlar atlanır ve
+    duplicate sayılır; bunun için kolonda unique index olmalıdır. Hatalar
+    exception olarak yükselmez, rapor['hatalar']'da kayıt sırası ile döner.
+    """
+    from database import SUPABASE_URL
+
+    if on_conflict:
+        url = f'{SUPABASE_URL}/rest/v1/{table}?on_conflict={on_conflict}&select={on_conflict}'
+        prefer = 'resolution=ignore-duplicates,return=representation'
+    else:
+        url = f'{SUPABASE_URL}/rest/v1/{table}'
+        prefer = 'return=minimal'
+
+    workers = workers or BULK_WRITE_WORKERS
+    # Gönderilmeyi bekleyen batch sayısı sınırı (bellek ve Supabase yükü)
+    yer = threading.BoundedSemaphore(workers * 2)
+    futures = []
+    t0 = time.time()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'bulk-{table}') as executor:
+        for baslangic, batch, bayt in batchlere_bol(records, max_rows, max_bytes):
+            yer.acquire()
+            future = executor.submit(_batch_yaz, table, url, prefer, baslangic, batch, bayt, bool(on_conflict))
+            future.add_done_callback(lambda _: yer.release())
+            futures.append(future)
+
+    batches = sorted((f.result() for f in futures), key=lambda b: b['baslangic'])
+    rapor = {
+        'table': table,
+        'total': sum(b['satir'] for b in batches),
+        'inserted': sum(b['inserted'] for b in batches),
+        'duplicates': sum(b['duplicates'] for b in batches),
+        'failed': sum(b['failed'] for b in batches),
+        'sure': round(time.time() - t0, 3),
+        'batches': batches,
+        'hatalar': [h for b in batches for h in b['hatalar']],
+    }
+    logger.info(f"{table} toplu yazma: {rapor['total']} satır, {len(batches)} batch, "
+                f"eklenen {rapor['inserted']}, duplicate {rapor['duplicates']}, "
+                f"hatalı {rapor['failed']} ({rapor['sure']} sn)")
+    return rapor
+
+
+def rapor_satirlari(rapor: Dict) -> List[str]:
+    """Raporu batch başına okunur satırlara çevir (komut satırı scriptleri için)"""
+    satirlar = []
+    for b in rapor['batches']:
+        isaret = '✅' if not b['failed'] else '❌'
+        satirlar.append(f"{isaret} kayıt {b['baslangic']}-{b['baslangic'] + b['satir']}: "
+                        f"{b['inserted']} eklendi, {b['duplicates']} duplicate, {b['failed']} hatalı "
+                        f"({b['bayt'] // 1024} KB, {b['deneme']} istek, {b['sure']} sn)")
+        for h in b['hatalar']:
+            satirlar.append(f"   ↳ kayıt {h['baslangic']}-{h['baslangic'] + h['satir']}: "
+                            f"{h['status']} {h['kod'] or ''} {h['mesaj']}")
+    return satirlar
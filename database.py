@@ -3,9 +3,15 @@ Supabase veritabanı işlemleri
 """
 import os
 from typing import List, Dict, Any, Optional
-import urllib.request
 import urllib.parse
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+import query_cache
+from query_cache import cached
 
 # .env dosyasını manuel oku
 def load_env():
@@ -51,27 +57,117 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 else:
     logger.info(f"✓ Supabase bağlantısı OK: {SUPABASE_URL[:30]}...")
 
-def supabase_insert_batch(table: str, data: list):
-    """Supabase'e toplu veri ekle"""
-    url = f'{SUPABASE_URL}/rest/v1/{table}'
+# HTTP bağlantı havuzu ayarları
+# Havuz boyutu gunicorn --threads değerinden büyük olmalı (Dockerfile: --threads 4)
+HTTP_POOL_SIZE = int(os.environ.get('SUPABASE_POOL_SIZE') or env.get('SUPABASE_POOL_SIZE') or 10)
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('SUPABASE_CONNECT_TIMEOUT') or env.get('SUPABASE_CONNECT_TIMEOUT') or 5)
+HTTP_READ_TIMEOUT = float(os.environ.get('SUPABASE_READ_TIMEOUT') or env.get('SUPABASE_READ_TIMEOUT') or 60)
+
+# Sayfalama ayarları
+PAGE_SIZE = 1000
+PAGE_WORKERS = int(os.environ.get('SUPABASE_PAGE_WORKERS') or env.get('SUPABASE_PAGE_WORKERS') or 4)
+PAGE_RETRIES = 3
+PAGE_RETRY_BACKOFF = 0.5
+
+# BIGSERIAL id'li büyük tablolar: varsayılan olarak keyset (id) sayfalama ile okunur
+KEYSET_TABLES = {'yakit', 'agirlik', 'arac_takip'}
+
+# get_table_count sonuçlarının bellekte tutulma süresi (saniye)
+COUNT_CACHE_TTL = float(os.environ.get('SUPABASE_COUNT_CACHE_TTL') or env.get('SUPABASE_COUNT_CACHE_TTL') or 30)
+
+# Okuma önbelleği süreleri (saniye). Veriler günde bir kez Excel yüklemesiyle değişir;
+# yazma fonksiyonları ilgili tabloları ayrıca query_cache.invalidate() ile temizler.
+DATA_CACHE_TTL = float(os.environ.get('QUERY_CACHE_TTL') or env.get('QUERY_CACHE_TTL') or 600)
+ARAC_CACHE_TTL = 120
+
+# Okuma kaynağı: 'supabase' (varsayılan) veya 'sqlite-replica' (yakit/agirlik/arac_takip
+# okumaları yerel SQLite kopyasından, bkz. sqlite_replica.py). Yazmalar her zaman Supabase'e gider.
+DATA_BACKEND = (os.environ.get('DATA_BACKEND') or env.get('DATA_BACKEND') or 'supabase').lower()
+
+# hesapla_gercek_km_toplu: bu sayıya kadar plaka için plaka=in.(...) filtresi gönderilir
+KM_PLAKA_FILTRE_LIMIT = 100
+
+_http_session = None
+_http_session_pid = None
+_http_lock = threading.Lock()
+
+def get_http_session() -> requests.Session:
+    """
+    Process başına paylaşılan keep-alive HTTP oturumunu döndür
 
-    req = urllib.request.Request(url, method='POST')
-    req.add_header('apikey', SUPABASE_KEY)
-    req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
-    req.add_header('Content-Type', 'application/json')
-    req.add_header('Prefer', 'return=minimal')
+    Oturum PID'e bağlıdır: gunicorn worker'ları fork ile başladığı için her
+    worker ilk istekte kendi bağlantı havuzunu açar, soketler paylaşılmaz.
+    Havuz thread-safe'tir; aynı worker'daki tüm thread'ler bağlantıları
+    yeniden kullanır (TCP+TLS el sıkışması istek başına tekrarlanmaz).
+    """
+    global _http_session, _http_session_pid
+
+    pid = os.getpid()
+    if _http_session is not None and _http_session_pid == pid:
+        return _http_session
+
+    with _http_lock:
+        if _http_session is None or _http_session_pid != pid:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2,
+                                  pool_maxsize=HTTP_POOL_SIZE,
+                                  pool_block=True,
+                                  max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({
+                'apikey': SUPABASE_KEY or '',
+                'Authorization': f'Bearer {SUPABASE_KEY}',
+                'Accept-Encoding': 'gzip, deflate',
+                'Connection': 'keep-alive'
+            })
+            _http_session = session
+            _http_session_pid = pid
+
+    return _http_session
+
+def supabase_http(method: str, url: str, data=None, headers: dict = None, timeout=None) -> requests.Response:
+    """Havuzdaki bir bağlantı üzerinden Supabase'e HTTP isteği gönder (gzip yanıtlar otomatik açılır)"""
+    request_headers = {'Content-Type': 'application/json'}
+    if headers:
+        request_headers.update(headers)
+
+    body = json.dumps(data).encode() if data is not None else None
+
+    return get_http_session().request(
+        method,
+        url,
+        data=body,
+        headers=request_headers,
+        timeout=timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    )
+
+def yazma_sonrasi(table: str, data: list):
+    """Tabloya satır eklendi: okuma önbelleği, aylık özet ve snapshot'lar güncellensin"""
+    query_cache.invalidate(table)
+    rollup_bekleyen_ekle(table, data)
+    if DATA_BACKEND == 'sqlite-replica':
+        from sqlite_replica import mark_stale
+        mark_stale(table)
+    import snapshot_store
+    snapshot_store.mark_stale(table)
 
-    req.data = json.dumps(data).encode()
+def supabase_insert_batch(table: str, data: list):
+    """Supabase'e toplu veri ekle (bulk_writer ile; bütün satırlar yazıldıysa True)"""
+    from bulk_writer import yaz
 
     try:
-        with urllib.request.urlopen(req) as response:
-            return response.status == 201
+        rapor = yaz(table, data)
+        if rapor['failed']:
+            print(f"❌ Batch insert error: {rapor['failed']}/{rapor['total']} kayıt yazılamadı - {rapor['hatalar'][0]['mesaj']}")
+        return rapor['failed'] == 0
     except Exception as e:
         print(f"❌ Batch insert error: {e}")
         return False
 
-def record_processed_file(filename: str, table_name: str, record_count: int):
-    """İşlenen dosyayı kaydet"""
+def record_processed_file(filename: str, table_name: str, record_count: int, file_hash: str = None,
+                          file_size: int = None, head_digest: str = None, manifest: dict = None):
+    """İşlenen dosyayı kaydet (içerik hash'i ve blok manifesti ile, bkz. upload_manifest.py)"""
     try:
         data = {
             'filename': filename,
@@ -79,10 +175,37 @@ def record_processed_file(filename: str, table_name: str, record_count: int):
             'record_count': record_count,
             'status': 'success'
         }
+        if file_hash:
+            data.update({'file_hash': file_hash, 'file_size': file_size,
+                         'head_digest': head_digest, 'manifest': manifest})
         supabase_insert_batch('processed_files', [data])
     except:
         pass
 
+def get_processed_file(table_name: str, file_hash: str = None, head_digest: str = None) -> Optional[Dict]:
+    """
+    Tabloya başarıyla yüklenmiş son dosya kaydı (file_hash veya head_digest ile)
+
+    Kayıt yoksa ya da sorgu yapılamazsa (ör. migration uygulanmamış) None döner.
+    """
+    filters = {'table_name': f'eq.{table_name}', 'status': 'eq.success'}
+    if file_hash:
+        filters['file_hash'] = f'eq.{file_hash}'
+    if head_digest:
+        filters['head_digest'] = f'eq.{head_digest}'
+
+    url = _build_select_url('processed_files', '*', filters, order='id.desc') + '&limit=1'
+    try:
+        response = supabase_http('GET', url)
+        if response.status_code >= 400:
+            logger.warning(f"processed_files sorgulanamadı: {response.status_code} - {response.text[:200]}")
+            return None
+        rows = response.json()
+        return rows[0] if rows else None
+    except Exception as e:
+        logger.warning(f"processed_files sorgulanamadı: {e}")
+        return None
+
 def supabase_request(endpoint: str, method: str = 'GET', data: dict = None, params: dict = None):
     """Supabase REST API isteği"""
     url = f'{SUPABASE_URL}/rest/v1/{endpoint}'
@@ -91,60 +214,317 @@ def supabase_request(endpoint: str, method: str = 'GET', data: dict = None, para
         query_string = '&'.join([f'{k}={v}' for k, v in params.items()])
         url = f'{url}?{query_string}'
 
-    req = urllib.request.Request(url, method=method)
-    req.add_header('apikey', SUPABASE_KEY)
-    req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
-    req.add_header('Content-Type', 'application/json')
-    req.add_header('Prefer', 'return=representation')
+    response = supabase_http(method, url, data=data or None, headers={'Prefer': 'return=representation'})
 
-    if data:
-        req.data = json.dumps(data).encode()
+    if response.status_code >= 400:
+        raise Exception(f"Supabase error: {response.status_code} - {response.text}")
+
+    return response.json() if response.content else None
+
+def parse_content_range_total(content_range: str) -> Optional[int]:
+    """PostgREST Content-Range başlığından toplam satır sayısını oku ('0-999/12345' -> 12345)"""
+    if not content_range or '/' not in content_range:
+        return None
+    total = content_range.rsplit('/', 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+def fetch_page(url: str, headers: dict = None) -> requests.Response:
+    """
+    Tek bir sayfayı çek; geçici hatalarda (ağ, 429, 5xx) üstel beklemeyle tekrar dene
+
+    Tüm denemeler başarısız olursa exception fırlatır - eksik sayfa sessizce atlanmaz.
+    """
+    last_error = None
+    for deneme in range(PAGE_RETRIES):
+        try:
+            response = supabase_http('GET', url, headers=headers)
+            if response.status_code == 429 or response.status_code >= 500:
+                last_error = Exception(f"Supabase error: {response.status_code} - {response.text[:200]}")
+            else:
+                response.raise_for_status()
+                return response
+        except requests.HTTPError:
+            raise
+        except requests.RequestException as e:
+            last_error = e
+
+        if deneme < PAGE_RETRIES - 1:
+            time.sleep(PAGE_RETRY_BACKOFF * (2 ** deneme))
+
+    raise Exception(f"Sayfa {PAGE_RETRIES} denemede çekilemedi: {last_error}")
+
+def _build_select_url(table: str, select: str, filters: dict = None, order: str = None) -> str:
+    """limit/offset hariç sorgu URL'sini oluştur"""
+    url = f'{SUPABASE_URL}/rest/v1/{table}?select={urllib.parse.quote(select)}'
+
+    if filters:
+        for key, value in filters.items():
+            encoded_value = urllib.parse.quote(str(value))
+            url += f'&{key}={encoded_value}'
+
+    if order:
+        url += f'&order={urllib.parse.quote(order)}'
+
+    return url
+
+def _select_with_id(select: str):
+    """Keyset için select'e id ekle; (yeni_select, id_sonradan_silinmeli_mi) döndür"""
+    if select == '*' or 'id' in [col.strip() for col in select.split(',')]:
+        return select, False
+    return f'id,{select}', True
+
+def sort_rows(rows: list, order: str) -> list:
+    """
+    Satırları PostgREST order ifadesine göre Python'da sırala ('islem_tarihi.desc,plaka.asc')
+
+    PostgreSQL varsayılanları korunur: ASC'de NULL'lar sonda, DESC'de başta.
+    Sıralama stabildir; eşit değerler geliş sırasını (id sırası) korur.
+    """
+    for part in reversed([p.strip() for p in order.split(',') if p.strip()]):
+        bits = part.split('.')
+        column = bits[0]
+        desc = 'desc' in bits[1:]
+        nulls_first = 'nullsfirst' in bits[1:] or (desc and 'nullslast' not in bits[1:])
+
+        values = [row for row in rows if row.get(column) is not None]
+        nulls = [row for row in rows if row.get(column) is None]
+        values.sort(key=lambda row: row[column], reverse=desc)
+        rows = nulls + values if nulls_first else values + nulls
+
+    return rows
+
+def _fetch_keyset(table: str, select: str, filters: dict = None, after_id: int = None, upper_id: int = None) -> list:
+    """id=gt.<son_id> ile sayfa sayfa ilerle - her sayfa indeksten O(limit) maliyetle gelir"""
+    base_url = _build_select_url(table, select, filters, 'id.asc')
+    if upper_id is not None:
+        base_url += f'&id=lte.{upper_id}'
 
-    try:
-        with urllib.request.urlopen(req) as response:
-            return json.loads(response.read().decode())
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode()
-        raise Exception(f"Supabase error: {e.code} - {error_body}")
-
-def fetch_all_paginated(table: str, select: str = '*', filters: dict = None, order: str = None):
-    """Tüm verileri pagination ile çek"""
     all_data = []
-    offset = 0
-    limit = 1000
+    cursor = after_id
 
     while True:
-        url = f'{SUPABASE_URL}/rest/v1/{table}?select={urllib.parse.quote(select)}&limit={limit}&offset={offset}'
+        url = f'{base_url}&limit={PAGE_SIZE}'
+        if cursor is not None:
+            url += f'&id=gt.{cursor}'
 
-        if filters:
-            for key, value in filters.items():
-                encoded_value = urllib.parse.quote(str(value))
-                url += f'&{key}={encoded_value}'
+        batch = fetch_page(url).json()
+        all_data.extend(batch)
 
-        if order:
-            url += f'&order={urllib.parse.quote(order)}'
+        if len(batch) < PAGE_SIZE:
+            break
+        cursor = batch[-1]['id']
 
-        req = urllib.request.Request(url)
-        req.add_header('apikey', SUPABASE_KEY)
-        req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
-        req.add_header('Content-Type', 'application/json')
+    return all_data
 
-        try:
-            with urllib.request.urlopen(req) as response:
-                batch = json.loads(response.read().decode())
-                if not batch or len(batch) == 0:
-                    break
-                all_data.extend(batch)
-
-                if len(batch) < limit:
-                    break
-                offset += limit
-        except Exception as e:
-            print(f"Error fetching data: {e}")
+def _fetch_keyset_parallel(table: str, select: str, filters: dict = None, after_id: int = None) -> list:
+    """
+    Toplam sayıyı ve id aralığını al, aralığı PAGE_WORKERS parçaya böl; her parçayı
+    keyset ile eşzamanlı çekip id sırasıyla birleştir
+    """
+    bound_filters = dict(filters or {})
+    lower = f'&id=gt.{after_id}' if after_id is not None else ''
+
+    first_url = f"{_build_select_url(table, 'id', bound_filters, 'id.asc')}{lower}&limit=1"
+    first = fetch_page(first_url, headers={'Prefer': 'count=exact'})
+    total = parse_content_range_total(first.headers.get('Content-Range'))
+    first_rows = first.json()
+
+    if not first_rows:
+        return []
+
+    partitions = min(PAGE_WORKERS, -(-total // PAGE_SIZE)) if total else 1
+    if partitions <= 1:
+        return _fetch_keyset(table, select, filters, after_id=after_id)
+
+    last_url = f"{_build_select_url(table, 'id', bound_filters, 'id.desc')}{lower}&limit=1"
+    min_id = first_rows[0]['id']
+    max_id = fetch_page(last_url).json()[0]['id']
+
+    step = -(-(max_id - min_id + 1) // partitions)
+    ranges = []
+    lo = min_id - 1
+    while lo < max_id:
+        hi = min(lo + step, max_id)
+        ranges.append((lo, hi))
+        lo = hi
+
+    def parca_cek(bounds):
+        return _fetch_keyset(table, select, filters, after_id=bounds[0], upper_id=bounds[1])
+
+    all_data = []
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        for batch in executor.map(parca_cek, ranges):
+            all_data.extend(batch)
+
+    return all_data
+
+def _fetch_pages_parallel(table: str, select: str, filters: dict = None, order: str = None) -> list:
+    """
+    (Keyset dışı tablolar için) Önce toplam satır sayısını al (Prefer: count=exact), sonra kalan sayfaları
+    sınırlı bir thread havuzunda eşzamanlı çek ve sırasıyla birleştir
+    """
+    # offset sayfalaması sabit bir sıralama ister; id ile eşitlikleri kır
+    if not order:
+        order = 'id.asc'
+    elif 'id.' not in order.split(',')[-1]:
+        order = f'{order},id.asc'
+
+    base_url = _build_select_url(table, select, filters, order)
+
+    first = fetch_page(f'{base_url}&limit={PAGE_SIZE}&offset=0', headers={'Prefer': 'count=exact'})
+    all_data = first.json()
+    total = parse_content_range_total(first.headers.get('Content-Range'))
+
+    if total is None or total <= len(all_data):
+        return all_data
+
+    offsets = list(range(PAGE_SIZE, total, PAGE_SIZE))
+    workers = min(PAGE_WORKERS, len(offsets))
+
+    def sayfa_cek(offset):
+        return fetch_page(f'{base_url}&limit={PAGE_SIZE}&offset={offset}').json()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in executor.map(sayfa_cek, offsets):
+            all_data.extend(batch)
+
+    return all_data
+
+def _replica_select(table: str, select: str, filters: dict = None, order: str = None) -> Optional[list]:
+    """Yerel replica'dan oku; tablo/filtre desteklenmiyorsa veya hata olursa None (Supabase'e düş)"""
+    import sqlite_replica
+
+    if table not in sqlite_replica.REPLICA_TABLES:
+        return None
+    try:
+        return sqlite_replica.select(table, select, filters, order)
+    except Exception as e:
+        logger.warning(f"Replica okunamadı ({table}), Supabase kullanılıyor: {e}")
+        return None
+
+def fetch_all_paginated(table: str, select: str = '*', filters: dict = None, order: str = None,
+                        parallel: bool = False, keyset: bool = None, after_id: int = None):
+    """
+    Tüm verileri pagination ile çek
+
+    Büyük tablolarda (KEYSET_TABLES) varsayılan olarak id sıralı keyset sayfalama
+    kullanılır (id=gt.<son_id>); OFFSET'in her sayfada büyüyen maliyeti oluşmaz.
+    order verilirse satırlar çekildikten sonra aynı ifadeye göre sıralanır.
+    after_id: sadece bu id'den büyük satırları çek (artımlı okuma için).
+
+    parallel=True: sayfalar PAGE_WORKERS thread ile eşzamanlı çekilir.
+    Bir sayfa tekrar denemelere rağmen alınamazsa exception fırlatılır (eksik veri dönmez).
+
+    DATA_BACKEND=sqlite-replica iken replica tabloları yerel kopyadan okunur
+    (after_id verilen artımlı okumalar her zaman Supabase'e gider).
+    """
+    if DATA_BACKEND == 'sqlite-replica' and after_id is None:
+        rows = _replica_select(table, select, filters, order)
+        if rows is not None:
+            return rows
+
+    if keyset is None:
+        keyset = table in KEYSET_TABLES and not (filters and 'id' in filters)
+
+    if keyset:
+        keyset_select, strip_id = _select_with_id(select)
+        if parallel:
+            all_data = _fetch_keyset_parallel(table, keyset_select, filters, after_id=after_id)
+        else:
+            all_data = _fetch_keyset(table, keyset_select, filters, after_id=after_id)
+
+        if strip_id:
+            for row in all_data:
+                row.pop('id', None)
+
+        return sort_rows(all_data, order) if order else all_data
+
+    if after_id is not None:
+        raise ValueError(f"after_id sadece keyset sayfalama ile kullanılabilir ({table})")
+
+    if parallel:
+        return _fetch_pages_parallel(table, select, filters, order)
+
+    all_data = []
+    offset = 0
+    limit = PAGE_SIZE
+    base_url = _build_select_url(table, select, filters, order)
+
+    while True:
+        response = fetch_page(f'{base_url}&limit={limit}&offset={offset}')
+        batch = response.json()
+        if not batch or len(batch) == 0:
+            break
+        all_data.extend(batch)
+
+        if len(batch) < limit:
             break
+        offset += limit
 
     return all_data
 
+def tarih_filtresi(kolon: str, baslangic_tarihi: str = None, bitis_tarihi: str = None) -> dict:
+    """fetch_all_paginated için tarih aralığı filtresi oluştur (PostgREST and=(...) sözdizimi)"""
+    if baslangic_tarihi and bitis_tarihi:
+        return {'and': f'({kolon}.gte.{baslangic_tarihi},{kolon}.lte.{bitis_tarihi})'}
+    elif baslangic_tarihi:
+        return {kolon: f'gte.{baslangic_tarihi}'}
+    elif bitis_tarihi:
+        return {kolon: f'lte.{bitis_tarihi}'}
+    return {}
+
+def hesapla_gercek_km_toplu(plakalar: List[str], baslangic_tarihi: str = None, bitis_tarihi: str = None) -> Dict[str, float]:
+    """
+    Birden fazla aracın gerçek gidilen kilometresini tek sorguyla hesapla
+
+    Tarih aralığındaki plaka,islem_tarihi,km_bilgisi satırları bir kez çekilir;
+    her plakanın ardışık km okumaları arasındaki pozitif farklar tek bir
+    groupby/diff geçişiyle toplanır.
+
+    Args:
+        plakalar: Araç plakaları
+        baslangic_tarihi: Başlangıç tarihi (YYYY-MM-DD)
+        bitis_tarihi: Bitiş tarihi (YYYY-MM-DD)
+
+    Returns:
+        dict: {plaka: toplam gidilen kilometre} - verisi olmayan plakalar 0
+    """
+    import pandas as pd
+
+    sonuc = {plaka: 0 for plaka in plakalar}
+    if not plakalar:
+        return sonuc
+
+    try:
+        filters = {'km_bilgisi': 'not.is.null'}
+        filters.update(tarih_filtresi('islem_tarihi', baslangic_tarihi, bitis_tarihi))
+
+        # Az sayıda plaka için sunucu tarafında da filtrele (URL boyu sınırlı kalsın)
+        if len(plakalar) <= KM_PLAKA_FILTRE_LIMIT:
+            plaka_listesi = ','.join('"' + str(p).replace('"', '') + '"' for p in plakalar)
+            filters['plaka'] = f'in.({plaka_listesi})'
+
+        rows = fetch_all_paginated('yakit', select='plaka,islem_tarihi,km_bilgisi',
+                                   filters=filters, order='islem_tarihi.asc', parallel=True)
+        if len(rows) < 2:
+            return sonuc
+
+        df = pd.DataFrame(rows)
+        df = df[df['plaka'].isin(set(plakalar))]
+        df['km_bilgisi'] = pd.to_numeric(df['km_bilgisi'], errors='coerce')
+        df = df[df['km_bilgisi'] > 0]
+
+        # Satırlar tarih sıralı geldi; stabil sıralama ile plaka içinde bu sıra korunur
+        df = df.sort_values('plaka', kind='mergesort')
+        fark = df.groupby('plaka', sort=False)['km_bilgisi'].diff()
+        toplamlar = fark.where(fark > 0).groupby(df['plaka']).sum()
+
+        sonuc.update({plaka: float(km) for plaka, km in toplamlar.items()})
+        return sonuc
+    except Exception as e:
+        print(f"Error calculating km: {e}")
+        return sonuc
+
 def hesapla_gercek_km(plaka: str, baslangic_tarihi: str = None, bitis_tarihi: str = None) -> float:
     """
     Bir aracın gerçek gidilen kilometresini hesapla
@@ -157,44 +537,39 @@ def hesapla_gercek_km(plaka: str, baslangic_tarihi: str = None, bitis_tarihi: st
     Returns:
         float: Toplam gidilen kilometre
     """
-    try:
-        url = f'{SUPABASE_URL}/rest/v1/yakit?plaka=eq.{urllib.parse.quote(plaka)}&km_bilgisi=not.is.null&order=islem_tarihi.asc'
-
-        if baslangic_tarihi and bitis_tarihi:
-            url += f'&islem_tarihi=and(gte.{baslangic_tarihi},lte.{bitis_tarihi})'
-        elif baslangic_tarihi:
-            url += f'&islem_tarihi=gte.{baslangic_tarihi}'
-        elif bitis_tarihi:
-            url += f'&islem_tarihi=lte.{bitis_tarihi}'
-
-        req = urllib.request.Request(url)
-        req.add_header('apikey', SUPABASE_KEY)
-        req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
+    return hesapla_gercek_km_toplu([plaka], baslangic_tarihi, bitis_tarihi).get(plaka, 0)
 
-        with urllib.request.urlopen(req) as response:
-            rows = json.loads(response.read().decode())
+def get_table_count(table: str, filters: dict = None, method: str = 'exact', ttl: float = None) -> int:
+    """
+    Tablonun satır sayısını sadece sayım isteğiyle getir (satır indirilmez)
 
-        if len(rows) < 2:
-            return 0
+    HEAD isteği 'Prefer: count=<method>' ile gönderilir ve toplam Content-Range
+    başlığından okunur. method='estimated' büyük tablolarda planner tahminini
+    kullanır (daha hızlı, yaklaşık). Sonuç ttl saniye boyunca bellekte tutulur
+    (varsayılan COUNT_CACHE_TTL, 0 = önbelleksiz).
+    """
+    if ttl is None:
+        ttl = COUNT_CACHE_TTL
 
-        toplam_km = 0
-        onceki_km = None
+    cache_key = query_cache.make_key('get_table_count', (table, method), filters)
+    if ttl > 0:
+        found, total = query_cache.lookup(cache_key, 'get_table_count')
+        if found:
+            return total
 
-        for row in rows:
-            km = float(row['km_bilgisi']) if row.get('km_bilgisi') else 0
+    token = query_cache.snapshot((table,))
+    url = f"{_build_select_url(table, '*', filters)}&limit=1"
+    response = supabase_http('HEAD', url, headers={'Prefer': f'count={method}'})
+    if response.status_code >= 400:
+        raise Exception(f"Supabase error: {response.status_code} - sayım alınamadı ({table})")
 
-            if km > 0 and onceki_km is not None:
-                fark = km - onceki_km
-                if fark > 0:
-                    toplam_km += fark
+    total = parse_content_range_total(response.headers.get('Content-Range'))
+    if total is None:
+        raise Exception(f"Content-Range başlığında toplam yok ({table})")
 
-            if km > 0:
-                onceki_km = km
+    query_cache.store(cache_key, total, ttl, tables=(table,), token=token)
 
-        return toplam_km
-    except Exception as e:
-        print(f"Error calculating km: {e}")
-        return 0
+    return total
 
 def get_database_info() -> Dict[str, Any]:
     """Veritabanı bilgilerini getir"""
@@ -204,17 +579,17 @@ def get_database_info() -> Dict[str, Any]:
         arac_takip_count = 0
 
         try:
-            yakit_count = len(fetch_all_paginated('yakit', select='id'))
+            yakit_count = get_table_count('yakit')
         except:
             pass
 
         try:
-            agirlik_count = len(fetch_all_paginated('agirlik', select='id'))
+            agirlik_count = get_table_count('agirlik')
         except:
             pass
 
         try:
-            arac_takip_count = len(fetch_all_paginated('arac_takip', select='id'))
+            arac_takip_count = get_table_count('arac_takip')
         except:
             pass
 
@@ -238,13 +613,140 @@ def get_database_info() -> Dict[str, Any]:
             'error': str(e)
         }
 
+@cached(ttl=DATA_CACHE_TTL, tables=('yakit',))
+def get_plaka_ozet() -> List[Dict]:
+    """Plaka bazlı yakıt toplamlarını sunucu tarafındaki yakit_plaka_ozet view'ından getir"""
+    return fetch_all_paginated('yakit_plaka_ozet')
+
+@cached(ttl=DATA_CACHE_TTL, tables=('yakit',))
+def get_aylik_ozet(baslangic_tarihi: str = None, bitis_tarihi: str = None) -> List[Dict]:
+    """Ay bazlı yakıt toplamlarını yakit_aylik_ozet view'ından getir"""
+    return fetch_all_paginated('yakit_aylik_ozet',
+                               filters=tarih_filtresi('ay', baslangic_tarihi, bitis_tarihi),
+                               order='ay.asc')
+
+ROLLUP_TABLE = 'plaka_aylik_rollup'
+# Tablo -> rollup ayının alındığı tarih kolonu
+ROLLUP_TARIH_KOLONLARI = {'yakit': 'islem_tarihi', 'agirlik': 'tarih'}
+
+_rollup_lock = threading.Lock()
+# Bu process'te eklenen ama rollup'ı henüz yenilenmemiş aylar (None = tüm aylar)
+_rollup_bekleyen: Optional[set] = set()
+
+def rollup_aylari(rows: List[Dict], tarih_kolonu: str) -> Optional[List[str]]:
+    """Satırların düştüğü aylar ('YYYY-MM-01'); ISO olmayan tarih varsa None (tüm aylar yenilenir)"""
+    aylar = set()
+    for row in rows:
+        tarih = row.get(tarih_kolonu)
+        if not tarih:
+            continue
+        tarih = str(tarih)
+        if len(tarih) < 7 or not (tarih[:4].isdigit() and tarih[4] == '-' and tarih[5:7].isdigit()):
+            return None
+        aylar.add(f'{tarih[:7]}-01')
+    return sorted(aylar)
+
+def rollup_bekleyen_ekle(table: str, rows: List[Dict]):
+    """Eklenen satırların aylarını sonraki flush_aylik_rollup için işaretle"""
+    global _rollup_bekleyen
+    if table not in ROLLUP_TARIH_KOLONLARI:
+        return
+    aylar = rollup_aylari(rows, ROLLUP_TARIH_KOLONLARI[table])
+    with _rollup_lock:
+        if aylar is None or _rollup_bekleyen is None:
+            _rollup_bekleyen = None
+        else:
+            _rollup_bekleyen.update(aylar)
+
+def refresh_aylik_rollup(aylar: Optional[List[str]] = None) -> bool:
+    """plaka_aylik_rollup'ı verilen aylar için yeniden hesapla (None = tüm aylar)"""
+    if aylar is not None and not aylar:
+        return True
+    try:
+        response = supabase_http('POST', f'{SUPABASE_URL}/rest/v1/rpc/plaka_aylik_rollup_yenile',
+                                 data={'aylar': sorted(aylar) if aylar is not None else None})
+        if response.status_code >= 400:
+            logger.warning(f"Aylık rollup yenilenemedi: {response.status_code} - {response.text}")
+            return False
+        query_cache.invalidate(ROLLUP_TABLE)
+        return True
+    except Exception as e:
+        logger.warning(f"Aylık rollup yenilenemedi: {e}")
+        return False
+
+def flush_aylik_rollup() -> bool:
+    """Bu process'te eklenen satırların aylarını yenile (yükleme sonunda çağrılır)"""
+    global _rollup_bekleyen
+    with _rollup_lock:
+        bekleyen, _rollup_bekleyen = _rollup_bekleyen, set()
+    if bekleyen is not None and not bekleyen:
+        return True
+
+    if refresh_aylik_rollup(sorted(bekleyen) if bekleyen is not None else None):
+        return True
+
+    # Yenileme başarısızsa aylar bir sonraki denemeye kalsın
+    with _rollup_lock:
+        if bekleyen is None or _rollup_bekleyen is None:
+            _rollup_bekleyen = None
+        else:
+            _rollup_bekleyen.update(bekleyen)
+    return False
+
+@cached(ttl=DATA_CACHE_TTL, tables=(ROLLUP_TABLE,))
+def get_aylik_rollup(baslangic_ay: str = None, bitis_ay: str = None, plaka: str = None) -> List[Dict]:
+    """plaka_aylik_rollup satırları (ay = ayın ilk günü); tablo yoksa hata fırlatır"""
+    filters = tarih_filtresi('ay', baslangic_ay, bitis_ay)
+    if plaka:
+        filters['plaka'] = f'eq.{urllib.parse.quote(plaka)}'
+    return fetch_all_paginated(ROLLUP_TABLE, filters=filters)
+
+def get_tablo_sayilari() -> Dict[str, int]:
+    """yakit, agirlik ve arac_takip satır sayılarını tablo_sayilari() RPC'si ile getir"""
+    response = supabase_http('POST', f'{SUPABASE_URL}/rest/v1/rpc/tablo_sayilari', data={})
+    if response.status_code >= 400:
+        raise Exception(f"Supabase error: {response.status_code} - {response.text}")
+    return response.json()
+
+def _get_statistics_ozet() -> Dict[str, Any]:
+    """İstatistikleri sunucu tarafı özet view/RPC'lerinden hesapla (birkaç KB veri)"""
+    plaka_ozet = get_plaka_ozet()
+    sayilar = get_tablo_sayilari()
+
+    toplam_yakit = sum(float(row.get('toplam_yakit') or 0) for row in plaka_ozet)
+    toplam_maliyet = sum(float(row.get('toplam_maliyet') or 0) for row in plaka_ozet)
+    plakalar = sorted(row['plaka'] for row in plaka_ozet if row.get('plaka'))
+
+    yakit_kayit = int(sayilar.get('yakit', 0) or 0)
+    agirlik_kayit = int(sayilar.get('agirlik', 0) or 0)
+    arac_takip_kayit = int(sayilar.get('arac_takip', 0) or 0)
+
+    return {
+        'toplam_yakit': round(toplam_yakit, 2),
+        'toplam_maliyet': round(toplam_maliyet, 2),
+        'plaka_sayisi': len(plakalar),
+        'plakalar': plakalar,
+        'yakit_kayit': yakit_kayit,
+        'agirlik_kayit': agirlik_kayit,
+        'arac_takip_kayit': arac_takip_kayit,
+        'toplam_kayit': yakit_kayit + agirlik_kayit + arac_takip_kayit
+    }
+
+@cached(ttl=DATA_CACHE_TTL, tables=('yakit', 'agirlik', 'arac_takip'),
+        cache_if=lambda stats: stats.get('toplam_kayit', 0) > 0)
 def get_statistics() -> Dict[str, Any]:
     """İstatistikleri getir"""
+    # Önce sunucu tarafı özetleri dene (migration uygulanmamışsa ham veriye düş)
+    try:
+        return _get_statistics_ozet()
+    except Exception as e:
+        logger.warning(f"Özet view'ları kullanılamadı, ham veriden hesaplanıyor: {e}")
+
     try:
         # Tablolar boşsa bile hata vermemesi için güvenli veri çekimi
         yakit_data = []
-        agirlik_data = []
-        arac_takip_data = []
+        agirlik_kayit = 0
+        arac_takip_kayit = 0
 
         try:
             yakit_data = fetch_all_paginated('yakit', select='yakit_miktari,satir_tutari,plaka')
@@ -252,12 +754,12 @@ def get_statistics() -> Dict[str, Any]:
             pass
 
         try:
-            agirlik_data = fetch_all_paginated('agirlik', select='id')
+            agirlik_kayit = get_table_count('agirlik')
         except:
             pass
 
         try:
-            arac_takip_data = fetch_all_paginated('arac_takip', select='id')
+            arac_takip_kayit = get_table_count('arac_takip')
         except:
             pass
 
@@ -271,9 +773,9 @@ def get_statistics() -> Dict[str, Any]:
             'plaka_sayisi': len(plakalar),
             'plakalar': sorted(plakalar) if plakalar else [],
             'yakit_kayit': len(yakit_data),
-            'agirlik_kayit': len(agirlik_data),
-            'arac_takip_kayit': len(arac_takip_data),
-            'toplam_kayit': len(yakit_data) + len(agirlik_data) + len(arac_takip_data)
+            'agirlik_kayit': agirlik_kayit,
+            'arac_takip_kayit': arac_takip_kayit,
+            'toplam_kayit': len(yakit_data) + agirlik_kayit + arac_takip_kayit
         }
     except Exception as e:
         print(f"⚠️ get_statistics hatası: {e}")
@@ -288,6 +790,7 @@ def get_statistics() -> Dict[str, Any]:
             'toplam_kayit': 0
         }
 
+@cached(ttl=ARAC_CACHE_TTL, tables=('araclar', 'yakit'))
 def get_aktif_kargo_araclari() -> List[str]:
     """Aktif kargo araçlarını getir"""
     try:
@@ -299,14 +802,14 @@ def get_aktif_kargo_araclari() -> List[str]:
         # Eğer araclar tablosu boşsa, yakit tablosundaki tüm plakaları kullan
         if not plakalar:
             print("⚠️ araclar tablosu boş, yakit tablosundaki plakalar kullanılıyor...")
-            yakit_data = fetch_all_paginated('yakit', select='plaka')
-            plakalar = sorted(list(set(row['plaka'] for row in yakit_data if row.get('plaka'))))
+            plakalar = get_all_plakas()
 
         return plakalar
     except Exception as e:
         print(f"⚠️ get_aktif_kargo_araclari hatası: {e}")
         return []
 
+@cached(ttl=ARAC_CACHE_TTL, tables=('araclar', 'yakit'))
 def get_aktif_binek_araclar(dahil_taseron: bool = False) -> List[str]:
     """Aktif binek araçları getir"""
     try:
@@ -320,14 +823,14 @@ def get_aktif_binek_araclar(dahil_taseron: bool = False) -> List[str]:
         # Eğer araclar tablosu boşsa, yakit tablosundaki tüm plakaları kullan
         if not plakalar:
             print("⚠️ araclar tablosu boş, yakit tablosundaki plakalar kullanılıyor...")
-            yakit_data = fetch_all_paginated('yakit', select='plaka')
-            plakalar = sorted(list(set(row['plaka'] for row in yakit_data if row.get('plaka'))))
+            plakalar = get_all_plakas()
 
         return plakalar
     except Exception as e:
         print(f"⚠️ get_aktif_binek_araclar hatası: {e}")
         return []
 
+@cached(ttl=ARAC_CACHE_TTL, tables=('araclar', 'yakit'))
 def get_aktif_is_makineleri(dahil_taseron: bool = False) -> List[str]:
     """Aktif iş makinelerini getir"""
     try:
@@ -341,22 +844,28 @@ def get_aktif_is_makineleri(dahil_taseron: bool = False) -> List[str]:
         # Eğer araclar tablosu boşsa, yakit tablosundaki tüm plakaları kullan
         if not plakalar:
             print("⚠️ araclar tablosu boş, yakit tablosundaki plakalar kullanılıyor...")
-            yakit_data = fetch_all_paginated('yakit', select='plaka')
-            plakalar = sorted(list(set(row['plaka'] for row in yakit_data if row.get('plaka'))))
+            plakalar = get_all_plakas()
 
         return plakalar
     except Exception as e:
         print(f"⚠️ get_aktif_is_makineleri hatası: {e}")
         return []
 
+@cached(ttl=DATA_CACHE_TTL, tables=('yakit',))
 def get_all_plakas() -> List[str]:
     """Tüm plakaları getir"""
+    try:
+        return sorted(row['plaka'] for row in get_plaka_ozet() if row.get('plaka'))
+    except Exception:
+        pass
+
     try:
         data = fetch_all_paginated('yakit', select='plaka')
         return sorted(list(set(row['plaka'] for row in data)))
     except:
         return []
 
+@cached(ttl=ARAC_CACHE_TTL, tables=('araclar',))
 def get_all_araclar() -> List[Dict]:
     """Tüm araçları getir"""
     try:
@@ -375,6 +884,7 @@ def add_arac(plaka: str, sahip: str, arac_tipi: str, notlar: str = '') -> Dict:
             'aktif': 1
         }
         supabase_request('araclar', method='POST', data=data)
+        query_cache.invalidate('araclar')
         return {'status': 'success'}
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
@@ -389,6 +899,7 @@ def update_arac(plaka: str, sahip: str, arac_tipi: str, aktif: int, notlar: str
             'notlar': notlar
         }
         supabase_request(f'araclar?plaka=eq.{urllib.parse.quote(plaka)}', method='PATCH', data=data)
+        query_cache.invalidate('araclar')
         return {'status': 'success'}
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
@@ -397,6 +908,7 @@ def delete_arac(plaka: str) -> Dict:
     """Araç sil"""
     try:
         supabase_request(f'araclar?plaka=eq.{urllib.parse.quote(plaka)}', method='DELETE')
+        query_cache.invalidate('araclar')
         return {'status': 'success'}
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
@@ -422,6 +934,7 @@ def bulk_import_araclar() -> Dict:
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
 
+@cached(ttl=ARAC_CACHE_TTL, tables=('araclar', 'yakit'))
 def get_plakalar_by_type(arac_tipi: str = None) -> List[str]:
     """Araç tipine göre plakaları getir"""
     try:
@@ -448,6 +961,8 @@ def update_arac_bulk_sahip(plakalar: List[str], sahip: str) -> int:
             basarili += 1
         except:
             pass
+    if basarili:
+        query_cache.invalidate('araclar')
     return basarili
 
 def update_arac_bulk_aktif(plakalar: List[str], aktif: int) -> int:
@@ -459,41 +974,109 @@ def update_arac_bulk_aktif(plakalar: List[str], aktif: int) -> int:
             basarili += 1
         except:
             pass
+    if basarili:
+        query_cache.invalidate('araclar')
     return basarili
 
-def get_muhasebe_data(baslangic_tarihi: str = None, bitis_tarihi: str = None, plaka: str = None) -> Dict:
-    """Muhasebe verilerini hesapla"""
-    try:
-        agirlik_filters = {}
-        if baslangic_tarihi and bitis_tarihi:
-            agirlik_filters['tarih'] = f'and(gte.{baslangic_tarihi},lte.{bitis_tarihi})'
-        elif baslangic_tarihi:
-            agirlik_filters['tarih'] = f'gte.{baslangic_tarihi}'
-        elif bitis_tarihi:
-            agirlik_filters['tarih'] = f'lte.{bitis_tarihi}'
-        if plaka:
-            agirlik_filters['plaka'] = f'eq.{urllib.parse.quote(plaka)}'
+def _tam_aylar(baslangic_tarihi: str = None, bitis_tarihi: str = None):
+    """
+    Tarih aralığını rollup'tan okunacak tam aylar ve ham veriden okunacak kenarlara böl
 
-        agirlik_data = fetch_all_paginated('agirlik', filters=agirlik_filters)
+    Returns:
+        (ilk_ay, son_ay, kenarlar) - ilk_ay/son_ay 'YYYY-MM-01' veya açık uç için None,
+        kenarlar [(baslangic, bitis), ...] ham okunacak kısmi ay aralıkları.
+        Aralıkta tam ay yoksa veya tarih ISO değilse None.
+    """
+    from datetime import date, timedelta
 
-        yakit_filters = {}
-        if baslangic_tarihi and bitis_tarihi:
-            yakit_filters['islem_tarihi'] = f'and(gte.{baslangic_tarihi},lte.{bitis_tarihi})'
-        elif baslangic_tarihi:
-            yakit_filters['islem_tarihi'] = f'gte.{baslangic_tarihi}'
-        elif bitis_tarihi:
-            yakit_filters['islem_tarihi'] = f'lte.{bitis_tarihi}'
+    try:
+        baslangic = date.fromisoformat(baslangic_tarihi[:10]) if baslangic_tarihi else None
+        bitis = date.fromisoformat(bitis_tarihi[:10]) if bitis_tarihi else None
+    except ValueError:
+        return None
+
+    def sonraki_ay(gun):
+        return date(gun.year + gun.month // 12, gun.month % 12 + 1, 1)
+
+    kenarlar = []
+    ilk_ay = son_ay = None
+    if baslangic:
+        ilk_ay = baslangic if baslangic.day == 1 else sonraki_ay(baslangic)
+        if ilk_ay != baslangic:
+            kenarlar.append((baslangic.isoformat(), (ilk_ay - timedelta(days=1)).isoformat()))
+    if bitis:
+        bitis_ayi = bitis.replace(day=1)
+        son_ay = bitis_ayi if sonraki_ay(bitis) == bitis + timedelta(days=1) else \
+            (bitis_ayi - timedelta(days=1)).replace(day=1)
+        if son_ay != bitis_ayi:
+            kenarlar.append((bitis_ayi.isoformat(), bitis.isoformat()))
+
+    if ilk_ay and son_ay and ilk_ay > son_ay:
+        return None
+
+    return (ilk_ay.isoformat() if ilk_ay else None,
+            son_ay.isoformat() if son_ay else None,
+            kenarlar)
+
+def _muhasebe_satirlari(baslangic_tarihi: str = None, bitis_tarihi: str = None, plaka: str = None,
+                        sadece_tarihsiz: bool = False):
+    """Muhasebe için ham agirlik (miktar) ve yakit (satir_tutari) satırları"""
+    def filtreler(kolon):
+        if sadece_tarihsiz:
+            filters = {kolon: 'is.null'}
+        else:
+            filters = tarih_filtresi(kolon, baslangic_tarihi, bitis_tarihi)
         if plaka:
-            yakit_filters['plaka'] = f'eq.{urllib.parse.quote(plaka)}'
+            filters['plaka'] = f'eq.{urllib.parse.quote(plaka)}'
+        return filters
 
-        yakit_data = fetch_all_paginated('yakit', filters=yakit_filters)
+    agirlik_data = fetch_all_paginated('agirlik', select='plaka,miktar', filters=filtreler('tarih'))
+    yakit_data = fetch_all_paginated('yakit', select='plaka,satir_tutari', filters=filtreler('islem_tarihi'))
+    return agirlik_data, yakit_data
 
-        toplam_gelir = sum(float(row.get('miktar', 0) or 0) * 50 for row in agirlik_data)
-        toplam_gider = sum(float(row.get('satir_tutari', 0) or 0) for row in yakit_data)
-        net_kar = toplam_gelir - toplam_gider
-        kar_marji = (net_kar / toplam_gelir * 100) if toplam_gelir > 0 else 0
+@cached(ttl=DATA_CACHE_TTL, tables=('yakit', 'agirlik', ROLLUP_TABLE),
+        cache_if=lambda sonuc: sonuc.get('status') == 'success')
+def get_muhasebe_data(baslangic_tarihi: str = None, bitis_tarihi: str = None, plaka: str = None) -> Dict:
+    """
+    Muhasebe verilerini hesapla
+
+    Aralıktaki tam aylar plaka_aylik_rollup'tan, kısmi aylar (ve tarih filtresi
+    yoksa tarihsiz satırlar) ham tablolardan okunur. Rollup tablosu yoksa
+    tüm aralık ham veriden hesaplanır.
+    """
+    try:
+        agirlik_data, yakit_data, rollup = [], [], None
+
+        aralik = _tam_aylar(baslangic_tarihi, bitis_tarihi)
+        if aralik is not None:
+            ilk_ay, son_ay, kenarlar = aralik
+            try:
+                flush_aylik_rollup()
+                rollup = get_aylik_rollup(ilk_ay, son_ay, plaka)
+            except Exception as e:
+                logger.warning(f"Aylık rollup kullanılamadı, ham veriden hesaplanıyor: {e}")
+
+        if rollup is None:
+            agirlik_data, yakit_data = _muhasebe_satirlari(baslangic_tarihi, bitis_tarihi, plaka)
+            rollup = []
+        else:
+            for kenar_baslangic, kenar_bitis in kenarlar:
+                agirlik, yakit = _muhasebe_satirlari(kenar_baslangic, kenar_bitis, plaka)
+                agirlik_data.extend(agirlik)
+                yakit_data.extend(yakit)
+            if not baslangic_tarihi and not bitis_tarihi:
+                agirlik, yakit = _muhasebe_satirlari(plaka=plaka, sadece_tarihsiz=True)
+                agirlik_data.extend(agirlik)
+                yakit_data.extend(yakit)
 
         plaka_bazli = {}
+        for row in rollup:
+            p = row['plaka']
+            if p not in plaka_bazli:
+                plaka_bazli[p] = {'gelir': 0, 'gider': 0}
+            plaka_bazli[p]['gelir'] += float(row.get('agirlik_miktar', 0) or 0) * 50
+            plaka_bazli[p]['gider'] += float(row.get('yakit_maliyet', 0) or 0)
+
         for row in agirlik_data:
             p = row['plaka']
             if p not in plaka_bazli:
@@ -509,6 +1092,11 @@ def get_muhasebe_data(baslangic_tarihi: str = None, bitis_tarihi: str = None, pl
         for p in plaka_bazli:
             plaka_bazli[p]['kar'] = plaka_bazli[p]['gelir'] - plaka_bazli[p]['gider']
 
+        toplam_gelir = sum(v['gelir'] for v in plaka_bazli.values())
+        toplam_gider = sum(v['gider'] for v in plaka_bazli.values())
+        net_kar = toplam_gelir - toplam_gider
+        kar_marji = (net_kar / toplam_gelir * 100) if toplam_gelir > 0 else 0
+
         return {
             'status': 'success',
             'toplam_gelir': round(toplam_gelir, 2),
@@ -520,27 +1108,31 @@ def get_muhasebe_data(baslangic_tarihi: str = None, bitis_tarihi: str = None, pl
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
 
+@cached(ttl=DATA_CACHE_TTL, tables=('yakit',))
 def get_yakit_data() -> List[Dict]:
     """Aktif araçların yakıt verilerini çek"""
     try:
-        return fetch_all_paginated('yakit', order='islem_tarihi.desc')
+        return fetch_all_paginated('yakit', order='islem_tarihi.desc', parallel=True)
     except:
         return []
 
+@cached(ttl=DATA_CACHE_TTL, tables=('agirlik',))
 def get_agirlik_data() -> List[Dict]:
     """Aktif araçların ağırlık verilerini çek"""
     try:
-        return fetch_all_paginated('agirlik', order='tarih.desc')
+        return fetch_all_paginated('agirlik', order='tarih.desc', parallel=True)
     except:
         return []
 
+@cached(ttl=DATA_CACHE_TTL, tables=('arac_takip',))
 def get_arac_takip_data() -> List[Dict]:
     """Araç takip verilerini çek"""
     try:
-        return fetch_all_paginated('arac_takip', order='created_at.desc')
+        return fetch_all_paginated('arac_takip', order='created_at.desc', parallel=True)
     except:
         return []
 
+@cached(ttl=DATA_CACHE_TTL, tables=('yakit',))
 def get_yakit_by_plaka(plaka: str) -> List[Dict]:
     """Belirli bir plakaya ait yakıt verilerini getir"""
     try:
@@ -548,6 +1140,7 @@ def get_yakit_by_plaka(plaka: str) -> List[Dict]:
     except:
         return []
 
+@cached(ttl=DATA_CACHE_TTL, tables=('agirlik',))
 def get_agirlik_by_plaka(plaka: str, sadece_urun: bool = False) -> List[Dict]:
     """Belirli bir plakaya ait ağırlık verilerini getir"""
     try:
@@ -558,6 +1151,7 @@ def get_agirlik_by_plaka(plaka: str, sadece_urun: bool = False) -> List[Dict]:
     except:
         return []
 
+@cached(ttl=DATA_CACHE_TTL, tables=('arac_takip',))
 def get_arac_takip_by_plaka(plaka: str) -> List[Dict]:
     """Belirli bir plakaya ait araç takip verilerini getir"""
     try:
@@ -0,0 +1,189 @@
+"""
+Yüklenen kayıtlar için duplicate kontrolü (record_hash)
+
+Tablodaki bütün hash'ler çekilmez; iki mod vardır (DEDUP_MODE):
+
+- 'upsert' (varsayılan): kayıtlar bulk_writer ile on_conflict=record_hash ve
+  Prefer: resolution=ignore-duplicates olarak gönderilir, çakışan satırları
+  veritabanı atlar. record_hash üzerinde unique index gerekir
+  (20260120090000_record_hash_unique migration'ı). Index yoksa tablo için
+  otomatik olarak 'sorgu' moduna geçilir.
+- 'sorgu': sadece yüklenecek kayıtların hash'leri record_hash=in.(...) ile
+  HASH_SORGU_PARCA'lık parçalar halinde sorulur, bulunmayanlar eklenir.
+
+Ağa gitmeden önce yerel hash dosyasına bakılır: tablonun snapshot'ındaki
+(snapshot_store) record_hash kolonu sıralanıp SNAPSHOT_DIR/<tablo>.hashes.npy
+olarak saklanır ve np.searchsorted ile aranır. Dosya snapshot watermark'ı
+değiştikçe yeniden oluşturulur. Burada bulunan kayıtlar kesin olarak
+veritabanında vardır (snapshot sonrası silinmedikçe); bulunmayanlar yukarıdaki
+modla kontrol edilir.
+
+Kullanım:
+    bilinen = yerel_bilinen('yakit', hashler)       # bool Series, ağ yok
+    sonuc = kaydet('yakit', records)                # {'inserted': .., 'duplicates': .., 'failed': ..}
+    mevcut = mevcut_hashler('yakit', hashler)       # veritabanında olanlar (set)
+"""
+import os
+import json
+import tempfile
+import threading
+import logging
+from typing import Dict, Iterable, List, Set
+
+import numpy as np
+import pandas as pd
+
+from snapshot_store import SNAPSHOT_DIR, read_column, watermark
+
+logger = logging.getLogger(__name__)
+
+DEDUP_MODE = os.environ.get('DEDUP_MODE', 'upsert').lower()
+# Yerel hash dosyası kullanılsın mı (snapshot varsa)
+DEDUP_LOCAL = os.environ.get('DEDUP_LOCAL', '1') != '0'
+# in.() filtresine tek istekte konan hash sayısı (URL uzunluğu ~7 KB)
+HASH_SORGU_PARCA = 200
+
+_lock = threading.Lock()
+# tablo -> (watermark anahtarı, sıralı hash dizisi)
+_yerel: Dict[str, tuple] = {}
+# on_conflict=record_hash desteklemeyen (unique index'i olmayan) tablolar
+_upsert_yok: Set[str] = set()
+
+
+# --- Yerel hash dosyası ---
+
+def _hash_path(table: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f'{table}.hashes.npy')
+
+
+def _hash_meta_path(table: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f'{table}.hashes.json')
+
+
+def _diske_yaz(table: str, dizi: np.ndarray, wm: Dict):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    for path, writer in ((_hash_path(table), lambda f: np.save(f, dizi)),
+                         (_hash_meta_path(table), lambda f: f.write(json.dumps(wm).encode()))):
+        fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer(f)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def _diskten_oku(table: str, wm: Dict):
+    try:
+        with open(_hash_meta_path(table), 'r') as f:
+            if json.load(f) != wm:
+                return None
+        return np.load(_hash_path(table), mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+
+def _yerel_hashler(table: str):
+    """Snapshot'taki record_hash'lerin sıralı dizisi (snapshot yoksa None)"""
+    wm = watermark(table)
+    if not wm['satir_sayisi']:
+        return None
+
+    with _lock:
+        onceki = _yerel.get(table)
+        if onceki and onceki[0] == wm:
+            return onceki[1]
+
+        dizi = _diskten_oku(table, wm)
+        if dizi is None:
+            kolon = read_column(table, 'record_hash')
+            if kolon is None:
+                return None
+            dizi = np.unique(kolon.dropna().astype(str).to_numpy(dtype='S32'))
+            try:
+                _diske_yaz(table, dizi, wm)
+            except OSError as e:
+                logger.warning(f"{table} hash dosyası yazılamadı: {e}")
+
+        _yerel[table] = (wm, dizi)
+        return dizi
+
+
+def yerel_bilinen(table: str, hashler: pd.Series) -> pd.Series:
+    """Yerel hash dosyasında bulunan (veritabanında olduğu bilinen) kayıtlar"""
+    bilinen = pd.Series(False, index=hashler.index)
+    dizi = _yerel_hashler(table) if DEDUP_LOCAL else None
+    if dizi is None or not len(dizi) or hashler.empty:
+        return bilinen
+
+    aranan = hashler.astype(str).to_numpy(dtype='S32')
+    konum = np.minimum(np.searchsorted(dizi, aranan), len(dizi) - 1)
+    bilinen[:] = dizi[konum] == aranan
+    return bilinen
+
+
+# --- Veritabanı kontrolü ---
+
+def mevcut_hashler(table: str, hashler: Iterable[str]) -> Set[str]:
+    """Verilen hash'lerden tabloda bulunanlar (record_hash=in.(...) ile parça parça)"""
+    from database import SUPABASE_URL, supabase_http
+
+    hashler = sorted({h for h in hashler if h})
+    mevcut = set()
+    for i in range(0, len(hashler), HASH_SORGU_PARCA):
+        parca = ','.join(hashler[i:i + HASH_SORGU_PARCA])
+        url = f'{SUPABASE_URL}/rest/v1/{table}?select=record_hash&record_hash=in.({parca})'
+        response = supabase_http('GET', url)
+        response.raise_for_status()
+        mevcut.update(row['record_hash'] for row in response.json() if row.get('record_hash'))
+    return mevcut
+
+
+def kaydet(table: str, records: List[Dict]) -> Dict[str, int]:
+    """
+    Kayıtları (record_hash'li) bulk_writer ile ekle, tabloda zaten olanları atla
+
+    Dönen: {'inserted': eklenen, 'duplicates': zaten var olduğu için atlanan,
+    'failed': yazılamayan}.
+    """
+    import bulk_writer
+
+    sonuc = {'inserted': 0, 'duplicates': 0, 'failed': 0}
+    if DEDUP_MODE == 'upsert' and table not in _upsert_yok:
+        rapor = bulk_writer.yaz(table, records, on_conflict='record_hash')
+        sonuc['inserted'] += rapor['inserted']
+        sonuc['duplicates'] += rapor['duplicates']
+
+        # 42P10: ON CONFLICT için uygun unique index yok (migration uygulanmamış)
+        kalan = []
+        for hata in rapor['hatalar']:
+            if hata['kod'] == '42P10':
+                kalan.extend(records[hata['baslangic']:hata['baslangic'] + hata['satir']])
+            else:
+                sonuc['failed'] += hata['satir']
+        if not kalan:
+            return sonuc
+
+        logger.warning(f"{table}.record_hash unique değil, sorgu ile duplicate kontrolüne geçiliyor")
+        with _lock:
+            _upsert_yok.add(table)
+        records = kalan
+
+    try:
+        mevcut = mevcut_hashler(table, (r.get('record_hash') for r in records))
+    except Exception as e:
+        logger.error(f"{table} duplicate kontrolü yapılamadı, {len(records)} kayıt yazılmadı: {e}")
+        sonuc['failed'] += len(records)
+        return sonuc
+
+    yeni = [r for r in records if r.get('record_hash') not in mevcut]
+    sonuc['duplicates'] += len(records) - len(yeni)
+    if yeni:
+        rapor = bulk_writer.yaz(table, yeni)
+        sonuc['inserted'] += rapor['inserted']
+        sonuc['duplicates'] += rapor['duplicates']
+        sonuc['failed'] += rapor['failed']
+    return sonuc
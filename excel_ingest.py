@@ -0,0 +1,470 @@
+"""
+Excel dosyalarını parça parça okuyup Supabase'e yükleme
+
+Dosya bir kerede pd.read_excel ile okunmaz; satırlar EXCEL_CHUNK_SIZE'lık
+parçalar halinde okunur (xlsx: openpyxl read_only + iter_rows, xls: xlrd
+satır satır). Her parça normalize edilir, kayıtlara çevrilir, hash'lenir ve
+duplicate'ler ayıklanır (bkz. dedup.py). Parça Supabase'e arka plandaki tek bir
+thread ile yazılırken sonraki parça okunur; bellekte aynı anda en fazla iki
+parça bulunur.
+
+Hücre dönüşümleri ve tip çıkarımı pandas.read_excel ile aynıdır (aynı
+TextParser kullanılır). Kayıtların record_hash'leri eski yükleme yoluyla
+(pd.read_excel + iterrows + str) aynıdır; tek istisna tam sayı değerli metin
+alanlarıdır (saat, islem_noktasi, ...). Eski yolda böyle bir kolonda dosyanın
+herhangi bir yerinde boş hücre varsa kolon float64 okunur ve değer "10.0"
+yazılırdı; tip artık parçaya göre değiştiği için bu alanlar her zaman "10"
+yazılır (_metin_alan). Bu sürümden önce yüklenmiş böyle satırların hash'i bir
+kereye mahsus farklıdır: eski bir dosya tekrar yüklenirse bu satırlar yeni
+kayıt olarak eklenir.
+
+Kullanım:
+    sonuc = excel_yukle(file, 'yakit')
+    # {'total': ..., 'inserted': ..., 'duplicates': ..., 'skipped': ...}
+"""
+import os
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+import dedup
+
+logger = logging.getLogger(__name__)
+
+# Tek seferde okunan satır sayısı
+EXCEL_CHUNK_SIZE = int(os.environ.get('EXCEL_CHUNK_SIZE', '5000'))
+
+_XLSX_IMZA = b'PK\x03\x04'
+_XLS_IMZA = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+def create_record_hash(record: dict) -> str:
+    """Kayıt için benzersiz hash oluştur (duplicate kontrolü için)"""
+    key_parts = []
+    for key in sorted(record.keys()):
+        if record[key] is not None:
+            key_parts.append(f"{key}:{record[key]}")
+    hash_string = '|'.join(key_parts)
+    return hashlib.md5(hash_string.encode()).hexdigest()
+
+
+def kolonlari_normalize_et(columns: pd.Index) -> pd.Index:
+    """Sütun isimlerini normalize et (Türkçe karakter + boşluk temizle)"""
+    columns = columns.str.strip().str.lower()
+    columns = columns.str.replace('ı', 'i').str.replace('ğ', 'g').str.replace('ü', 'u').str.replace('ş', 's').str.replace('ö', 'o').str.replace('ç', 'c')
+    return columns.str.replace(' ', '_').str.replace('.', '')
+
+
+# --- Satır okuyucular (hücre dönüşümleri pandas'ın excel okuyucularıyla aynı) ---
+
+def _xlsx_satirlari(file) -> Iterator[list]:
+    from openpyxl import load_workbook
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    def hucre(cell):
+        if cell.value is None:
+            return ''
+        if cell.data_type == TYPE_ERROR:
+            return np.nan
+        if cell.data_type == TYPE_NUMERIC:
+            val = int(cell.value)
+            return val if val == cell.value else float(cell.value)
+        return cell.value
+
+    book = load_workbook(file, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = book.worksheets[0]
+        sheet.reset_dimensions()
+        for row in sheet.rows:
+            yield [hucre(cell) for cell in row]
+    finally:
+        book.close()
+
+
+def _xls_satirlari(file) -> Iterator[list]:
+    import math
+    from datetime import time
+    from xlrd import (open_workbook, xldate, XL_CELL_BOOLEAN, XL_CELL_DATE,
+                      XL_CELL_ERROR, XL_CELL_NUMBER)
+
+    # xls formatı en fazla 65536 satır; xlrd sayfayı zaten tek seferde çözer,
+    # burada sadece DataFrame'e parça parça çevrilir
+    book = open_workbook(file_contents=file.read(), on_demand=True)
+    epoch1904 = book.datemode
+
+    def hucre(value, typ):
+        if typ == XL_CELL_DATE:
+            try:
+                value = xldate.xldate_as_datetime(value, epoch1904)
+            except OverflowError:
+                return value
+            # Sadece saat içeren hücreler epoch gününe düşer
+            if (not epoch1904 and value.timetuple()[0:3] == (1899, 12, 31)) or \
+                    (epoch1904 and value.timetuple()[0:3] == (1904, 1, 1)):
+                value = time(value.hour, value.minute, value.second, value.microsecond)
+        elif typ == XL_CELL_ERROR:
+            value = np.nan
+        elif typ == XL_CELL_BOOLEAN:
+            value = bool(value)
+        elif typ == XL_CELL_NUMBER and math.isfinite(value):
+            val = int(value)
+            if val == value:
+                value = val
+        return value
+
+    try:
+        sheet = book.sheet_by_index(0)
+        for i in range(sheet.nrows):
+            yield [hucre(value, typ) for value, typ in zip(sheet.row_values(i), sheet.row_types(i))]
+    finally:
+        book.release_resources()
+
+
+def _satir_okuyucu(file) -> Iterator[list]:
+    """Dosya içeriğine göre (uzantıya değil, pd.read_excel gibi) okuyucu seç"""
+    imza = file.read(8)
+    file.seek(0)
+    if imza.startswith(_XLSX_IMZA):
+        return _xlsx_satirlari(file)
+    if imza == _XLS_IMZA:
+        return _xls_satirlari(file)
+    raise ValueError('Excel dosyası okunamadı (desteklenmeyen format)')
+
+
+def excel_parcalari(file, chunk_size: int = None) -> Iterator[pd.DataFrame]:
+    """
+    İlk sayfanın satırlarını chunk_size'lık DataFrame'ler halinde döndür
+
+    İlk satır başlıktır; kolon isimleri normalize edilmiş olarak gelir. Sondaki
+    boş satırlar (pd.read_excel'deki gibi) atlanır, aradaki boş satırlar korunur.
+    """
+    chunk_size = chunk_size or EXCEL_CHUNK_SIZE
+
+    def sondaki_boslari_at(row):
+        while row and row[-1] == '':
+            row.pop()
+        return row
+
+    satirlar = _satir_okuyucu(file)
+    header = None
+    for row in satirlar:
+        header = sondaki_boslari_at(row)
+        break
+    if header is None:
+        return
+    genislik = len(header)
+
+    def parca(rows):
+        rows = [row[:genislik] + [''] * (genislik - len(row)) for row in rows]
+        df = TextParser([header] + rows, header=0).read()
+        df.columns = kolonlari_normalize_et(df.columns)
+        return df
+
+    rows = []
+    bos = []
+    for row in satirlar:
+        row = sondaki_boslari_at(row)
+        if not row:
+            # Dosyanın sonundaki boş satırlar sayılmaz; araya düşenler sonraki satırla eklenir
+            bos.append(row)
+            continue
+        if bos:
+            rows.extend(bos)
+            bos = []
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            yield parca(rows)
+            rows = []
+    if rows:
+        yield parca(rows)
+
+
+# --- Dosya tipine göre kayıt oluşturma ---
+#
+# Kayıtlar kolon bazında (satır döngüsü olmadan) oluşturulur. Değerler eski
+# iterrows döngüsündeki str(...) / float(...) dönüşümleriyle aynı metne
+# çevrilir. Metin alanlarında ondalıksız float değerler tam sayı yazılır
+# (_metin_alan); kolon tipi parçaya göre değişse de record_hash değişmez
+# (eski yoldan tek fark, bkz. modül açıklaması).
+
+# Alan -> sırayla denenecek kolon adları (ilk dolu olan kullanılır)
+ADAY_KOLONLAR = {
+    'yakit': {
+        'plaka': ['plaka', 'plate', 'arac', 'arac_plaka'],
+        'yakit_miktari': ['yakit_miktari', 'miktar', 'litre', 'lt', 'yakit'],
+        'birim_fiyat': ['birim_fiyat', 'fiyat', 'birim', 'price'],
+        'satir_tutari': ['satir_tutari', 'tutar', 'total', 'toplam'],
+    },
+    'agirlik': {
+        'plaka': ['plaka', 'plate', 'arac'],
+        'net_agirlik': ['net_agirlik', 'agirlik', 'net', 'tonaj', 'ton'],
+    },
+    'arac-takip': {
+        'plaka': ['plaka', 'plate', 'arac'],
+        'toplam_kilometre': ['toplam_kilometre', 'kilometre', 'km', 'mesafe'],
+    },
+}
+
+
+def kolonlari_coz(file_type: str, columns: pd.Index) -> Dict[str, List[str]]:
+    """Dosyada bulunan aday kolonlar (dosya başına bir kez)"""
+    return {alan: [col for col in adaylar if col in columns]
+            for alan, adaylar in ADAY_KOLONLAR[file_type].items()}
+
+
+def _bos(index: pd.Index) -> pd.Series:
+    return pd.Series(None, index=index, dtype=object)
+
+
+def _metin(s: pd.Series) -> pd.Series:
+    """Dolu değerler için str(deger); boşlar boş kalır (kayda None olarak yazılır)"""
+    sonuc = _bos(s.index)
+    dolu = s.notna()
+    if not dolu.any():
+        return sonuc
+    degerler = s[dolu]
+    if pd.api.types.is_datetime64_any_dtype(degerler):
+        # astype(str) gece yarısı saatlerini atar; str(Timestamp) atmaz
+        if ((degerler.dt.microsecond != 0) | (degerler.dt.nanosecond != 0)).any():
+            degerler = degerler.map(str)
+        else:
+            degerler = degerler.dt.strftime('%Y-%m-%d %H:%M:%S')
+    elif not pd.api.types.is_string_dtype(degerler) or degerler.dtype == object:
+        degerler = degerler.astype(str)
+    sonuc[dolu] = degerler.astype(object)
+    return sonuc
+
+
+def _metin_alan(s: pd.Series) -> pd.Series:
+    """
+    Metin alanları için _metin; ondalıksız float değerler tam sayı metni olur
+
+    Tam sayı kolonu boş hücre bulunan parçada float64, diğerlerinde int64
+    okunur; str(10.0) ile str(10) farkı record_hash'i parça sınırına bağlamasın.
+    Excel hücreleri zaten ondalıksızsa int okunur, sonuç object kolonla aynıdır.
+    """
+    if not pd.api.types.is_float_dtype(s):
+        return _metin(s)
+    sonuc = _metin(s)
+    tam = s.notna() & np.isfinite(s) & (s == np.floor(s)) & (s.abs() < 2 ** 53)
+    if tam.any():
+        sonuc[tam] = s[tam].astype('int64').astype(str).astype(object)
+    return sonuc
+
+
+def _sayi(s: pd.Series) -> pd.Series:
+    """Dolu değerler için float(deger), boşlar için NaN (metin değerler float() gibi çevrilir)"""
+    sonuc = pd.Series(np.nan, index=s.index, dtype='float64')
+    dolu = s.notna()
+    if dolu.any():
+        sonuc[dolu] = s[dolu].astype('float64')
+    return sonuc
+
+
+def _alan(df: pd.DataFrame, col: str) -> pd.Series:
+    return _metin_alan(df[col]) if col in df.columns else _bos(df.index)
+
+
+def _sayi_alan(df: pd.DataFrame, col: str) -> pd.Series:
+    return _sayi(df[col]) if col in df.columns else pd.Series(np.nan, index=df.index, dtype='float64')
+
+
+def _ilk_dolu(df: pd.DataFrame, adaylar: List[str], donustur, kosul=None) -> pd.Series:
+    """
+    Her satır için adaylardan ilk dolu kolonun dönüştürülmüş değeri
+
+    kosul verilirse koşulu sağlamayan değer atlanır ve sıradaki aday denenir.
+    Dönüşüm sadece o kolona düşen satırlara uygulanır.
+    """
+    sonuc = _bos(df.index)
+    kalan = pd.Series(True, index=df.index)
+    for col in adaylar:
+        sec = kalan & df[col].notna()
+        if not sec.any():
+            continue
+        deger = donustur(df.loc[sec, col])
+        if kosul is not None:
+            deger = deger[kosul(deger)]
+        sonuc[deger.index] = deger.astype(object)
+        kalan[deger.index] = False
+    return sonuc
+
+
+def _plaka_ve_deger(df: pd.DataFrame, kolonlar: Dict, deger_alani: str):
+    """Plaka ve zorunlu pozitif değeri bul; ikisinden biri boş olan satırları ayır"""
+    plaka = _ilk_dolu(df, kolonlar['plaka'], lambda s: _metin_alan(s).str.strip())
+    deger = _ilk_dolu(df, kolonlar[deger_alani], _sayi, lambda v: v > 0).astype('float64')
+
+    # Boş kayıtları atla
+    gecerli = plaka.notna() & plaka.ne('') & deger.notna()
+    return gecerli, plaka[gecerli], deger[gecerli]
+
+
+def _yakit_kayitlari(df: pd.DataFrame, kolonlar: Dict) -> Tuple[pd.DataFrame, int]:
+    gecerli, plaka, yakit_miktari = _plaka_ve_deger(df, kolonlar, 'yakit_miktari')
+    df = df[gecerli]
+
+    birim_fiyat = _ilk_dolu(df, kolonlar['birim_fiyat'], _sayi).astype('float64').fillna(0.0)
+    satir_tutari = _ilk_dolu(df, kolonlar['satir_tutari'], _sayi).astype('float64').fillna(0.0)
+    km_bilgisi = _sayi_alan(df, 'km_bilgisi')
+
+    kayit = pd.DataFrame({
+        'plaka': plaka,
+        'islem_tarihi': _alan(df, 'islem_tarihi'),
+        'saat': _alan(df, 'saat'),
+        'yakit_miktari': _metin(yakit_miktari),
+        'birim_fiyat': _metin(birim_fiyat),
+        'satir_tutari': _metin(satir_tutari),
+        'stok_adi': _alan(df, 'stok_adi').fillna('MOTORİN'),
+        'km_bilgisi': _metin(km_bilgisi.where(km_bilgisi > 0)),
+    })
+    return kayit, int((~gecerli).sum())
+
+
+def _agirlik_kayitlari(df: pd.DataFrame, kolonlar: Dict) -> Tuple[pd.DataFrame, int]:
+    gecerli, plaka, net_agirlik = _plaka_ve_deger(df, kolonlar, 'net_agirlik')
+    df = df[gecerli]
+
+    kayit = pd.DataFrame({
+        'tarih': _alan(df, 'tarih'),
+        'miktar': _metin(_sayi_alan(df, 'miktar')),
+        'birim': _alan(df, 'birim'),
+        'net_agirlik': _metin(net_agirlik),
+        'plaka': plaka,
+        'adres': _alan(df, 'adres'),
+        'islem_noktasi': _alan(df, 'islem_noktasi'),
+        'cari_adi': _alan(df, 'cari_adi'),
+    })
+    return kayit, int((~gecerli).sum())
+
+
+def _arac_takip_kayitlari(df: pd.DataFrame, kolonlar: Dict) -> Tuple[pd.DataFrame, int]:
+    gecerli, plaka, toplam_km = _plaka_ve_deger(df, kolonlar, 'toplam_kilometre')
+    df = df[gecerli]
+
+    kayit = pd.DataFrame({'plaka': plaka})
+    for col in ['sofor_adi', 'arac_gruplari', 'tarih', 'hareket_baslangic_tarihi', 'hareket_bitis_tarihi',
+                'baslangic_adresi', 'bitis_adresi']:
+        kayit[col] = _alan(df, col)
+    kayit['toplam_kilometre'] = _metin(toplam_km)
+    for col in ['hareket_suresi', 'rolanti_suresi', 'park_suresi']:
+        kayit[col] = _alan(df, col)
+    kayit['gunluk_yakit_tuketimi_l'] = _metin(_sayi_alan(df, 'gunluk_yakit_tuketimi_l'))
+    return kayit, int((~gecerli).sum())
+
+
+def _satir_tipleri(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    iterrows ile aynı değer tipleri: bütün kolonlar sayısalsa satırlar ortak
+    tipe yükselir (int kolonlar float olarak okunur, str(10) değil str(10.0))
+    """
+    if len(df.columns) and all(t.kind in 'iuf' for t in df.dtypes):
+        return df.astype(np.result_type(*df.dtypes))
+    return df
+
+
+def record_hashleri(kayit: pd.DataFrame) -> pd.Series:
+    """Her satır için create_record_hash ile aynı hash (kolon bazında birleştirilir)"""
+    metin = pd.Series('', index=kayit.index, dtype=object)
+    for key in sorted(kayit.columns):
+        dolu = kayit[key].notna()
+        if not dolu.any():
+            continue
+        parca = f'{key}:' + kayit.loc[dolu, key].astype(str)
+        onceki = metin[dolu]
+        metin[dolu] = np.where(onceki == '', parca, onceki + '|' + parca)
+    return pd.Series([hashlib.md5(m.encode()).hexdigest() for m in metin], index=kayit.index, dtype=object)
+
+
+# Yükleme formundaki tip -> (tablo, kayıt oluşturucu)
+DOSYA_TIPLERI = {
+    'yakit': ('yakit', _yakit_kayitlari),
+    'agirlik': ('agirlik', _agirlik_kayitlari),
+    'arac-takip': ('arac_takip', _arac_takip_kayitlari),
+}
+
+
+def excel_yukle(file, file_type: str, yaz: Callable[[str, List[Dict]], Dict] = None,
+                chunk_size: int = None, ilerleme: Callable[[Dict], None] = None,
+                manifest=None) -> Dict:
+    """
+    Excel dosyasını parça parça oku, yeni kayıtları tabloya yaz
+
+    Parça içinde tekrarlanan ve yerel hash dosyasında bulunan kayıtlar
+    duplicate sayılır; kalanlar yaz(table, records) ile yazılır. yaz
+    {'inserted', 'duplicates', 'failed'} döndürür (varsayılan: dedup.kaydet).
+    ilerleme verilirse her parça okunduğunda ve yazıldığında sayaçların
+    kopyasıyla çağrılır. manifest (upload_manifest.DosyaManifesti) verilirse
+    parçaların blok özetleri çıkarılır; önceki yüklemede aynen bulunan
+    bloklar işlenmeden duplicate (ya da o yüklemedeki gibi atlanan) sayılır.
+    """
+    if file_type not in DOSYA_TIPLERI:
+        raise ValueError(f"Geçersiz dosya tipi: {file_type}")
+    table, kayit_olustur = DOSYA_TIPLERI[file_type]
+    yaz = yaz or dedup.kaydet
+
+    sonuc = {'total': 0, 'inserted': 0, 'duplicates': 0, 'skipped': 0, 'failed': 0}
+    kolonlar = None
+
+    def bildir():
+        if ilerleme is not None:
+            ilerleme(dict(sonuc))
+
+    def topla(future):
+        yazilan = future.result()
+        sonuc['inserted'] += yazilan['inserted']
+        sonuc['duplicates'] += yazilan['duplicates']
+        sonuc['failed'] += yazilan.get('failed', 0)
+        bildir()
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='excel-yukle') as executor:
+        onceki = None
+        for df in excel_parcalari(file, chunk_size):
+            if kolonlar is None:
+                logger.info(f"Excel kolonları: {', '.join(df.columns.tolist()[:15])}")
+                kolonlar = kolonlari_coz(file_type, df.columns)
+
+            baslangic = sonuc['total']
+            sonuc['total'] += len(df)
+            if manifest is not None:
+                # Önceki yüklemeyle aynı kalan bloklar tekrar işlenmez
+                bilinen, atlanan = manifest.parca(baslangic, df)
+                sonuc['skipped'] += atlanan
+                sonuc['duplicates'] += int(bilinen.sum()) - atlanan
+                if bilinen.any():
+                    df = df[~bilinen]
+                if df.empty:
+                    bildir()
+                    continue
+
+            kayit, skipped = kayit_olustur(_satir_tipleri(df), kolonlar)
+            sonuc['skipped'] += skipped
+            if manifest is not None:
+                manifest.atlananlar(baslangic, df.index.difference(kayit.index))
+            del df
+
+            # Parça içindeki tekrarlar ve veritabanında olduğu yerelden bilinenler;
+            # önceki parçalarla tekrarları yaz (parçalar sırayla yazıldığı için) yakalar
+            hashler = record_hashleri(kayit)
+            tekrar = hashler.duplicated() | dedup.yerel_bilinen(table, hashler)
+            sonuc['duplicates'] += int(tekrar.sum())
+
+            kayit = kayit[~tekrar].assign(record_hash=hashler[~tekrar])
+            records = kayit.where(kayit.notna(), None).to_dict('records')
+            del kayit, hashler
+            bildir()
+
+            # Önceki parça yazılırken bu parça okundu; sıradaki için onu bekle
+            if onceki is not None:
+                topla(onceki)
+            onceki = executor.submit(yaz, table, records) if records else None
+
+        if onceki is not None:
+            topla(onceki)
+
+    return sonuc
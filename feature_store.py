@@ -0,0 +1,205 @@
+"""
+Plaka bazlı AI özellikleri (eğitim ve tahmin için ortak kaynak)
+
+YakitTahminModeli'nin plaka özellikleri (ort_yakit, std_yakit, sefer_sayisi,
+ort_km ve arac_takip ortalamaları) burada veri sürümü (snapshot watermark'ı)
+başına bir kez hesaplanır ve plaka indeksli bir DataFrame olarak tutulur.
+Eğitim de tahmin de aynı tabloyu okur; iki taraf aynı özellikleri görür.
+
+Her kolon için yeterli istatistikler (sayı, ortalama, M2) saklanır. Snapshot'a
+yeni satırlar eklendiğinde sadece id > son_id satırlarının istatistikleri
+hesaplanıp mevcutlarla birleştirilir (paralel varyans formülü). Satır sayısı
+tutmazsa (silme) tablo baştan hesaplanır. Durum SNAPSHOT_DIR içindeki
+plaka_ozellikleri.pkl dosyasında saklanır; worker'lar birbirinin hesabını kullanır.
+
+Kullanım:
+    df = plaka_ozellikleri()       # index: plaka, kolonlar: OZELLIKLER (eksikler NaN)
+    df.loc['34ABC001', 'ort_yakit']
+"""
+import os
+import pickle
+import tempfile
+import threading
+import logging
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from snapshot_store import SNAPSHOT_DIR, ensure_fresh, load_table, watermark
+
+logger = logging.getLogger(__name__)
+
+OZELLIK_PATH = os.path.join(SNAPSHOT_DIR, 'plaka_ozellikleri.pkl')
+
+# tablo -> {kaynak kolon: istatistik adı}
+KAYNAKLAR = {
+    'yakit': {'yakit_miktari': 'yakit', 'km_bilgisi': 'km'},
+    'arac_takip': {'toplam_kilometre': 'km_takip', 'maksimum_hiz': 'max_hiz',
+                   'gunluk_yakit_tuketimi_l': 'gunluk_yakit'},
+}
+
+OZELLIKLER = ['ort_yakit', 'std_yakit', 'sefer_sayisi', 'ort_km']
+TAKIP_OZELLIKLERI = ['ort_km_takip', 'ort_max_hiz', 'ort_gunluk_yakit']
+
+_lock = threading.Lock()
+# tablo -> {'son_id', 'satir_sayisi', 'istatistik'}
+_durum: Dict[str, Dict] = {}
+# (watermark anahtarı, özellik DataFrame'i)
+_ozellik_cache = (None, None)
+
+
+def _istatistik(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """Plaka başına sayı/ortalama/M2 (M2 = ortalamadan sapmaların kareleri toplamı)"""
+    gruplar = df.groupby('plaka', observed=True)
+    sonuc = {}
+    for column, ad in KAYNAKLAR[table].items():
+        n = gruplar[column].count()
+        sonuc[f'{ad}_n'] = n.astype('float64')
+        sonuc[f'{ad}_ort'] = gruplar[column].mean()
+        sonuc[f'{ad}_m2'] = gruplar[column].var(ddof=0) * n
+    sonuc = pd.DataFrame(sonuc)
+    sonuc.index = sonuc.index.astype(object)
+    return sonuc
+
+
+def _birlestir(a: pd.DataFrame, b: pd.DataFrame, table: str) -> pd.DataFrame:
+    """İki parçanın istatistiklerini birleştir (Chan ve ark. paralel varyans)"""
+    index = a.index.union(b.index)
+    a = a.reindex(index)
+    b = b.reindex(index)
+    sonuc = {}
+    for ad in KAYNAKLAR[table].values():
+        n1 = a[f'{ad}_n'].fillna(0)
+        n2 = b[f'{ad}_n'].fillna(0)
+        m1 = a[f'{ad}_ort'].fillna(0)
+        m2 = b[f'{ad}_ort'].fillna(0)
+        n = n1 + n2
+        delta = m2 - m1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ort = m1 + delta * n2 / n
+            m2_top = a[f'{ad}_m2'].fillna(0) + b[f'{ad}_m2'].fillna(0) + delta ** 2 * n1 * n2 / n
+        sonuc[f'{ad}_n'] = n
+        sonuc[f'{ad}_ort'] = ort.where(n > 0)
+        sonuc[f'{ad}_m2'] = m2_top.where(n > 0, 0.0)
+    return pd.DataFrame(sonuc, index=index)
+
+
+def _satir_sayisi(df: pd.DataFrame) -> pd.Series:
+    sayi = df.groupby('plaka', observed=True).size().astype('float64')
+    sayi.index = sayi.index.astype(object)
+    return sayi
+
+
+def _diskten_oku() -> Dict:
+    try:
+        with open(OZELLIK_PATH, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return {}
+
+
+def _diske_yaz(durum: Dict):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(durum, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, OZELLIK_PATH)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _tabloyu_guncelle(table: str, durum: Dict, wm: Dict) -> bool:
+    """Tablonun istatistiklerini watermark'a getir; değişiklik olduysa True"""
+    mevcut = durum.get(table)
+    if mevcut and mevcut['son_id'] == wm['son_id'] and mevcut['satir_sayisi'] == wm['satir_sayisi']:
+        return False
+
+    df = load_table(table)
+    son_id = int(df['id'].max()) if 'id' in df and not df.empty else 0
+
+    yeni = df[df['id'] > mevcut['son_id']] if mevcut and 'id' in df else None
+    if yeni is not None and len(df) - len(yeni) == mevcut['satir_sayisi']:
+        istatistik = _birlestir(mevcut['istatistik'], _istatistik(yeni, table), table)
+        if table == 'yakit':
+            istatistik['satir'] = mevcut['istatistik']['satir'].reindex(istatistik.index).fillna(0) \
+                .add(_satir_sayisi(yeni), fill_value=0)
+    else:
+        if mevcut:
+            logger.info(f"{table} özellikleri baştan hesaplanıyor (satır sayısı tutmuyor)")
+        istatistik = _istatistik(df, table)
+        if table == 'yakit':
+            istatistik['satir'] = _satir_sayisi(df)
+
+    durum[table] = {'son_id': son_id, 'satir_sayisi': len(df), 'istatistik': istatistik}
+    return True
+
+
+def _ozellikler(durum: Dict) -> pd.DataFrame:
+    """Yeterli istatistiklerden özellik tablosu (sadece yakıt kaydı olan plakalar)"""
+    yakit = durum['yakit']['istatistik']
+    yakit = yakit[yakit['satir'] > 0]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(yakit['yakit_m2'] / (yakit['yakit_n'] - 1))
+
+    df = pd.DataFrame({
+        'ort_yakit': yakit['yakit_ort'],
+        'std_yakit': std.where(yakit['yakit_n'] > 1),
+        'sefer_sayisi': yakit['yakit_n'],
+        'ort_km': yakit['km_ort'],
+    }, index=yakit.index)
+
+    takip = durum['arac_takip']['istatistik'].reindex(df.index)
+    for ozellik, ad in zip(TAKIP_OZELLIKLERI, KAYNAKLAR['arac_takip'].values()):
+        df[ozellik] = takip[f'{ad}_ort']
+
+    df.index.name = 'plaka'
+    return df.sort_index()
+
+
+def veri_surumu() -> Dict[str, Dict]:
+    """Özelliklerin hesaplandığı snapshot watermark'ları"""
+    sonuc = {}
+    for table in KAYNAKLAR:
+        ensure_fresh(table)
+        sonuc[table] = watermark(table)
+    return sonuc
+
+
+def plaka_ozellikleri() -> pd.DataFrame:
+    """
+    Güncel veri sürümü için plaka özellik tablosu
+
+    Eksik değerler NaN bırakılır (tek kayıtlı plakanın std'si, takip verisi
+    olmayan plakalar); model girdisi kurulurken 0 yazılır. Dönen DataFrame
+    paylaşılır, değiştirmeyin.
+    """
+    global _durum, _ozellik_cache
+
+    wm = veri_surumu()
+    anahtar = tuple((t, wm[t]['son_id'], wm[t]['satir_sayisi']) for t in sorted(wm))
+
+    with _lock:
+        if _ozellik_cache[0] == anahtar:
+            return _ozellik_cache[1]
+
+        if not _durum:
+            _durum = _diskten_oku()
+
+        degisti = False
+        for table in KAYNAKLAR:
+            degisti |= _tabloyu_guncelle(table, _durum, wm[table])
+
+        if degisti:
+            try:
+                _diske_yaz(_durum)
+            except OSError as e:
+                logger.warning(f"Plaka özellikleri diske yazılamadı: {e}")
+
+        _ozellik_cache = (anahtar, _ozellikler(_durum))
+        return _ozellik_cache[1]
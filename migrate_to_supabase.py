@@ -2,10 +2,10 @@
 SQLite veritabanındaki verileri Supabase'e aktarma scripti
 """
 import sqlite3
-import urllib.request
-import json
 import os
 
+from bulk_writer import rapor_satirlari, yaz
+
 def load_env():
     """Manuel .env okuma"""
     env_vars = {}
@@ -24,33 +24,15 @@ SUPABASE_URL = env.get('VITE_SUPABASE_URL')
 SUPABASE_KEY = env.get('VITE_SUPABASE_ANON_KEY')
 SQLITE_DB = 'kargo_data.db'
 
-def supabase_insert_batch(table, data):
-    """Supabase'e toplu veri ekle"""
-    if not data:
-        return True
-
-    url = f'{SUPABASE_URL}/rest/v1/{table}'
-
-    req = urllib.request.Request(url, method='POST')
-    req.add_header('apikey', SUPABASE_KEY)
-    req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
-    req.add_header('Content-Type', 'application/json')
-    req.add_header('Prefer', 'return=minimal')
-
-    req.data = json.dumps(data).encode()
-
-    try:
-        with urllib.request.urlopen(req) as response:
-            return response.status == 201
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode()
-        print(f"❌ HTTP Error {e.code}: {error_body}")
-        return False
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return False
+# Unique kolonlar: tekrar çalıştırılan aktarımda (ya da tekrar denenen batch'te) mevcut satırlar atlanır
+CAKISMA_KOLONLARI = {
+    'yakit': 'record_hash',
+    'agirlik': 'record_hash',
+    'arac_takip': 'record_hash',
+    'araclar': 'plaka',
+}
 
-def migrate_table(table_name, batch_size=20):
+def migrate_table(table_name):
     """Bir tabloyu SQLite'dan Supabase'e aktar"""
     try:
         conn = sqlite3.connect(SQLITE_DB)
@@ -81,16 +63,16 @@ def migrate_table(table_name, batch_size=20):
                     row_dict[key] = value
             data.append(row_dict)
 
-        # Batch olarak yükle
-        total_uploaded = 0
-        for i in range(0, len(data), batch_size):
-            batch = data[i:i + batch_size]
-            success = supabase_insert_batch(table_name, batch)
-            if success:
-                total_uploaded += len(batch)
-                print(f"✅ {table_name}: {total_uploaded}/{len(data)} kayıt yüklendi")
-            else:
-                print(f"❌ {table_name}: Batch yükleme başarısız (kayıt {i}-{i+len(batch)})")
+        # Paralel batch'lerle yükle: geçici hatalar tekrar denenir, hatalı satırlar ayıklanır
+        on_conflict = CAKISMA_KOLONLARI.get(table_name)
+        if on_conflict not in rows[0].keys():
+            on_conflict = None
+        rapor = yaz(table_name, data, on_conflict=on_conflict)
+        for satir in rapor_satirlari(rapor):
+            print(f"{table_name}: {satir}")
+        total_uploaded = rapor['inserted']
+        if rapor['failed']:
+            print(f"❌ {table_name}: {rapor['failed']} kayıt yüklenemedi")
 
         conn.close()
         return total_uploaded
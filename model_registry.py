@@ -0,0 +1,174 @@
+"""
+Eğitilmiş AI modelleri için sürümlü dosya kaydı
+
+Model, scaler ve özellik listesi joblib ile sıkıştırmasız olarak
+models/<ad>-v<surum>.joblib dosyasına, eğitim bilgileri (veri watermark'ı,
+özellik adları, skorlar, sklearn sürümü) <ad>-v<surum>.meta.json dosyasına
+yazılır. Dosyalar geçici dosyaya yazılıp os.replace ile yerine konur; meta
+dosyası en son yazıldığı için yarım kalmış bir sürüm hiçbir zaman okunmaz.
+
+Okurken numpy dizileri mmap_mode='r' ile açılır; gunicorn worker'ları aynı
+ağaç dizilerini işletim sisteminin sayfa önbelleğinden paylaşır. Yüklenen
+model process içinde sürüm numarasıyla önbelleğe alınır, yeni bir sürüm
+kaydedilince (başka bir worker dahil) bir sonraki yukle çağrısı onu alır.
+
+Kullanım:
+    surum = kaydet('yakit_tahmin', {'model': model, 'scaler': scaler}, meta)
+    nesne, meta = yukle('yakit_tahmin')          # kayıt yoksa (None, None)
+    guncel_mi(meta, ('yakit', 'arac_takip'))     # veri değişti mi?
+"""
+import os
+import re
+import json
+import glob
+import tempfile
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+import joblib
+import sklearn
+
+from snapshot_store import ensure_fresh, watermark
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.environ.get('MODEL_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+# Model başına saklanacak sürüm sayısı (eskiler silinir)
+MODEL_KEEP_VERSIONS = int(os.environ.get('MODEL_KEEP_VERSIONS', '3'))
+
+_lock = threading.Lock()
+_egitim_kilitleri: Dict[str, threading.Lock] = {}
+# ad -> (surum, nesne, meta)
+_yuklenen: Dict[str, Tuple[int, Dict, Dict]] = {}
+
+
+def _dosya(ad: str, surum: int, uzanti: str) -> str:
+    return os.path.join(MODEL_DIR, f'{ad}-v{surum}.{uzanti}')
+
+
+def surumler(ad: str) -> list:
+    """Kaydı tamamlanmış sürüm numaraları (küçükten büyüğe)"""
+    desen = re.compile(rf'^{re.escape(ad)}-v(\d+)\.meta\.json$')
+    bulunan = []
+    for path in glob.glob(os.path.join(MODEL_DIR, f'{ad}-v*.meta.json')):
+        m = desen.match(os.path.basename(path))
+        if m and os.path.exists(_dosya(ad, int(m.group(1)), 'joblib')):
+            bulunan.append(int(m.group(1)))
+    return sorted(bulunan)
+
+
+def _atomic_write(path: str, writer):
+    """writer(gecici_yol) ile yaz, sonra os.replace ile yerine koy"""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=MODEL_DIR, prefix='.tmp-')
+    os.close(fd)
+    try:
+        writer(tmp_path)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _yeni_surum(ad: str) -> int:
+    """Bir sonraki sürüm numarasını dosya oluşturarak ayır (worker'lar arası çakışmasız)"""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    mevcut = [int(m.group(1)) for m in (re.match(rf'^{re.escape(ad)}-v(\d+)\.', os.path.basename(p))
+                                         for p in glob.glob(os.path.join(MODEL_DIR, f'{ad}-v*'))) if m]
+    surum = max(mevcut, default=0) + 1
+    while True:
+        try:
+            fd = os.open(_dosya(ad, surum, 'joblib'), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            os.close(fd)
+            return surum
+        except FileExistsError:
+            surum += 1
+
+
+def veri_watermark(tablolar: Iterable[str]) -> Dict[str, Dict]:
+    """Tabloların güncel snapshot watermark'ları (gerekirse önce yeni satırlar çekilir)"""
+    sonuc = {}
+    for table in tablolar:
+        ensure_fresh(table)
+        sonuc[table] = watermark(table)
+    return sonuc
+
+
+def guncel_mi(meta: Optional[Dict], tablolar: Iterable[str]) -> bool:
+    """Model, tabloların şu anki verisiyle mi eğitildi?"""
+    if not meta or meta.get('sklearn_surumu') != sklearn.__version__:
+        return False
+    return meta.get('watermark') == veri_watermark(tablolar)
+
+
+def kaydet(ad: str, nesne: Dict, meta: Dict) -> int:
+    """Modeli yeni bir sürüm olarak kaydet ve sürüm numarasını döndür"""
+    surum = _yeni_surum(ad)
+    meta = dict(meta, ad=ad, surum=surum, sklearn_surumu=sklearn.__version__,
+                kayit_tarihi=datetime.now().isoformat(timespec='seconds'))
+
+    try:
+        # compress=0: sıkıştırılmış dosyalar mmap ile açılamaz
+        _atomic_write(_dosya(ad, surum, 'joblib'), lambda tmp: joblib.dump(nesne, tmp, compress=0))
+
+        def meta_writer(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f, ensure_ascii=False, default=str)
+        _atomic_write(_dosya(ad, surum, 'meta.json'), meta_writer)
+    except Exception:
+        if os.path.exists(_dosya(ad, surum, 'joblib')) and not os.path.exists(_dosya(ad, surum, 'meta.json')):
+            os.remove(_dosya(ad, surum, 'joblib'))
+        raise
+
+    with _lock:
+        _yuklenen[ad] = (surum, nesne, meta)
+
+    _eskileri_sil(ad)
+    return surum
+
+
+def _eskileri_sil(ad: str):
+    for surum in surumler(ad)[:-MODEL_KEEP_VERSIONS]:
+        for uzanti in ('meta.json', 'joblib'):
+            try:
+                os.remove(_dosya(ad, surum, uzanti))
+            except OSError:
+                pass
+
+
+def yukle(ad: str) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """En son sürümü döndür: (nesne, meta); kayıtlı model yoksa (None, None)"""
+    mevcut = surumler(ad)
+    if not mevcut:
+        return None, None
+    surum = mevcut[-1]
+
+    with _lock:
+        onceki = _yuklenen.get(ad)
+    if onceki and onceki[0] == surum:
+        return onceki[1], onceki[2]
+
+    try:
+        with open(_dosya(ad, surum, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta.get('sklearn_surumu') != sklearn.__version__:
+            logger.info(f"{ad} v{surum} farklı sklearn sürümüyle kaydedilmiş ({meta.get('sklearn_surumu')}), yüklenmiyor")
+            return None, None
+        nesne = joblib.load(_dosya(ad, surum, 'joblib'), mmap_mode='r')
+    except Exception as e:
+        logger.warning(f"{ad} v{surum} yüklenemedi: {e}")
+        return None, None
+
+    with _lock:
+        _yuklenen[ad] = (surum, nesne, meta)
+    return nesne, meta
+
+
+def egitim_kilidi(ad: str) -> threading.Lock:
+    """Aynı process içinde aynı modelin eşzamanlı yeniden eğitilmesini önler"""
+    with _lock:
+        return _egitim_kilitleri.setdefault(ad, threading.Lock())
@@ -0,0 +1,443 @@
+"""
+Supabase okuma sorguları için TTL + LRU önbellek
+
+Dashboard'lar günde bir kez (Excel yüklemesinde) değişen verileri tekrar tekrar
+okur. Bu modül database.py'deki okuma fonksiyonlarını fonksiyon bazlı TTL ile
+önbelleğe alır; yazma fonksiyonları ilgili tabloları invalidate() ile temizler.
+
+Kullanım:
+    @cached(ttl=300, tables=('yakit',))
+    def get_yakit_data(): ...
+
+    invalidate('yakit')   # yakit tablosuna yazıldıktan sonra
+
+Paylaşımlı mod (QUERY_CACHE_BACKEND=sqlite):
+    gunicorn worker'ları aynı makinedeki bir SQLite dosyasını (QUERY_CACHE_PATH)
+    paylaşır. Her tablo için bir epoch sayacı tutulur; invalidate() sayacı
+    artırır ve tüm worker'lardaki kayıtlar bir sonraki okumada geçersiz olur.
+    Bir worker'ın doldurduğu sonuç diğer worker'lar tarafından da okunur.
+    Harici servis gerekmez.
+
+Not: Önbellekten dönen liste/dict nesneleri tüm çağıranlar arasında paylaşılır,
+yerinde değiştirilmemelidir (DataFrame'e çevirmek güvenlidir).
+"""
+import os
+import json
+import time
+import pickle
+import sqlite3
+import tempfile
+import threading
+import functools
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', '256'))
+CACHE_ENABLED = os.environ.get('QUERY_CACHE_DISABLED', '').lower() not in ('1', 'true', 'yes')
+CACHE_BACKEND = os.environ.get('QUERY_CACHE_BACKEND', 'memory').lower()
+CACHE_PATH = os.environ.get('QUERY_CACHE_PATH') or os.path.join(tempfile.gettempdir(), 'kargo_query_cache.db')
+# Paylaşımlı dosyaya yazılacak en büyük sonuç (MB); daha büyükleri sadece worker belleğinde tutulur
+CACHE_MAX_VALUE_MB = float(os.environ.get('QUERY_CACHE_MAX_VALUE_MB', '64'))
+
+# invalidate() tablo verilmeden çağrıldığında artan genel epoch
+ALL_TABLES = '*'
+
+
+class SQLiteCacheStore:
+    """
+    Aynı makinedeki process'lerin paylaştığı SQLite önbellek dosyası
+
+    - epochs: tablo başına sayaç; invalidate() ile artar
+    - entries: pickle edilmiş sonuçlar + okunduğu andaki epoch'lar
+
+    WAL modunda çalışır (okuyucular yazıcıyı beklemez). Bağlantılar thread ve
+    process başınadır; fork sonrası yeni bağlantı açılır.
+    """
+
+    def __init__(self, path: str, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=10000')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS epochs (
+                tablo TEXT PRIMARY KEY,
+                epoch INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                expires REAL NOT NULL,
+                stored_at REAL NOT NULL,
+                epochs TEXT NOT NULL,
+                value BLOB NOT NULL
+            )
+        ''')
+
+    def epochs(self, tables) -> dict:
+        """Verilen tabloların (ve genel '*') güncel epoch değerleri"""
+        names = sorted(set(tables) | {ALL_TABLES})
+        placeholders = ','.join('?' * len(names))
+        rows = self._connect().execute(
+            f'SELECT tablo, epoch FROM epochs WHERE tablo IN ({placeholders})', names
+        ).fetchall()
+        current = dict.fromkeys(names, 0)
+        current.update(rows)
+        return current
+
+    def bump(self, tables):
+        """Tabloların epoch'unu atomik olarak artır (tüm worker'larda geçersiz kılar)"""
+        names = sorted(set(tables)) or [ALL_TABLES]
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('''
+                INSERT INTO epochs (tablo, epoch) VALUES (?, 1)
+                ON CONFLICT(tablo) DO UPDATE SET epoch = epoch + 1
+            ''', [(name,) for name in names])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, key: str):
+        """(bulundu_mu, deger, epochs, kalan_sure) - süresi dolmuş veya eski kayıt bulunmaz"""
+        row = self._connect().execute(
+            'SELECT expires, epochs, value FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return False, None, None, 0
+
+        expires, epochs_json, blob = row
+        remaining = expires - time.time()
+        epochs = json.loads(epochs_json)
+        if remaining <= 0 or epochs != self.epochs(epochs.keys()):
+            return False, None, None, 0
+
+        return True, pickle.loads(blob), epochs, remaining
+
+    def set(self, key: str, value, ttl: float, epochs: dict):
+        """Değeri sadece okunduğu andaki epoch'lar hâlâ güncelse yaz"""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > CACHE_MAX_VALUE_MB * 1024 * 1024:
+            return
+
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if epochs != self.epochs(epochs.keys()):
+                conn.execute('ROLLBACK')
+                return
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, expires, stored_at, epochs, value) VALUES (?, ?, ?, ?, ?)',
+                (key, now + ttl, now, json.dumps(epochs, sort_keys=True), blob)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._writes += 1
+        if self._writes % 32 == 0:
+            self.prune()
+
+    def prune(self):
+        """Süresi dolanları sil, kayıt sayısını max_entries ile sınırla"""
+        conn = self._connect()
+        conn.execute('DELETE FROM entries WHERE expires < ?', (time.time(),))
+        conn.execute('''
+            DELETE FROM entries WHERE key IN (
+                SELECT key FROM entries ORDER BY stored_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+
+    def count(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+
+class QueryCache:
+    """Thread-safe, boyut sınırlı (LRU) ve süreli (TTL) bellek önbelleği"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, shared: SQLiteCacheStore = None):
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries = OrderedDict()  # key -> (bitis_zamani, tablolar, deger, epochs)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.shared_errors = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0
+        self._function_stats = {}
+
+    def _count(self, name: str, field: str):
+        stats = self._function_stats.setdefault(name, {'hits': 0, 'misses': 0})
+        stats[field] += 1
+
+    def _record(self, found: bool, name: str = None):
+        with self._lock:
+            field = 'hits' if found else 'misses'
+            setattr(self, field, getattr(self, field) + 1)
+            if name:
+                self._count(name, field)
+
+    def _shared_epochs(self, tables):
+        try:
+            return self.shared.epochs(tables)
+        except sqlite3.Error as e:
+            self.shared_errors += 1
+            logger.warning(f"Paylaşımlı önbellek okunamadı: {e}")
+            return None
+
+    def snapshot(self, tables=()):
+        """
+        Hesaplamadan önce alınan durum; set()'e verilir
+
+        Hesaplama sırasında invalidate() çağrılırsa (bu veya başka bir worker'da)
+        sonuç saklanmaz, böylece yazmadan önceki veri önbelleğe geri girmez.
+        """
+        epochs = self._shared_epochs(tables) if self.shared else None
+        return self.generation, epochs
+
+    def get(self, key: str, name: str = None, record: bool = True):
+        """(bulundu_mu, deger) döndür; süresi dolmuş veya eski kayıtlar silinir"""
+        with self._lock:
+            entry = self._entries.get(key)
+            found = entry is not None and entry[0] > time.monotonic()
+            if found:
+                self._entries.move_to_end(key)
+            elif entry is not None:
+                del self._entries[key]
+
+        if found and self.shared and entry[3] != self._shared_epochs(entry[3].keys()):
+            # Başka bir worker tabloya yazmış
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            found = False
+
+        if not found and self.shared:
+            try:
+                found, value, epochs, remaining = self.shared.get(key)
+            except (sqlite3.Error, pickle.UnpicklingError) as e:
+                self.shared_errors += 1
+                logger.warning(f"Paylaşımlı önbellek okunamadı: {e}")
+                found = False
+            if found:
+                tables = frozenset(epochs) - {ALL_TABLES}
+                self._set_local(key, value, remaining, tables, epochs)
+                with self._lock:
+                    self.shared_hits += 1
+                entry = (None, tables, value, epochs)
+
+        if record:
+            self._record(found, name)
+        return (True, entry[2]) if found else (False, None)
+
+    def _set_local(self, key: str, value, ttl: float, tables, epochs=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, frozenset(tables), value, epochs)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def set(self, key: str, value, ttl: float, tables=(), token=None):
+        """
+        Değeri ttl saniyeliğine sakla; kapasite aşılırsa en eski kullanılanı at
+
+        token (snapshot() sonucu) verilirse ve o zamandan beri invalidate()
+        çağrılmışsa değer saklanmaz.
+        """
+        generation, epochs = token if token is not None else (None, None)
+        if generation is not None and generation != self.generation:
+            return
+
+        if self.shared:
+            if epochs is None:
+                epochs = self._shared_epochs(tables)
+                if epochs is None:
+                    return
+            try:
+                self.shared.set(key, value, ttl, epochs)
+            except (sqlite3.Error, pickle.PicklingError) as e:
+                self.shared_errors += 1
+                logger.warning(f"Paylaşımlı önbelleğe yazılamadı: {e}")
+
+        self._set_local(key, value, ttl, tables, epochs)
+
+    def key_lock(self, key: str) -> threading.Lock:
+        """Aynı anahtarı dolduran thread'leri sıraya sok (aynı tablo iki kez indirilmesin)"""
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def release_key_lock(self, key: str):
+        with self._lock:
+            self._key_locks.pop(key, None)
+
+    def invalidate(self, *tables) -> int:
+        """Verilen tablolardan okunan tüm kayıtları sil; tablo verilmezse hepsini sil"""
+        with self._lock:
+            if not tables:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                targets = set(tables)
+                keys = [key for key, entry in self._entries.items() if entry[1] & targets]
+                for key in keys:
+                    del self._entries[key]
+                removed = len(keys)
+            self.invalidations += 1
+            self.generation += 1
+
+        if self.shared:
+            try:
+                self.shared.bump(tables)
+            except sqlite3.Error as e:
+                self.shared_errors += 1
+                logger.error(f"Paylaşımlı önbellek epoch'u artırılamadı: {e}")
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                'enabled': CACHE_ENABLED,
+                'backend': 'sqlite' if self.shared else 'memory',
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'functions': {name: dict(stats) for name, stats in self._function_stats.items()}
+            }
+
+        if self.shared:
+            stats['shared'] = {'path': self.shared.path, 'hits': self.shared_hits, 'errors': self.shared_errors}
+            try:
+                stats['shared']['entries'] = self.shared.count()
+            except sqlite3.Error:
+                pass
+        return stats
+
+
+def _create_cache() -> QueryCache:
+    shared = None
+    if CACHE_ENABLED and CACHE_BACKEND == 'sqlite':
+        try:
+            shared = SQLiteCacheStore(CACHE_PATH)
+        except sqlite3.Error as e:
+            logger.error(f"Paylaşımlı önbellek açılamadı ({CACHE_PATH}), bellek önbelleği kullanılıyor: {e}")
+    return QueryCache(shared=shared)
+
+
+_cache = _create_cache()
+
+
+def make_key(name: str, args: tuple = (), kwargs: dict = None) -> str:
+    """Fonksiyon adı ve argümanlardan (filtreler dahil) kararlı bir anahtar üret"""
+    return json.dumps([name, list(args), kwargs or {}], sort_keys=True, default=str, ensure_ascii=False)
+
+
+def cached(ttl: float, tables=(), cache_if=bool):
+    """
+    Fonksiyon sonucunu ttl saniye önbellekte tut
+
+    Args:
+        ttl: Saniye cinsinden geçerlilik süresi
+        tables: Sonucun okunduğu tablolar (invalidate() bu isimlerle eşleşir)
+        cache_if: Sonucun saklanıp saklanmayacağına karar veren fonksiyon.
+                  Varsayılan bool: hata durumunda dönen boş liste saklanmaz.
+    """
+    def decorator(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                return func(*args, **kwargs)
+
+            key = make_key(name, args, kwargs)
+            found, value = _cache.get(key, name)
+            if found:
+                return value
+
+            with _cache.key_lock(key):
+                try:
+                    # Beklerken başka bir thread doldurmuş olabilir
+                    found, value = _cache.get(key, record=False)
+                    if found:
+                        return value
+
+                    token = _cache.snapshot(tables)
+                    value = func(*args, **kwargs)
+                    if cache_if(value):
+                        _cache.set(key, value, ttl, tables, token)
+                    return value
+                finally:
+                    _cache.release_key_lock(key)
+
+        wrapper.cache_tables = tuple(tables)
+        return wrapper
+
+    return decorator
+
+
+def snapshot(tables=()):
+    """Doğrudan store() kullanılırken hesaplamadan önce alınacak durum"""
+    return _cache.snapshot(tables)
+
+
+def lookup(key: str, name: str = None):
+    """Doğrudan anahtar ile oku - (bulundu_mu, deger)"""
+    if not CACHE_ENABLED:
+        return False, None
+    return _cache.get(key, name)
+
+
+def store(key: str, value, ttl: float, tables=(), token=None):
+    """Doğrudan anahtar ile yaz"""
+    if CACHE_ENABLED and ttl > 0:
+        _cache.set(key, value, ttl, tables, token)
+
+
+def invalidate(*tables) -> int:
+    """Yazma sonrası ilgili tabloların önbelleğini temizle (paylaşımlı modda tüm worker'larda)"""
+    removed = _cache.invalidate(*tables)
+    if removed:
+        logger.info(f"Önbellek temizlendi ({', '.join(tables) or 'tümü'}): {removed} kayıt")
+    return removed
+
+
+def cache_stats() -> dict:
+    """Hit/miss sayaçları (/debug-info için)"""
+    return _cache.stats()
@@ -0,0 +1,274 @@
+"""
+Analiz DataFrame'leri için tipli kolon bazlı snapshot dosyaları
+
+yakit, agirlik ve arac_takip tabloları tip dönüşümleri yapılmış halde
+(tarihler datetime64, plaka categorical, sayısal kolonlar float64) Feather
+(Arrow IPC) dosyalarına yazılır ve memory-map ile okunur. Böylece her analizde
+JSON listesinden DataFrame kurma ve pd.to_datetime maliyeti tekrarlanmaz.
+
+- Yeni satırlar id=gt.<son_id> ile çekilip mevcut snapshot'a eklenir
+- Supabase'deki satır sayısı tutmazsa (silme) snapshot baştan oluşturulur
+- Dosyalar geçici dosyaya yazılıp os.replace ile atomik olarak değiştirilir
+- pyarrow kurulu değilse aynı veri pickle olarak saklanır (memory-map olmadan)
+
+Kullanım:
+    df = load_table('yakit')       # her çağrıda bağımsız bir kopya döner
+    watermark('yakit')             # {'son_id': ..., 'satir_sayisi': ...}
+    ensure_fresh('yakit')          # DataFrame okumadan snapshot'ı güncelle
+
+Not: plaka categorical olduğu için groupby('plaka', observed=True) kullanın.
+"""
+import os
+import json
+import time
+import tempfile
+import threading
+import logging
+from typing import Dict
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots')
+# Yeni satır kontrolü en fazla bu sıklıkla yapılır (saniye)
+SNAPSHOT_MAX_AGE = float(os.environ.get('SNAPSHOT_MAX_AGE', '60'))
+
+# Tablo başına kolon tipleri
+SNAPSHOT_SCHEMAS = {
+    'yakit': {
+        'tarih': ['islem_tarihi'],
+        'sayisal': ['yakit_miktari', 'birim_fiyat', 'satir_tutari', 'km_bilgisi'],
+        'kategori': ['plaka'],
+    },
+    'agirlik': {
+        'tarih': ['tarih'],
+        'sayisal': ['miktar', 'net_agirlik'],
+        'kategori': ['plaka'],
+    },
+    'arac_takip': {
+        'tarih': ['tarih'],
+        'sayisal': ['toplam_kilometre', 'maksimum_hiz', 'gunluk_yakit_tuketimi_l'],
+        'kategori': ['plaka'],
+    },
+}
+
+_locks = {table: threading.Lock() for table in SNAPSHOT_SCHEMAS}
+
+
+def _data_path(table: str) -> str:
+    uzanti = 'feather' if feather is not None else 'pkl'
+    return os.path.join(SNAPSHOT_DIR, f'{table}.{uzanti}')
+
+
+def _meta_path(table: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f'{table}.meta.json')
+
+
+def _read_meta(table: str) -> Dict:
+    try:
+        with open(_meta_path(table), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _atomic_write(path: str, writer):
+    """writer(gecici_yol) ile yaz, sonra os.replace ile yerine koy"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix='.tmp-')
+    os.close(fd)
+    try:
+        writer(tmp_path)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_meta(table: str, meta: Dict):
+    def writer(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+    _atomic_write(_meta_path(table), writer)
+
+
+def tiplendir(rows, table: str) -> pd.DataFrame:
+    """Supabase satırlarını (list of dict) tablo şemasına göre tipli DataFrame'e çevir"""
+    schema = SNAPSHOT_SCHEMAS[table]
+    df = pd.DataFrame(rows)
+
+    for column in schema['tarih']:
+        df[column] = pd.to_datetime(df[column], errors='coerce') if column in df else pd.Series(dtype='datetime64[ns]')
+    for column in schema['sayisal']:
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64') if column in df else pd.Series(dtype='float64')
+    for column in schema['kategori']:
+        df[column] = df[column].astype('category') if column in df else pd.Series(dtype='category')
+
+    if 'id' in df:
+        df['id'] = pd.to_numeric(df['id'], errors='coerce').astype('int64')
+
+    return df
+
+
+def _birlestir(mevcut: pd.DataFrame, yeni: pd.DataFrame, table: str) -> pd.DataFrame:
+    """Yeni satırları ekle; categorical kolonların kategorileri birleştirilir"""
+    if mevcut.empty:
+        return yeni
+    if yeni.empty:
+        return mevcut
+
+    df = pd.concat([mevcut, yeni], ignore_index=True)
+    for column in SNAPSHOT_SCHEMAS[table]['kategori']:
+        if df[column].dtype != 'category':
+            df[column] = df[column].astype('category')
+    return df
+
+
+def _write_data(table: str, df: pd.DataFrame):
+    def writer(tmp_path):
+        if feather is not None:
+            # Sıkıştırmasız yazılır: okurken memory-map ile kopyasız açılabilsin
+            try:
+                feather.write_feather(df.reset_index(drop=True), tmp_path, compression='uncompressed')
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Karışık tipli metin kolonları (ör. sayı + metin) string'e çevrilir
+                temiz = df.reset_index(drop=True).copy()
+                for column in temiz.select_dtypes(include='object').columns:
+                    temiz[column] = temiz[column].where(temiz[column].isna(), temiz[column].astype(str))
+                feather.write_feather(temiz, tmp_path, compression='uncompressed')
+        else:
+            df.to_pickle(tmp_path)
+    _atomic_write(_data_path(table), writer)
+
+
+def _read_data(table: str) -> pd.DataFrame:
+    path = _data_path(table)
+    if not os.path.exists(path):
+        return None
+    if feather is not None:
+        return feather.read_table(path, memory_map=True).to_pandas()
+    return pd.read_pickle(path)
+
+
+def read_column(table: str, column: str):
+    """
+    Mevcut snapshot'tan tek bir kolonu oku (Supabase'e gitmeden, güncellemeden)
+
+    Snapshot ya da kolon yoksa None döner.
+    """
+    path = _data_path(table)
+    if not os.path.exists(path):
+        return None
+    try:
+        if feather is not None:
+            return feather.read_table(path, columns=[column], memory_map=True).to_pandas()[column]
+        df = pd.read_pickle(path)
+        return df[column] if column in df else None
+    except (KeyError, ValueError):
+        return None
+
+
+def mark_stale(table: str):
+    """Tablo Supabase'e yazıldı; bir sonraki load_table yeni satırları kontrol etsin"""
+    if table not in SNAPSHOT_SCHEMAS or not os.path.exists(_meta_path(table)):
+        return
+    try:
+        meta = _read_meta(table)
+        meta['son_kontrol'] = 0
+        _write_meta(table, meta)
+    except OSError as e:
+        logger.warning(f"Snapshot stale işaretlenemedi ({table}): {e}")
+
+
+def refresh(table: str, full: bool = False) -> Dict:
+    """
+    Snapshot'ı güncelle: sadece yeni id'li satırları çek ve ekle
+
+    full=True veya satır sayısı Supabase ile tutmuyorsa baştan oluşturulur.
+    """
+    from database import fetch_all_paginated, get_table_count
+
+    if table not in SNAPSHOT_SCHEMAS:
+        raise ValueError(f"Snapshot tanımı olmayan tablo: {table}")
+
+    with _locks[table]:
+        mevcut = None if full else _read_data(table)
+        if mevcut is None or mevcut.empty or 'id' not in mevcut:
+            mevcut = tiplendir([], table)
+            son_id = 0
+            full = True
+        else:
+            son_id = int(mevcut['id'].max())
+
+        yeni = fetch_all_paginated(table, after_id=son_id, parallel=True)
+        uzak_sayi = get_table_count(table, ttl=0)
+
+        if len(mevcut) + len(yeni) != uzak_sayi and not (full and son_id == 0):
+            logger.info(f"{table} snapshot: satır sayısı tutmuyor ({len(mevcut)} + {len(yeni)} != {uzak_sayi}), yeniden oluşturuluyor")
+            mevcut = tiplendir([], table)
+            yeni = fetch_all_paginated(table, after_id=0, parallel=True)
+            full = True
+
+        if yeni or full:
+            df = _birlestir(mevcut, tiplendir(yeni, table), table)
+            _write_data(table, df)
+        else:
+            df = mevcut
+
+        meta = {
+            'son_id': int(df['id'].max()) if 'id' in df and not df.empty else 0,
+            'satir_sayisi': len(df),
+            'son_kontrol': time.time(),
+            'format': 'feather' if feather is not None else 'pickle'
+        }
+        _write_meta(table, meta)
+
+    return {'tablo': table, 'yeni_satir': len(yeni), 'tam_kopya': full, 'toplam': len(df)}
+
+
+def ensure_fresh(table: str, max_age: float = None):
+    """
+    Snapshot yoksa oluştur; son kontrol max_age saniyeden eskiyse (veya
+    mark_stale çağrıldıysa) yeni satırları ekle
+    """
+    if max_age is None:
+        max_age = SNAPSHOT_MAX_AGE
+
+    meta = _read_meta(table)
+    if not meta or time.time() - meta.get('son_kontrol', 0) >= max_age:
+        try:
+            refresh(table)
+        except Exception as e:
+            # Supabase'e ulaşılamazsa eldeki snapshot ile devam et
+            if not os.path.exists(_data_path(table)):
+                raise
+            logger.warning(f"{table} snapshot güncellenemedi, mevcut dosya kullanılıyor: {e}")
+
+
+def load_table(table: str, max_age: float = None) -> pd.DataFrame:
+    """
+    Tablonun tipli DataFrame'ini döndür
+
+    Önce ensure_fresh ile snapshot güncellenir. Her çağrı bağımsız bir
+    DataFrame döndürür, değiştirmek güvenlidir.
+    """
+    ensure_fresh(table, max_age)
+
+    df = _read_data(table)
+    return df if df is not None else tiplendir([], table)
+
+
+def watermark(table: str) -> Dict:
+    """Snapshot'ın kapsadığı veri: son id ve satır sayısı (model/önbellek sürümlemesi için)"""
+    meta = _read_meta(table)
+    return {'son_id': meta.get('son_id', 0), 'satir_sayisi': meta.get('satir_sayisi', 0)}
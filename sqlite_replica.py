@@ -0,0 +1,334 @@
+"""
+Supabase tablolarının yerel SQLite kopyası (artımlı senkronizasyon)
+
+yakit, agirlik ve arac_takip tabloları kargo_replica.db dosyasına kopyalanır.
+Her tablo için en son kopyalanan id (high-water mark) sync_state tablosunda
+tutulur; sonraki senkronizasyonlar sadece id=gt.<son_id> satırlarını çeker ve
+tek transaction içinde executemany ile yazar.
+
+DATA_BACKEND=sqlite-replica iken database.fetch_all_paginated bu tablolar için
+okumaları buradan karşılar (select/filtre/sıralama SQL'e çevrilir). Desteklenmeyen
+bir filtre gelirse None döner ve okuma Supabase'e düşer. Yazmalar her zaman
+Supabase'e gider; supabase_insert_batch tabloyu mark_stale() ile işaretler ve
+bir sonraki okuma önce yeni satırları çeker.
+
+Not: Artımlı senkronizasyon yeni eklenen satırları yakalar. Uzak satır sayısı
+yereldekinden farklıysa (silme) tablo baştan kopyalanır; yerinde güncellenen
+satırlar için full=True ile tam senkronizasyon yapılmalıdır.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import urllib.parse
+import logging
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+REPLICA_PATH = os.environ.get('SQLITE_REPLICA_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kargo_replica.db')
+# Okuma sırasında bu süreden eski kopyalar önce senkronize edilir (saniye)
+REPLICA_MAX_AGE = float(os.environ.get('SQLITE_REPLICA_MAX_AGE', '300'))
+
+# Kopyalanan tablolar ve indekslenecek tarih kolonları
+REPLICA_TABLES = {
+    'yakit': ('islem_tarihi',),
+    'agirlik': ('tarih',),
+    'arac_takip': ('tarih', 'created_at'),
+}
+
+KOLON_ADI = re.compile(r'^[a-z_][a-z0-9_]*$')
+SQL_OPERATORLER = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+_local = threading.local()
+_sync_locks = {table: threading.Lock() for table in REPLICA_TABLES}
+
+
+def get_connection() -> sqlite3.Connection:
+    """Thread ve process başına bağlantı (WAL: okuyucular senkronizasyonu beklemez)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    conn = sqlite3.connect(REPLICA_PATH, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            tablo TEXT PRIMARY KEY,
+            son_id INTEGER NOT NULL DEFAULT 0,
+            satir_sayisi INTEGER NOT NULL DEFAULT 0,
+            son_senkron REAL NOT NULL DEFAULT 0,
+            stale INTEGER NOT NULL DEFAULT 0  -- senkronizasyondan sonra gelen yazma sayısı
+        )
+    ''')
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _kolonlar(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _kolon_tipi(value) -> str:
+    """JSON değerine göre SQLite affinity (karşılaştırmalar PostgreSQL gibi çalışsın)"""
+    if isinstance(value, bool):
+        return 'INTEGER'
+    if isinstance(value, (int, float)):
+        return 'NUMERIC'
+    if value is None:
+        return ''
+    return 'TEXT'
+
+
+def _tablo_hazirla(conn: sqlite3.Connection, table: str, rows: List[Dict]) -> List[str]:
+    """Tabloyu ve satırlarda görülen kolonları oluştur, indeksleri ekle"""
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id INTEGER PRIMARY KEY)')
+    mevcut = set(_kolonlar(conn, table))
+
+    for column in rows[0].keys() if rows else []:
+        if column in mevcut or not KOLON_ADI.match(column):
+            continue
+        ornek = next((row[column] for row in rows if row.get(column) is not None), None)
+        conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {_kolon_tipi(ornek)}')
+        mevcut.add(column)
+
+    for column in ('plaka',) + REPLICA_TABLES[table]:
+        if column in mevcut:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{column}" ON "{table}" ("{column}")')
+
+    return _kolonlar(conn, table)
+
+
+def _deger(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def get_sync_state(table: str) -> Optional[Dict]:
+    row = get_connection().execute(
+        'SELECT son_id, satir_sayisi, son_senkron, stale FROM sync_state WHERE tablo = ?', (table,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {'son_id': row[0], 'satir_sayisi': row[1], 'son_senkron': row[2], 'stale': row[3]}
+
+
+def mark_stale(table: str):
+    """Tablo Supabase'e yazıldı; bir sonraki okuma önce senkronize etsin (tüm worker'lar için)"""
+    if table not in REPLICA_TABLES:
+        return
+    try:
+        get_connection().execute('UPDATE sync_state SET stale = stale + 1 WHERE tablo = ?', (table,))
+    except sqlite3.Error as e:
+        logger.warning(f"Replica stale işaretlenemedi ({table}): {e}")
+
+
+def sync_table(table: str, full: bool = False) -> Dict:
+    """
+    Tabloyu artımlı olarak senkronize et
+
+    Sadece son_id'den büyük id'li satırlar çekilir. full=True veya satır sayıları
+    tutmuyorsa (Supabase'de silme yapılmış) tablo baştan kopyalanır.
+    """
+    if table not in REPLICA_TABLES:
+        raise ValueError(f"Replica'da olmayan tablo: {table}")
+
+    with _sync_locks[table]:
+        return _sync(table, full)
+
+
+def _sync(table: str, full: bool) -> Dict:
+    """sync_table gövdesi - çağıran tablonun kilidini tutmalı"""
+    from database import fetch_all_paginated, get_table_count
+
+    baslangic = time.time()
+    conn = get_connection()
+    state = get_sync_state(table) or {'son_id': 0, 'satir_sayisi': 0, 'stale': 0}
+    son_id = 0 if full else state['son_id']
+
+    # after_id verildiği için bu okumalar replica'ya değil Supabase'e gider
+    rows = fetch_all_paginated(table, after_id=son_id, parallel=True)
+    uzak_sayi = get_table_count(table, ttl=0)
+
+    if not full and state['satir_sayisi'] + len(rows) != uzak_sayi:
+        logger.info(f"{table}: satır sayısı tutmuyor ({state['satir_sayisi']} + {len(rows)} != {uzak_sayi}), tam kopya alınıyor")
+        full = True
+        rows = fetch_all_paginated(table, after_id=0, parallel=True)
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        kolonlar = _tablo_hazirla(conn, table, rows)
+        if full:
+            conn.execute(f'DELETE FROM "{table}"')
+
+        if rows:
+            yazilacak = [c for c in kolonlar if c in rows[0]]
+            kolon_sql = ', '.join(f'"{c}"' for c in yazilacak)
+            yer_tutucu = ', '.join('?' * len(yazilacak))
+            conn.executemany(
+                f'INSERT OR REPLACE INTO "{table}" ({kolon_sql}) VALUES ({yer_tutucu})',
+                [tuple(_deger(row.get(c)) for c in yazilacak) for row in rows]
+            )
+
+        yerel_sayi, max_id = conn.execute(f'SELECT COUNT(*), COALESCE(MAX(id), 0) FROM "{table}"').fetchone()
+        conn.execute('''
+            INSERT INTO sync_state (tablo, son_id, satir_sayisi, son_senkron, stale)
+            VALUES (?, ?, ?, ?, 0)
+            ON CONFLICT(tablo) DO UPDATE SET
+                son_id = excluded.son_id,
+                satir_sayisi = excluded.satir_sayisi,
+                son_senkron = excluded.son_senkron,
+                stale = MAX(stale - ?, 0)
+        ''', (table, max_id, yerel_sayi, time.time(), state['stale']))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+    return {
+        'tablo': table,
+        'yeni_satir': len(rows),
+        'tam_kopya': full,
+        'toplam': yerel_sayi,
+        'son_id': max_id,
+        'sure': round(time.time() - baslangic, 2)
+    }
+
+
+def sync_all(full: bool = False) -> List[Dict]:
+    """Tüm replica tablolarını senkronize et"""
+    return [sync_table(table, full=full) for table in REPLICA_TABLES]
+
+
+def ensure_fresh(table: str, max_age: float = None):
+    """Kopya hiç alınmamışsa, stale ise veya max_age'den eskiyse senkronize et"""
+    if max_age is None:
+        max_age = REPLICA_MAX_AGE
+
+    state = get_sync_state(table)
+    if state and not state['stale'] and time.time() - state['son_senkron'] < max_age:
+        return
+
+    with _sync_locks[table]:
+        # Beklerken başka bir thread senkronize etmiş olabilir
+        state = get_sync_state(table)
+        if state and not state['stale'] and time.time() - state['son_senkron'] < max_age:
+            return
+        _sync(table, full=False)
+
+
+def _in_degerleri(arg: str) -> Optional[List[str]]:
+    """in.(a,b,"c d") listesini ayrıştır"""
+    if not (arg.startswith('(') and arg.endswith(')')):
+        return None
+    degerler = []
+    for parca in re.findall(r'"((?:[^"\\]|\\.)*)"|([^,]+)', arg[1:-1]):
+        degerler.append(parca[0] if parca[0] else parca[1].strip())
+    return degerler
+
+
+def _filtre_sql(column: str, expr: str, kolonlar: set):
+    """Tek bir PostgREST filtresini (sql, parametreler) olarak çevir; desteklenmiyorsa None"""
+    if column == 'and':
+        if not (expr.startswith('(') and expr.endswith(')')) or '(' in expr[1:-1]:
+            return None
+        parcalar = []
+        params = []
+        for kosul in expr[1:-1].split(','):
+            alt_kolon, _, alt_expr = kosul.partition('.')
+            sonuc = _filtre_sql(alt_kolon, alt_expr, kolonlar)
+            if sonuc is None:
+                return None
+            parcalar.append(sonuc[0])
+            params.extend(sonuc[1])
+        return '(' + ' AND '.join(parcalar) + ')', params
+
+    if column not in kolonlar:
+        return None
+
+    negatif = expr.startswith('not.')
+    if negatif:
+        expr = expr[4:]
+
+    op, _, arg = expr.partition('.')
+    arg = urllib.parse.unquote(arg)
+    kolon = f'"{column}"'
+
+    if op in SQL_OPERATORLER:
+        sql, params = f'{kolon} {SQL_OPERATORLER[op]} ?', [arg]
+    elif op == 'is' and arg == 'null':
+        sql, params = f'{kolon} IS NULL', []
+    elif op == 'in':
+        degerler = _in_degerleri(arg)
+        if degerler is None:
+            return None
+        sql, params = f"{kolon} IN ({', '.join('?' * len(degerler))})", degerler
+    else:
+        return None
+
+    return (f'NOT ({sql})', params) if negatif else (sql, params)
+
+
+def _order_sql(order: str, kolonlar: set) -> Optional[str]:
+    """PostgREST order ifadesini PostgreSQL NULL sıralamasıyla SQL'e çevir"""
+    parcalar = []
+    for part in [p.strip() for p in order.split(',') if p.strip()]:
+        bits = part.split('.')
+        column = bits[0]
+        if column not in kolonlar:
+            return None
+        desc = 'desc' in bits[1:]
+        nulls_first = 'nullsfirst' in bits[1:] or (desc and 'nullslast' not in bits[1:])
+        parcalar.append(f'("{column}" IS NULL) {"DESC" if nulls_first else "ASC"}')
+        parcalar.append(f'"{column}" {"DESC" if desc else "ASC"}')
+    return ', '.join(parcalar)
+
+
+def select(table: str, select: str = '*', filters: dict = None, order: str = None) -> Optional[List[Dict]]:
+    """
+    fetch_all_paginated ile aynı sonucu yerel kopyadan döndür
+
+    Desteklenen filtreler: eq, neq, gt, gte, lt, lte, is.null, in.(...), not.<op>
+    ve and=(kolon.op.deger,...). Desteklenmeyen select/filtre/sıralama için None.
+    """
+    if table not in REPLICA_TABLES:
+        return None
+
+    ensure_fresh(table)
+    conn = get_connection()
+    kolonlar = _kolonlar(conn, table)
+    kolon_seti = set(kolonlar)
+
+    if select.strip() == '*':
+        secilen = kolonlar
+    else:
+        secilen = [c.strip() for c in select.split(',')]
+        if not all(c in kolon_seti for c in secilen):
+            return None
+
+    kosullar = []
+    params = []
+    for column, expr in (filters or {}).items():
+        sonuc = _filtre_sql(column, str(expr), kolon_seti)
+        if sonuc is None:
+            return None
+        kosullar.append(sonuc[0])
+        params.extend(sonuc[1])
+
+    kolon_sql = ', '.join(f'"{c}"' for c in secilen)
+    sql = f'SELECT {kolon_sql} FROM "{table}"'
+    if kosullar:
+        sql += ' WHERE ' + ' AND '.join(kosullar)
+
+    order_sql = _order_sql(order, kolon_seti) if order else ''
+    if order_sql is None:
+        return None
+    # Supabase yolundaki gibi eşit değerler id sırasını korusun
+    sql += f" ORDER BY {order_sql + ', ' if order_sql else ''}id ASC"
+
+    return [dict(zip(secilen, row)) for row in conn.execute(sql, params)]
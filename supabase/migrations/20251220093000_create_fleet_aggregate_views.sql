@@ -0,0 +1,63 @@
+/*
+  # Filo Özet View'ları ve RPC Fonksiyonları
+
+  1. Yeni View'lar
+    - `yakit_plaka_ozet` - plaka bazlı toplamlar
+      - `plaka`, `kayit_sayisi`, `toplam_yakit`, `toplam_maliyet`, `ilk_tarih`, `son_tarih`
+    - `yakit_aylik_ozet` - ay bazlı toplamlar
+      - `ay` (ayın ilk günü), `kayit_sayisi`, `plaka_sayisi`, `toplam_yakit`, `toplam_maliyet`
+
+  2. Yeni Fonksiyonlar
+    - `tablo_sayilari()` - yakit, agirlik ve arac_takip satır sayıları (json)
+
+  3. Amaç
+    - Ana sayfa ve /api/database-stats tüm yakit/agirlik/arac_takip satırlarını
+      indirmek yerine birkaç KB'lık özet verisi çeker
+    - Toplamlar PostgreSQL'de hesaplanır
+
+  4. Notlar
+    - Sayısal kolonlar text olarak oluşturulmuş olsa bile NULLIF(...)::numeric ile toplanır
+    - NULL plaka satırları da ayrı bir grup olarak sayılır (kayıt sayısı tutarlı kalır)
+*/
+
+-- Plaka bazlı yakıt özeti
+CREATE OR REPLACE VIEW yakit_plaka_ozet AS
+SELECT
+    plaka,
+    COUNT(*) AS kayit_sayisi,
+    COALESCE(SUM(NULLIF(yakit_miktari::text, '')::numeric), 0) AS toplam_yakit,
+    COALESCE(SUM(NULLIF(satir_tutari::text, '')::numeric), 0) AS toplam_maliyet,
+    MIN(islem_tarihi) AS ilk_tarih,
+    MAX(islem_tarihi) AS son_tarih
+FROM yakit
+GROUP BY plaka;
+
+-- Ay bazlı yakıt özeti
+CREATE OR REPLACE VIEW yakit_aylik_ozet AS
+SELECT
+    date_trunc('month', islem_tarihi::date)::date AS ay,
+    COUNT(*) AS kayit_sayisi,
+    COUNT(DISTINCT plaka) AS plaka_sayisi,
+    COALESCE(SUM(NULLIF(yakit_miktari::text, '')::numeric), 0) AS toplam_yakit,
+    COALESCE(SUM(NULLIF(satir_tutari::text, '')::numeric), 0) AS toplam_maliyet
+FROM yakit
+WHERE islem_tarihi IS NOT NULL
+GROUP BY 1;
+
+-- Tablo satır sayıları
+CREATE OR REPLACE FUNCTION tablo_sayilari()
+RETURNS json
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT json_build_object(
+        'yakit', (SELECT COUNT(*) FROM yakit),
+        'agirlik', (SELECT COUNT(*) FROM agirlik),
+        'arac_takip', (SELECT COUNT(*) FROM arac_takip)
+    );
+$$;
+
+-- Okuma izinleri
+GRANT SELECT ON yakit_plaka_ozet TO anon, authenticated;
+GRANT SELECT ON yakit_aylik_ozet TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION tablo_sayilari() TO anon, authenticated;
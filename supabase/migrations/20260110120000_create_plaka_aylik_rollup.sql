@@ -0,0 +1,183 @@
+/*
+  # Plaka x Ay Özet (Rollup) Tablosu
+
+  1. Yeni Tablo
+    - `plaka_aylik_rollup` - her (plaka, ay) için önceden hesaplanmış toplamlar
+      - `plaka`, `ay` (ayın ilk günü)
+      - yakıt: `yakit_kayit`, `yakit_litre`, `yakit_maliyet`, `km_toplam`,
+        `km_ilk`, `km_son`, `km_fark` (ay içi ardışık km okumalarının pozitif farkları)
+      - ağırlık: `agirlik_kayit`, `agirlik_miktar` (tüm birimler),
+        `tonaj_kg` / `yuklenme_sayisi` (birim = 'Kg' ve miktar > 0),
+        `birim_miktar` (birim -> toplam miktar, jsonb)
+      - `guncellendi`
+
+  2. Yeni Fonksiyon
+    - `plaka_aylik_rollup_yenile(aylar date[])` - verilen ayların satırlarını
+      yakit ve agirlik tablolarından yeniden hesaplar (NULL = tüm aylar).
+      Yükleme sonrası sadece dosyada geçen aylar yenilenir.
+
+  3. Amaç
+    - Tarih aralıklı raporlar (muhasebe vb.) ham satırları taramak yerine
+      birkaç yüz özet satırını toplar
+    - Ay bazında silip yeniden hesaplandığı için aynı ay tekrar yenilenebilir
+
+  4. Notlar
+    - Tarihi NULL olan satırlar rollup'a girmez (raporlar bunları ayrıca okur)
+    - Sayısal kolonlar text olarak oluşturulmuş olsa bile NULLIF(...)::numeric ile toplanır
+    - NULL plaka satırları ayrı bir grup olarak tutulur
+*/
+
+CREATE TABLE IF NOT EXISTS plaka_aylik_rollup (
+    plaka TEXT,
+    ay DATE NOT NULL,
+    yakit_kayit INTEGER NOT NULL DEFAULT 0,
+    yakit_litre NUMERIC NOT NULL DEFAULT 0,
+    yakit_maliyet NUMERIC NOT NULL DEFAULT 0,
+    km_toplam NUMERIC NOT NULL DEFAULT 0,
+    km_ilk NUMERIC,
+    km_son NUMERIC,
+    km_fark NUMERIC NOT NULL DEFAULT 0,
+    agirlik_kayit INTEGER NOT NULL DEFAULT 0,
+    agirlik_miktar NUMERIC NOT NULL DEFAULT 0,
+    tonaj_kg NUMERIC NOT NULL DEFAULT 0,
+    yuklenme_sayisi INTEGER NOT NULL DEFAULT 0,
+    birim_miktar JSONB NOT NULL DEFAULT '{}'::jsonb,
+    guncellendi TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_plaka_aylik_rollup_ay ON plaka_aylik_rollup(ay, plaka);
+CREATE INDEX IF NOT EXISTS idx_plaka_aylik_rollup_plaka ON plaka_aylik_rollup(plaka, ay);
+
+CREATE OR REPLACE FUNCTION plaka_aylik_rollup_yenile(aylar date[] DEFAULT NULL)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    satir_sayisi integer;
+BEGIN
+    -- Aynı anda iki yenileme aynı ayları silip yazmasın
+    PERFORM pg_advisory_xact_lock(hashtext('plaka_aylik_rollup'));
+
+    IF aylar IS NULL THEN
+        SELECT array_agg(DISTINCT a) INTO aylar FROM (
+            SELECT date_trunc('month', islem_tarihi)::date AS a FROM yakit WHERE islem_tarihi IS NOT NULL
+            UNION
+            SELECT date_trunc('month', tarih)::date FROM agirlik WHERE tarih IS NOT NULL
+        ) t;
+    ELSE
+        SELECT array_agg(DISTINCT date_trunc('month', a)::date) INTO aylar FROM unnest(aylar) a;
+    END IF;
+
+    DELETE FROM plaka_aylik_rollup WHERE ay = ANY(COALESCE(aylar, '{}'));
+
+    IF aylar IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    WITH hedef AS (
+        SELECT unnest(aylar) AS ay
+    ),
+    yakit_satir AS (
+        SELECT
+            y.plaka,
+            h.ay,
+            NULLIF(y.yakit_miktari::text, '')::numeric AS litre,
+            NULLIF(y.satir_tutari::text, '')::numeric AS tutar,
+            NULLIF(y.km_bilgisi::text, '')::numeric AS km,
+            y.islem_tarihi,
+            y.id
+        FROM yakit y
+        JOIN hedef h ON y.islem_tarihi >= h.ay AND y.islem_tarihi < h.ay + INTERVAL '1 month'
+    ),
+    km_satir AS (
+        SELECT
+            plaka, ay, km,
+            km - LAG(km) OVER (PARTITION BY plaka, ay ORDER BY islem_tarihi, id) AS fark
+        FROM yakit_satir
+        WHERE km > 0
+    ),
+    km_ozet AS (
+        SELECT
+            COALESCE(plaka, '') AS anahtar, ay,
+            MIN(km) AS km_ilk,
+            MAX(km) AS km_son,
+            COALESCE(SUM(fark) FILTER (WHERE fark > 0), 0) AS km_fark
+        FROM km_satir
+        GROUP BY 1, 2
+    ),
+    yakit_ozet AS (
+        SELECT
+            COALESCE(plaka, '') AS anahtar, ay,
+            COUNT(*) AS yakit_kayit,
+            COALESCE(SUM(litre), 0) AS yakit_litre,
+            COALESCE(SUM(tutar), 0) AS yakit_maliyet,
+            COALESCE(SUM(km), 0) AS km_toplam
+        FROM yakit_satir
+        GROUP BY 1, 2
+    ),
+    agirlik_satir AS (
+        SELECT
+            COALESCE(a.plaka, '') AS anahtar,
+            h.ay,
+            a.birim,
+            NULLIF(a.miktar::text, '')::numeric AS miktar
+        FROM agirlik a
+        JOIN hedef h ON a.tarih >= h.ay AND a.tarih < h.ay + INTERVAL '1 month'
+    ),
+    agirlik_birim AS (
+        SELECT anahtar, ay, COALESCE(birim, '') AS birim, COALESCE(SUM(miktar), 0) AS miktar
+        FROM agirlik_satir
+        GROUP BY 1, 2, 3
+    ),
+    agirlik_ozet AS (
+        SELECT
+            s.anahtar, s.ay,
+            COUNT(*) AS agirlik_kayit,
+            COALESCE(SUM(s.miktar), 0) AS agirlik_miktar,
+            COALESCE(SUM(s.miktar) FILTER (WHERE s.birim = 'Kg' AND s.miktar > 0), 0) AS tonaj_kg,
+            COUNT(*) FILTER (WHERE s.birim = 'Kg' AND s.miktar > 0) AS yuklenme_sayisi,
+            (SELECT jsonb_object_agg(b.birim, b.miktar) FROM agirlik_birim b
+              WHERE b.anahtar = s.anahtar AND b.ay = s.ay) AS birim_miktar
+        FROM agirlik_satir s
+        GROUP BY s.anahtar, s.ay
+    )
+    INSERT INTO plaka_aylik_rollup (
+        plaka, ay,
+        yakit_kayit, yakit_litre, yakit_maliyet, km_toplam, km_ilk, km_son, km_fark,
+        agirlik_kayit, agirlik_miktar, tonaj_kg, yuklenme_sayisi, birim_miktar
+    )
+    SELECT
+        NULLIF(COALESCE(y.anahtar, a.anahtar), ''),
+        COALESCE(y.ay, a.ay),
+        COALESCE(y.yakit_kayit, 0),
+        COALESCE(y.yakit_litre, 0),
+        COALESCE(y.yakit_maliyet, 0),
+        COALESCE(y.km_toplam, 0),
+        k.km_ilk,
+        k.km_son,
+        COALESCE(k.km_fark, 0),
+        COALESCE(a.agirlik_kayit, 0),
+        COALESCE(a.agirlik_miktar, 0),
+        COALESCE(a.tonaj_kg, 0),
+        COALESCE(a.yuklenme_sayisi, 0),
+        COALESCE(a.birim_miktar, '{}'::jsonb)
+    FROM yakit_ozet y
+    FULL JOIN agirlik_ozet a ON a.anahtar = y.anahtar AND a.ay = y.ay
+    LEFT JOIN km_ozet k ON k.anahtar = y.anahtar AND k.ay = y.ay;
+
+    GET DIAGNOSTICS satir_sayisi = ROW_COUNT;
+    RETURN satir_sayisi;
+END;
+$$;
+
+-- İlk doldurma
+SELECT plaka_aylik_rollup_yenile(NULL);
+
+-- Okuma izinleri (yazma sadece yenileme fonksiyonu üzerinden)
+ALTER TABLE plaka_aylik_rollup ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Public read plaka_aylik_rollup" ON plaka_aylik_rollup;
+CREATE POLICY "Public read plaka_aylik_rollup" ON plaka_aylik_rollup FOR SELECT USING (true);
+GRANT SELECT ON plaka_aylik_rollup TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION plaka_aylik_rollup_yenile(date[]) TO anon, authenticated;
@@ -0,0 +1,53 @@
+/*
+  # record_hash Unique Index
+
+  1. Değişiklikler
+    - `yakit`, `agirlik`, `arac_takip` tablolarındaki aynı record_hash'li
+      tekrar satırlardan ilki (en küçük id) bırakılır, diğerleri silinir
+    - Düz `idx_<tablo>_record_hash` index'lerinin yerine unique index oluşturulur
+    - Silinen satırlar için aylık özet (plaka_aylik_rollup) yeniden hesaplanır
+
+  2. Amaç
+    - Yükleme sırasında tablodaki bütün hash'leri çekmek yerine kayıtlar
+      `on_conflict=record_hash` + `Prefer: resolution=ignore-duplicates`
+      ile gönderilir; tekrar eden satırları veritabanı atlar (dedup.py)
+    - Aynı dosya iki kez (ya da eşzamanlı) yüklense bile tekrar satır oluşmaz
+
+  3. Notlar
+    - Silinen satırlar aynı record_hash'e, yani aynı içeriğe sahiptir
+    - record_hash'i NULL olan (eski) satırlar etkilenmez; unique index birden
+      fazla NULL'a izin verir
+*/
+
+-- Yakıt
+DELETE FROM yakit a
+USING yakit b
+WHERE a.record_hash IS NOT NULL
+  AND a.record_hash = b.record_hash
+  AND a.id > b.id;
+
+DROP INDEX IF EXISTS idx_yakit_record_hash;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_yakit_record_hash ON yakit(record_hash);
+
+-- Ağırlık
+DELETE FROM agirlik a
+USING agirlik b
+WHERE a.record_hash IS NOT NULL
+  AND a.record_hash = b.record_hash
+  AND a.id > b.id;
+
+DROP INDEX IF EXISTS idx_agirlik_record_hash;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_agirlik_record_hash ON agirlik(record_hash);
+
+-- Araç takip
+DELETE FROM arac_takip a
+USING arac_takip b
+WHERE a.record_hash IS NOT NULL
+  AND a.record_hash = b.record_hash
+  AND a.id > b.id;
+
+DROP INDEX IF EXISTS idx_arac_takip_record_hash;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_arac_takip_record_hash ON arac_takip(record_hash);
+
+-- Silinen tekrarlar özet tablodan da çıksın
+SELECT plaka_aylik_rollup_yenile(NULL);
@@ -0,0 +1,57 @@
+/*
+  # processed_files: İçerik Hash'i ve Blok Manifesti
+
+  1. Değişiklikler
+    - `processed_files` tablosu yoksa oluşturulur (supabase_schema.sql'deki tanım)
+    - Yeni kolonlar:
+      - `file_hash` (text) - Dosya içeriğinin MD5'i
+      - `file_size` (bigint) - Dosya boyutu (bayt)
+      - `head_digest` (text) - İlk satır bloğunun özeti
+      - `manifest` (jsonb) - Satır blokları (başlangıç, satır sayısı, özet,
+        atlanan) ve yükleme sayaçları
+    - `(table_name, file_hash)` ve `(table_name, head_digest)` index'leri
+
+  2. Amaç
+    - /api/upload-excel aynı dosya tekrar yüklendiğinde dosyayı okumadan döner
+    - Sonuna satır eklenmiş dosyada sadece yeni bloklar işlenir (upload_manifest.py)
+
+  3. Notlar
+    - Mevcut satırlar etkilenmez; eski kayıtların hash'i olmadığı için
+      sadece bu migration'dan sonraki yüklemeler eşleşir
+*/
+
+CREATE TABLE IF NOT EXISTS processed_files (
+  id BIGSERIAL PRIMARY KEY,
+  filename TEXT,
+  table_name TEXT,
+  record_count INTEGER,
+  status TEXT,
+  created_at TIMESTAMP DEFAULT NOW()
+);
+
+ALTER TABLE processed_files ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_policies
+    WHERE tablename = 'processed_files' AND policyname = 'Public read processed_files'
+  ) THEN
+    CREATE POLICY "Public read processed_files" ON processed_files FOR SELECT USING (true);
+  END IF;
+
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_policies
+    WHERE tablename = 'processed_files' AND policyname = 'Public insert processed_files'
+  ) THEN
+    CREATE POLICY "Public insert processed_files" ON processed_files FOR INSERT WITH CHECK (true);
+  END IF;
+END $$;
+
+ALTER TABLE processed_files ADD COLUMN IF NOT EXISTS file_hash TEXT;
+ALTER TABLE processed_files ADD COLUMN IF NOT EXISTS file_size BIGINT;
+ALTER TABLE processed_files ADD COLUMN IF NOT EXISTS head_digest TEXT;
+ALTER TABLE processed_files ADD COLUMN IF NOT EXISTS manifest JSONB;
+
+CREATE INDEX IF NOT EXISTS idx_processed_files_hash ON processed_files(table_name, file_hash);
+CREATE INDEX IF NOT EXISTS idx_processed_files_head ON processed_files(table_name, head_digest);
@@ -1,181 +1,87 @@
 """
-Supabase PostgreSQL'den SQLite'a veri kopyalama (HTTP ile)
-"""
-import os
-import sqlite3
-import urllib.request
-import json
-
-# .env dosyasını manuel oku
-def load_env():
-    env_path = os.path.join(os.path.dirname(__file__), '.env')
-    env_vars = {}
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    env_vars[key.strip()] = value.strip()
-    return env_vars
+Supabase PostgreSQL'den SQLite'a veri kopyalama (artımlı)
 
-env = load_env()
+Kullanım:
+    python supabase_to_sqlite.py              # sadece yeni satırları çek
+    python supabase_to_sqlite.py --full       # tabloları baştan kopyala
+    python supabase_to_sqlite.py --kargo-data # çevrimdışı kargo_data.db'yi yenile
 
-# Supabase bağlantısı
-SUPABASE_URL = env.get('VITE_SUPABASE_URL')
-SUPABASE_KEY = env.get('VITE_SUPABASE_ANON_KEY')
+Kopya sqlite_replica.REPLICA_PATH dosyasına yazılır (varsayılan kargo_replica.db).
+Uygulamanın okumaları bu dosyadan yapması için DATA_BACKEND=sqlite-replica ayarlayın.
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    print("❌ .env dosyasında SUPABASE bilgileri bulunamadı!")
-    exit(1)
-
-def fetch_data(table_name):
-    """Supabase'den tüm tablo verisini çek (pagination ile)"""
-    all_data = []
-    offset = 0
-    limit = 1000
+--kargo-data eski davranıştır: kargo_data.db'deki (init_sqlite_db.py şeması)
+tablolar boşaltılıp Supabase'deki satırlarla baştan doldurulur. Bu dosyayı
+okuyan scriptler (migrate_to_supabase.py, populate_araclar.py, ...) için.
+"""
+import sys
+import sqlite3
 
-    while True:
-        url = f'{SUPABASE_URL}/rest/v1/{table_name}?select=*&limit={limit}&offset={offset}'
-        req = urllib.request.Request(url)
-        req.add_header('apikey', SUPABASE_KEY)
-        req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
-        req.add_header('Content-Type', 'application/json')
-        req.add_header('Prefer', 'count=exact')
+from database import SUPABASE_URL, SUPABASE_KEY
+import sqlite_replica
+
+KARGO_DATA_DB = 'kargo_data.db'
+
+
+def kargo_data_yenile(table: str) -> int:
+    """kargo_data.db'deki tabloyu Supabase'deki satırlarla baştan doldur (id'ler yerelde verilir)"""
+    from database import fetch_all_paginated
+
+    rows = fetch_all_paginated(table, keyset=True, parallel=True)
+    conn = sqlite3.connect(KARGO_DATA_DB)
+    try:
+        kolonlar = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")') if row[1] != 'id']
+        if not kolonlar:
+            raise ValueError(f"{KARGO_DATA_DB} içinde {table} tablosu yok (önce init_sqlite_db.py)")
+        kolon_sql = ', '.join(f'"{c}"' for c in kolonlar)
+        yer_tutucu = ', '.join('?' * len(kolonlar))
+        with conn:
+            conn.execute(f'DELETE FROM "{table}"')
+            conn.executemany(
+                f'INSERT INTO "{table}" ({kolon_sql}) VALUES ({yer_tutucu})',
+                [tuple(sqlite_replica._deger(row.get(c)) for c in kolonlar) for row in rows]
+            )
+    finally:
+        conn.close()
+    return len(rows)
+
+
+if __name__ == '__main__':
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("❌ .env dosyasında SUPABASE bilgileri bulunamadı!")
+        exit(1)
+
+    full = '--full' in sys.argv[1:]
+    kargo_data = '--kargo-data' in sys.argv[1:]
+
+    if kargo_data:
+        print(f"🔄 Supabase'den {KARGO_DATA_DB} yenileniyor (tam kopya)...\n")
+    else:
+        print("🔄 Supabase'den SQLite'a veri kopyalanıyor" + (" (tam kopya)" if full else " (artımlı)") + "...\n")
 
+    hata = False
+    for table in sqlite_replica.REPLICA_TABLES:
+        print(f"📥 {table} senkronize ediliyor...")
         try:
-            with urllib.request.urlopen(req) as response:
-                batch = json.loads(response.read().decode())
-                if not batch or len(batch) == 0:
-                    break
-                all_data.extend(batch)
-                print(f"   📥 {len(batch)} kayıt çekildi (toplam: {len(all_data)})")
-
-                if len(batch) < limit:
-                    break
-                offset += limit
+            if kargo_data:
+                print(f"✅ {kargo_data_yenile(table)} kayıt kopyalandı")
+                continue
+            sonuc = sqlite_replica.sync_table(table, full=full)
+            tur = 'tam kopya' if sonuc['tam_kopya'] else 'artımlı'
+            print(f"✅ {sonuc['yeni_satir']} yeni kayıt ({tur}), toplam {sonuc['toplam']} - {sonuc['sure']} sn")
         except Exception as e:
-            print(f"❌ Veri çekme hatası: {e}")
-            break
-
-    return all_data
-
-# SQLite bağlantısı
-db_path = 'kargo_data.db'
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-print("🔄 Supabase'den SQLite'a veri kopyalanıyor...\n")
-
-# 1. YAKIT TABLOSU
-print("⛽ Yakıt verileri çekiliyor...")
-try:
-    # Önce tablodaki mevcut verileri sil
-    cursor.execute('DELETE FROM yakit')
-    conn.commit()
-
-    yakit_data = fetch_data('yakit')
-
-    if yakit_data and isinstance(yakit_data, list):
-        for row in yakit_data:
-            cursor.execute('''
-                INSERT INTO yakit (plaka, islem_tarihi, saat, yakit_miktari, birim_fiyat,
-                                   satir_tutari, stok_adi, km_bilgisi)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                row.get('plaka'),
-                row.get('islem_tarihi'),
-                row.get('saat'),
-                row.get('yakit_miktari'),
-                row.get('birim_fiyat'),
-                row.get('satir_tutari'),
-                row.get('stok_adi'),
-                row.get('km_bilgisi')
-            ))
-        conn.commit()
-        print(f"✅ {len(yakit_data)} yakıt kaydı kopyalandı")
-    else:
-        print("⚠️  Yakıt verisi yok")
-except Exception as e:
-    print(f"❌ Yakıt kopyalama hatası: {e}")
-
-# 2. AĞIRLIK TABLOSU
-print("\n⚖️  Ağırlık verileri çekiliyor...")
-try:
-    # Önce tablodaki mevcut verileri sil
-    cursor.execute('DELETE FROM agirlik')
-    conn.commit()
-
-    agirlik_data = fetch_data('agirlik')
-
-    if agirlik_data and isinstance(agirlik_data, list):
-        for row in agirlik_data:
-            cursor.execute('''
-                INSERT INTO agirlik (tarih, miktar, birim, net_agirlik, plaka,
-                                     adres, islem_noktasi, cari_adi)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                row.get('tarih'),
-                row.get('miktar'),
-                row.get('birim'),
-                row.get('net_agirlik'),
-                row.get('plaka'),
-                row.get('adres'),
-                row.get('islem_noktasi'),
-                row.get('cari_adi')
-            ))
-        conn.commit()
-        print(f"✅ {len(agirlik_data)} ağırlık kaydı kopyalandı")
+            hata = True
+            print(f"❌ {table} kopyalama hatası: {e}")
+
+    print("\n" + "="*60)
+    print("✅ VERİ KOPYALAMA TAMAMLANDI!" if not hata else "⚠️  VERİ KOPYALAMA HATALARLA TAMAMLANDI")
+    print("="*60)
+    if kargo_data:
+        print(f"📁 SQLite Veritabanı: {KARGO_DATA_DB}")
+        print("🚀 Flask'ı başlatın: python app.py")
     else:
-        print("⚠️  Ağırlık verisi yok")
-except Exception as e:
-    print(f"❌ Ağırlık kopyalama hatası: {e}")
-
-# 3. ARAÇ TAKİP TABLOSU
-print("\n🚛 Araç takip verileri çekiliyor...")
-try:
-    # Önce tablodaki mevcut verileri sil
-    cursor.execute('DELETE FROM arac_takip')
-    conn.commit()
-
-    arac_data = fetch_data('arac_takip')
-
-    if arac_data and isinstance(arac_data, list):
-        for row in arac_data:
-            cursor.execute('''
-                INSERT INTO arac_takip (plaka, sofor_adi, arac_gruplari, tarih,
-                                        hareket_baslangic_tarihi, hareket_bitis_tarihi,
-                                        baslangic_adresi, bitis_adresi,
-                                        toplam_kilometre, hareket_suresi,
-                                        rolanti_suresi, park_suresi, gunluk_yakit_tuketimi_l)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                row.get('plaka'),
-                row.get('sofor_adi'),
-                row.get('arac_gruplari'),
-                row.get('tarih'),
-                row.get('hareket_baslangic_tarihi'),
-                row.get('hareket_bitis_tarihi'),
-                row.get('baslangic_adresi'),
-                row.get('bitis_adresi'),
-                row.get('toplam_kilometre'),
-                row.get('hareket_suresi'),
-                row.get('rolanti_suresi'),
-                row.get('park_suresi'),
-                row.get('gunluk_yakit_tuketimi_l')
-            ))
-        conn.commit()
-        print(f"✅ {len(arac_data)} araç takip kaydı kopyalandı")
-    else:
-        print("⚠️  Araç takip verisi yok")
-except Exception as e:
-    print(f"❌ Araç takip kopyalama hatası: {e}")
-
-conn.close()
+        print(f"📁 SQLite Veritabanı: {sqlite_replica.REPLICA_PATH}")
+        print("🚀 Okumaları yerelden yapmak için: DATA_BACKEND=sqlite-replica")
+    print("="*60)
 
-print("\n" + "="*60)
-print("✅ VERİ KOPYALAMA TAMAMLANDI!")
-print("="*60)
-print(f"📁 SQLite Veritabanı: {db_path}")
-print("🚀 Flask'ı başlatın: python app.py")
-print("="*60)
+    if hata:
+        sys.exit(1)
@@ -0,0 +1,192 @@
+"""bulk_writer: tekrar deneme kuralları, hatalı satır ayıklama ve 23505/42P10 davranışı"""
+import json
+
+import pytest
+import requests
+from urllib3.exceptions import NewConnectionError, ProtocolError
+
+import bulk_writer
+import database
+
+
+class Yanit:
+    def __init__(self, status_code, govde=None, headers=None):
+        self.status_code = status_code
+        self._govde = govde
+        self.text = json.dumps(govde) if govde is not None else ''
+        self.headers = headers or {}
+
+    def json(self):
+        if self._govde is None:
+            raise ValueError('boş gövde')
+        return self._govde
+
+
+class SahteSunucu:
+    """Sıradaki cevapları döndürür; cevap yoksa varsayılan davranış çalışır"""
+
+    def __init__(self, varsayilan=None):
+        self.cevaplar = []
+        self.istekler = []
+        self.varsayilan = varsayilan or (lambda data, headers: Yanit(201))
+
+    def __call__(self, method, url, data=None, headers=None, timeout=None):
+        self.istekler.append([r['plaka'] for r in data])
+        cevap = self.cevaplar.pop(0) if self.cevaplar else self.varsayilan
+        if isinstance(cevap, Exception):
+            raise cevap
+        return cevap(data, headers) if callable(cevap) else cevap
+
+
+@pytest.fixture
+def sunucu(monkeypatch):
+    sunucu = SahteSunucu()
+    sunucu.sonrasi = []
+    sunucu.beklemeler = []
+    monkeypatch.setattr(database, 'supabase_http', sunucu)
+    monkeypatch.setattr(database, 'yazma_sonrasi',
+                        lambda table, data: sunucu.sonrasi.append([r['plaka'] for r in data]))
+    monkeypatch.setattr(bulk_writer.time, 'sleep', sunucu.beklemeler.append)
+    monkeypatch.setattr(bulk_writer.random, 'uniform', lambda a, b: 1)
+    return sunucu
+
+
+def _kayitlar(*plakalar):
+    return [{'plaka': p, 'record_hash': f'h{p}'} for p in plakalar]
+
+
+def _yaz(records, **kwargs):
+    return bulk_writer.yaz('yakit', records, workers=1, **kwargs)
+
+
+def _sayilar(rapor):
+    return {k: rapor[k] for k in ('inserted', 'duplicates', 'failed')}
+
+
+def test_hatali_satir_ayiklanir(sunucu):
+    def sunucu_davranisi(data, headers):
+        if any(r['plaka'] == 'BAD' for r in data):
+            return Yanit(400, {'code': '22P02', 'message': 'invalid input syntax'})
+        return Yanit(201)
+    sunucu.varsayilan = sunucu_davranisi
+
+    rapor = _yaz(_kayitlar('A', 'B', 'BAD', 'C'))
+
+    assert _sayilar(rapor) == {'inserted': 3, 'duplicates': 0, 'failed': 1}
+    assert [(h['baslangic'], h['satir'], h['kod']) for h in rapor['hatalar']] == [(2, 1, '22P02')]
+    assert sunucu.istekler == [['A', 'B', 'BAD', 'C'], ['A', 'B'], ['BAD', 'C'], ['BAD'], ['C']]
+    assert sunucu.sonrasi == [['A', 'B'], ['C']]
+
+
+def test_duz_insert_503_tekrar_denenmez(sunucu):
+    sunucu.cevaplar.append(Yanit(503, {'message': 'unavailable'}))
+
+    rapor = _yaz(_kayitlar('A', 'B'))
+
+    assert _sayilar(rapor) == {'inserted': 0, 'duplicates': 0, 'failed': 2}
+    assert len(sunucu.istekler) == 1
+    assert sunucu.beklemeler == []
+    assert 'tekrar denenmedi' in rapor['hatalar'][0]['mesaj']
+    # Batch yazılmış olabilir: önbellekler yine de yenilenir
+    assert sunucu.sonrasi == [['A', 'B']]
+
+
+@pytest.mark.parametrize('hata', [
+    requests.ReadTimeout('read timed out'),
+    requests.ConnectionError(ProtocolError('Connection aborted.', ConnectionResetError(104, 'reset'))),
+])
+def test_duz_insert_cevapsiz_istek_tekrar_denenmez(sunucu, hata):
+    sunucu.cevaplar.append(hata)
+    rapor = _yaz(_kayitlar('A'))
+    assert rapor['failed'] == 1
+    assert len(sunucu.istekler) == 1
+
+
+@pytest.mark.parametrize('hata', [
+    requests.ConnectTimeout('connect timed out'),
+    requests.ConnectionError(type('MaxRetry', (Exception,), {'reason': NewConnectionError(None, 'x')})()),
+])
+def test_duz_insert_baglanti_kurulamazsa_tekrar_denenir(sunucu, hata):
+    sunucu.cevaplar.append(hata)
+    rapor = _yaz(_kayitlar('A'))
+    assert _sayilar(rapor) == {'inserted': 1, 'duplicates': 0, 'failed': 0}
+    assert len(sunucu.istekler) == 2
+
+
+def test_429_tekrar_denenir_retry_after_uyulur(sunucu):
+    sunucu.cevaplar.append(Yanit(429, {'message': 'too many'}, headers={'Retry-After': '7'}))
+    sunucu.cevaplar.append(Yanit(429, {'message': 'too many'}))
+
+    rapor = _yaz(_kayitlar('A', 'B'))
+
+    assert _sayilar(rapor) == {'inserted': 2, 'duplicates': 0, 'failed': 0}
+    assert len(sunucu.istekler) == 3
+    # İlki Retry-After, ikincisi üstel bekleme (2. deneme: 2 x BULK_RETRY_BACKOFF)
+    assert sunucu.beklemeler == [7.0, bulk_writer.BULK_RETRY_BACKOFF * 2]
+    assert rapor['batches'][0]['deneme'] == 3
+
+
+def test_upsert_5xx_tekrar_denenir(sunucu):
+    sunucu.cevaplar.append(Yanit(503, {'message': 'unavailable'}))
+    sunucu.cevaplar.append(Yanit(201, [{'record_hash': 'hA'}]))
+
+    rapor = _yaz(_kayitlar('A', 'B'), on_conflict='record_hash')
+
+    # B zaten vardı; 503'lü deneme yazmış olabileceği için batch'in tamamı için yazma_sonrasi
+    assert _sayilar(rapor) == {'inserted': 1, 'duplicates': 1, 'failed': 0}
+    assert len(sunucu.istekler) == 2
+    assert sunucu.sonrasi == [['A', 'B']]
+
+
+def test_denemeler_biterse_hata(sunucu):
+    sunucu.varsayilan = lambda data, headers: Yanit(503, {'message': 'unavailable'})
+    rapor = _yaz(_kayitlar('A'), on_conflict='record_hash')
+    assert rapor['failed'] == 1
+    assert len(sunucu.istekler) == bulk_writer.BULK_RETRIES
+
+
+def test_kopan_baglanti_sonrasi_23505_yazilmis_sayilir(sunucu):
+    sunucu.cevaplar.append(requests.ConnectionError(
+        ProtocolError('Connection aborted.', ConnectionResetError(104, 'reset'))))
+    sunucu.cevaplar.append(Yanit(409, {'code': '23505', 'message': 'duplicate key value'}))
+
+    rapor = _yaz(_kayitlar('A', 'B', 'C'), on_conflict='record_hash')
+
+    assert _sayilar(rapor) == {'inserted': 3, 'duplicates': 0, 'failed': 0}
+    assert rapor['hatalar'] == []
+    assert len(sunucu.istekler) == 2
+    assert sunucu.sonrasi == [['A', 'B', 'C']]
+
+
+def test_ilk_denemede_23505_bolunmez(sunucu):
+    sunucu.varsayilan = lambda data, headers: Yanit(409, {'code': '23505', 'message': 'duplicate key value'})
+
+    rapor = _yaz(_kayitlar('A', 'B', 'C', 'D'))
+
+    assert _sayilar(rapor) == {'inserted': 0, 'duplicates': 0, 'failed': 4}
+    assert len(sunucu.istekler) == 1
+    assert sunucu.sonrasi == []
+
+
+def test_tek_satirda_23505_duplicate(sunucu):
+    sunucu.varsayilan = lambda data, headers: Yanit(409, {'code': '23505', 'message': 'duplicate key value'})
+    rapor = _yaz(_kayitlar('A'))
+    assert _sayilar(rapor) == {'inserted': 0, 'duplicates': 1, 'failed': 0}
+
+
+def test_42P10_bolunmez_bir_kez_raporlanir(sunucu):
+    sunucu.varsayilan = lambda data, headers: Yanit(
+        400, {'code': '42P10', 'message': 'no unique or exclusion constraint matching the ON CONFLICT'})
+
+    rapor = _yaz(_kayitlar('A', 'B', 'C', 'D'), on_conflict='record_hash')
+
+    assert _sayilar(rapor) == {'inserted': 0, 'duplicates': 0, 'failed': 4}
+    assert [(h['baslangic'], h['satir'], h['kod']) for h in rapor['hatalar']] == [(0, 4, '42P10')]
+    assert len(sunucu.istekler) == 1
+
+
+def test_batch_sinirlari_ve_sira(sunucu):
+    records = _kayitlar(*[f'P{i}' for i in range(7)])
+    rapor = _yaz(records, max_rows=3)
+    assert [(b['baslangic'], b['satir']) for b in rapor['batches']] == [(0, 3), (3, 3), (6, 1)]
+    assert rapor['inserted'] == 7
@@ -0,0 +1,152 @@
+"""dedup: yerel hash araması ve unique index yokken sorgu moduna geçiş"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import bulk_writer
+import dedup
+
+
+def _hash(i):
+    return f'{i:032x}'
+
+
+@pytest.fixture
+def yerel(monkeypatch):
+    """Yerel hash dizisini sabitle (sıralı S32 dizisi)"""
+    def ayarla(hashler):
+        dizi = np.array(sorted(hashler), dtype='S32')
+        monkeypatch.setattr(dedup, '_yerel_hashler', lambda table: dizi)
+    monkeypatch.setattr(dedup, 'DEDUP_LOCAL', True)
+    return ayarla
+
+
+def test_yerel_bilinen(yerel):
+    yerel([_hash(10), _hash(20), _hash(30)])
+    hashler = pd.Series([_hash(10), _hash(5), _hash(25), _hash(30), _hash(99)], index=[7, 3, 9, 1, 4])
+
+    bilinen = dedup.yerel_bilinen('yakit', hashler)
+
+    # Dizideki ilk elemandan küçük, aradaki ve son elemandan büyük hash'ler bilinmiyor
+    assert bilinen.index.tolist() == [7, 3, 9, 1, 4]
+    assert bilinen.tolist() == [True, False, False, True, False]
+
+
+def test_yerel_bilinen_tek_elemanli_dizi(yerel):
+    yerel([_hash(10)])
+    bilinen = dedup.yerel_bilinen('yakit', pd.Series([_hash(1), _hash(10), _hash(11)]))
+    assert bilinen.tolist() == [False, True, False]
+
+
+@pytest.mark.parametrize('dizi', [None, []])
+def test_yerel_bilinen_hash_dosyasi_yok_ya_da_bos(monkeypatch, dizi):
+    monkeypatch.setattr(dedup, 'DEDUP_LOCAL', True)
+    monkeypatch.setattr(dedup, '_yerel_hashler',
+                        lambda table: None if dizi is None else np.array(dizi, dtype='S32'))
+    bilinen = dedup.yerel_bilinen('yakit', pd.Series([_hash(1), _hash(2)]))
+    assert bilinen.tolist() == [False, False]
+
+
+def test_yerel_bilinen_bos_seri(yerel):
+    yerel([_hash(1)])
+    assert dedup.yerel_bilinen('yakit', pd.Series([], dtype=object)).empty
+
+
+def test_yerel_hash_dosyasi_snapshot_surumune_bagli(monkeypatch, tmp_path):
+    monkeypatch.setattr(dedup, 'SNAPSHOT_DIR', str(tmp_path))
+    monkeypatch.setattr(dedup, '_yerel', {})
+    wm = {'son_id': 3, 'satir_sayisi': 3}
+    monkeypatch.setattr(dedup, 'watermark', lambda table: dict(wm))
+    okunan = []
+
+    def read_column(table, column):
+        okunan.append(column)
+        return pd.Series([_hash(3), None, _hash(1), _hash(3)])
+    monkeypatch.setattr(dedup, 'read_column', read_column)
+
+    assert dedup._yerel_hashler('yakit').tolist() == [_hash(1).encode(), _hash(3).encode()]
+    # Bellekteki kopya silinse de aynı watermark için dosyadan okunur
+    dedup._yerel.clear()
+    assert dedup._yerel_hashler('yakit').tolist() == [_hash(1).encode(), _hash(3).encode()]
+    assert okunan == ['record_hash']
+    # Snapshot ilerleyince yeniden oluşturulur
+    wm['son_id'] = 4
+    dedup._yerel_hashler('yakit')
+    assert okunan == ['record_hash', 'record_hash']
+
+
+@pytest.fixture
+def sahte_yazici(monkeypatch):
+    """bulk_writer.yaz ve mevcut_hashler çağrılarını kaydet"""
+    monkeypatch.setattr(dedup, 'DEDUP_MODE', 'upsert')
+    monkeypatch.setattr(dedup, '_upsert_yok', set())
+    cagrilar = {'yaz': [], 'sorgu': []}
+    cevaplar = []
+
+    def yaz(table, records, on_conflict=None):
+        records = list(records)
+        cagrilar['yaz'].append((on_conflict, [r['record_hash'] for r in records]))
+        return cevaplar.pop(0)(records)
+
+    def mevcut_hashler(table, hashler):
+        hashler = list(hashler)
+        cagrilar['sorgu'].append(hashler)
+        return {h for h in hashler if int(h, 16) % 3 == 0}
+
+    monkeypatch.setattr(bulk_writer, 'yaz', yaz)
+    monkeypatch.setattr(dedup, 'mevcut_hashler', mevcut_hashler)
+    return cagrilar, cevaplar
+
+
+def _rapor(inserted=0, duplicates=0, failed=0, hatalar=()):
+    return {'inserted': inserted, 'duplicates': duplicates, 'failed': failed, 'hatalar': list(hatalar)}
+
+
+def _hata(baslangic, satir, kod):
+    return {'baslangic': baslangic, 'satir': satir, 'status': 400, 'kod': kod, 'mesaj': ''}
+
+
+def test_upsert(sahte_yazici):
+    cagrilar, cevaplar = sahte_yazici
+    cevaplar.append(lambda r: _rapor(inserted=3, duplicates=1))
+    records = [{'record_hash': _hash(i)} for i in range(4)]
+
+    assert dedup.kaydet('yakit', records) == {'inserted': 3, 'duplicates': 1, 'failed': 0}
+    assert cagrilar['yaz'] == [('record_hash', [_hash(i) for i in range(4)])]
+    assert cagrilar['sorgu'] == []
+
+
+def test_42P10_sadece_kalan_kayitlar_sorgu_ile_kontrol_edilir(sahte_yazici):
+    cagrilar, cevaplar = sahte_yazici
+    records = [{'record_hash': _hash(i)} for i in range(1, 9)]
+    # Batch'ler: 0-2 yazıldı, 2-5 ve 7-8 unique index yok, 5-7 veri hatası
+    cevaplar.append(lambda r: _rapor(inserted=1, duplicates=1, failed=6, hatalar=[
+        _hata(2, 3, '42P10'), _hata(5, 2, '22P02'), _hata(7, 1, '42P10')]))
+    cevaplar.append(lambda r: _rapor(inserted=len(r)))
+
+    sonuc = dedup.kaydet('yakit', records)
+
+    kalan = [_hash(i) for i in (3, 4, 5, 8)]
+    assert cagrilar['sorgu'] == [kalan]
+    # Sahte tabloda 3'e bölünen hash'ler var (_hash(3)); diğerleri düz insert ile yazılır
+    assert cagrilar['yaz'][1] == (None, [_hash(4), _hash(5), _hash(8)])
+    assert sonuc == {'inserted': 1 + 3, 'duplicates': 1 + 1, 'failed': 2}
+    assert dedup._upsert_yok == {'yakit'}
+
+    # Tablo artık doğrudan sorgu modunda
+    cevaplar.append(lambda r: _rapor(inserted=len(r)))
+    assert dedup.kaydet('yakit', [{'record_hash': _hash(9)}, {'record_hash': _hash(10)}]) == \
+        {'inserted': 1, 'duplicates': 1, 'failed': 0}
+    assert cagrilar['yaz'][2] == (None, [_hash(10)])
+
+
+def test_sorgu_hatasinda_kayitlar_yazilmaz(sahte_yazici, monkeypatch):
+    cagrilar, cevaplar = sahte_yazici
+    monkeypatch.setattr(dedup, 'DEDUP_MODE', 'sorgu')
+
+    def hata(table, hashler):
+        raise OSError('bağlantı yok')
+    monkeypatch.setattr(dedup, 'mevcut_hashler', hata)
+
+    assert dedup.kaydet('yakit', [{'record_hash': _hash(1)}]) == {'inserted': 0, 'duplicates': 0, 'failed': 1}
+    assert cagrilar['yaz'] == []
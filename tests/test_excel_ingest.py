@@ -0,0 +1,143 @@
+"""excel_ingest: record_hash'ler parça boyutundan bağımsız ve eski yükleme yoluyla aynı olmalı"""
+import io
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import dedup
+from excel_ingest import create_record_hash, excel_yukle
+
+BASLIKLAR = ['Plaka', 'İşlem Tarihi', 'Saat', 'Yakıt Miktarı', 'Birim Fiyat', 'KM Bilgisi']
+
+
+@pytest.fixture(autouse=True)
+def yerel_hash_yok(monkeypatch):
+    monkeypatch.setattr(dedup, 'yerel_bilinen', lambda table, hashler: pd.Series(False, index=hashler.index))
+
+
+def _excel(satirlar, basliklar=BASLIKLAR):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(basliklar)
+    for satir in satirlar:
+        ws.append(satir)
+    f = io.BytesIO()
+    wb.save(f)
+    f.seek(0)
+    return f
+
+
+def _kayitlar(satirlar, chunk_size, basliklar=BASLIKLAR):
+    yazilan = []
+
+    def yaz(table, records):
+        yazilan.extend(records)
+        return {'inserted': len(records), 'duplicates': 0}
+
+    excel_yukle(_excel(satirlar, basliklar), 'yakit', yaz=yaz, chunk_size=chunk_size)
+    return yazilan
+
+
+def _eski_yakit_kayitlari(f):
+    """Akışlı okumadan önceki yükleme yolu (pd.read_excel + iterrows + str)"""
+    df = pd.read_excel(f)
+    df.columns = df.columns.str.strip().str.lower()
+    df.columns = df.columns.str.replace('ı', 'i').str.replace('ğ', 'g').str.replace('ü', 'u') \
+        .str.replace('ş', 's').str.replace('ö', 'o').str.replace('ç', 'c')
+    df.columns = df.columns.str.replace(' ', '_').str.replace('.', '')
+
+    records = []
+    for _, row in df.iterrows():
+        plaka = None
+        for col in ['plaka', 'plate', 'arac', 'arac_plaka']:
+            if col in df.columns and pd.notna(row.get(col)):
+                plaka = str(row.get(col, '')).strip()
+                break
+        yakit_miktari = None
+        for col in ['yakit_miktari', 'miktar', 'litre', 'lt', 'yakit']:
+            if col in df.columns and pd.notna(row.get(col)):
+                val = float(row.get(col, 0))
+                if val > 0:
+                    yakit_miktari = val
+                    break
+        if not plaka or not yakit_miktari:
+            continue
+        birim_fiyat = 0.0
+        for col in ['birim_fiyat', 'fiyat', 'birim', 'price']:
+            if col in df.columns and pd.notna(row.get(col)):
+                birim_fiyat = float(row.get(col, 0))
+                break
+        satir_tutari = 0.0
+        for col in ['satir_tutari', 'tutar', 'total', 'toplam']:
+            if col in df.columns and pd.notna(row.get(col)):
+                satir_tutari = float(row.get(col, 0))
+                break
+        record = {
+            'plaka': plaka,
+            'islem_tarihi': str(row.get('islem_tarihi', '')) if pd.notna(row.get('islem_tarihi')) else None,
+            'saat': str(row.get('saat', '')) if pd.notna(row.get('saat')) else None,
+            'yakit_miktari': str(yakit_miktari),
+            'birim_fiyat': str(birim_fiyat),
+            'satir_tutari': str(satir_tutari),
+            'stok_adi': str(row.get('stok_adi', 'MOTORİN')) if pd.notna(row.get('stok_adi')) else 'MOTORİN',
+            'km_bilgisi': str(float(row.get('km_bilgisi', 0)))
+            if pd.notna(row.get('km_bilgisi')) and float(row.get('km_bilgisi', 0)) > 0 else None,
+        }
+        record['record_hash'] = create_record_hash(record)
+        records.append(record)
+    return records
+
+
+def test_record_hash_parca_boyutundan_bagimsiz():
+    # Saat kolonu tam sayı; boş hücre sadece ilk parçada (chunk_size=2)
+    satirlar = [[f'34 AB {i}', '2025-01-02', None if i == 1 else 900 + i, 10 + i, 42.5, 1000 + i]
+                for i in range(6)]
+
+    kucuk = _kayitlar(satirlar, chunk_size=2)
+    buyuk = _kayitlar(satirlar, chunk_size=1000)
+
+    assert len(kucuk) == len(buyuk) == 6
+    assert [r['record_hash'] for r in kucuk] == [r['record_hash'] for r in buyuk]
+    assert [r['saat'] for r in kucuk] == [r['saat'] for r in buyuk] == [
+        '900', None, '902', '903', '904', '905']
+    # Sayısal alanlar eskisi gibi float metni
+    assert kucuk[0]['yakit_miktari'] == '10.0'
+
+
+ESKI_BASLIKLAR = ['Plaka', 'İşlem Tarihi', 'Saat', 'Yakıt Miktarı', 'Birim Fiyat', 'Satır Tutarı',
+                  'Stok Adı', 'KM Bilgisi']
+
+
+def _eski_yol_satirlari(saat):
+    return [[f'34 AB {i}', datetime(2025, 1, 2 + i, 0, 0), saat(i), 10 + i * 0.5, 42.5, None if i == 2 else 420,
+             'MOTORİN' if i % 2 else None, 1000 + i] for i in range(6)]
+
+
+@pytest.mark.parametrize('chunk_size', [2, 1000])
+def test_record_hash_eski_yolla_ayni(chunk_size):
+    # Tam sayı metin kolonu boşsuz: eski yolda da int okunur, hash'ler birebir aynı
+    satirlar = _eski_yol_satirlari(lambda i: 900 + i)
+    yeni = _kayitlar(satirlar, chunk_size, ESKI_BASLIKLAR)
+    eski = _eski_yakit_kayitlari(_excel(satirlar, ESKI_BASLIKLAR))
+
+    assert [r['record_hash'] for r in yeni] == [r['record_hash'] for r in eski]
+
+
+@pytest.mark.parametrize('chunk_size', [2, 1000])
+def test_record_hash_bos_hucreli_tam_sayi_kolonu_eski_yoldan_farkli(chunk_size):
+    # Bilinen tek seferlik fark: boş hücresi olan tam sayı metin kolonu eski yolda
+    # float64 okunup "901.0" yazılırdı; şimdi her parçada "901"
+    satirlar = _eski_yol_satirlari(lambda i: None if i == 4 else 900 + i)
+    yeni = _kayitlar(satirlar, chunk_size, ESKI_BASLIKLAR)
+    eski = _eski_yakit_kayitlari(_excel(satirlar, ESKI_BASLIKLAR))
+
+    assert [r['saat'] for r in eski] == ['900.0', '901.0', '902.0', '903.0', None, '905.0']
+    assert [r['saat'] for r in yeni] == ['900', '901', '902', '903', None, '905']
+    for y, e in zip(yeni, eski):
+        # Fark sadece bu alanda: saat eski metne çevrilince hash eski hash'e eşit
+        duzeltilmis = {k: v for k, v in y.items() if k != 'record_hash'}
+        duzeltilmis['saat'] = e['saat']
+        assert create_record_hash(duzeltilmis) == e['record_hash']
+        assert (y['record_hash'] == e['record_hash']) == (e['saat'] is None)
@@ -0,0 +1,86 @@
+"""feature_store: artımlı birleştirilen özellikler baştan hesaplananla aynı olmalı"""
+import numpy as np
+import pandas as pd
+
+import feature_store
+
+YAKIT = pd.DataFrame({
+    'id': range(1, 9),
+    'plaka': ['A', 'A', 'A', 'B', 'C', 'C', 'B', 'A'],
+    'yakit_miktari': [40.0, 55.5, 61.0, 30.0, 20.0, np.nan, 35.0, 48.0],
+    'km_bilgisi': [1000.0, np.nan, 1300.0, 500.0, np.nan, 700.0, 650.0, 1500.0],
+})
+TAKIP = pd.DataFrame({
+    'id': range(1, 6),
+    'plaka': ['A', 'B', 'A', 'D', 'B'],
+    'toplam_kilometre': [120.0, 80.0, 140.0, 10.0, np.nan],
+    'maksimum_hiz': [90.0, 85.0, 95.0, 60.0, 88.0],
+    'gunluk_yakit_tuketimi_l': [30.0, np.nan, 34.0, 5.0, 21.0],
+})
+# İlk hesaptan sonra eklenen satırlar: A ve B devam eder, B ilk hesapta tek kayıtlı,
+# E sadece yeni satırlarda var ve tek kaydı olur
+YENI_YAKIT = pd.DataFrame({
+    'id': [12, 13, 14, 15],
+    'plaka': ['E', 'A', 'B', 'C'],
+    'yakit_miktari': [25.0, 70.0, 41.0, 22.0],
+    'km_bilgisi': [300.0, 1800.0, np.nan, 900.0],
+})
+YENI_TAKIP = pd.DataFrame({
+    'id': [9, 10],
+    'plaka': ['E', 'C'],
+    'toplam_kilometre': [50.0, 65.0],
+    'maksimum_hiz': [70.0, 80.0],
+    'gunluk_yakit_tuketimi_l': [12.0, 18.0],
+})
+
+
+def _ayni(sonuc, beklenen):
+    pd.testing.assert_series_equal(sonuc, beklenen, check_names=False, check_index_type=False)
+
+
+def _hesapla(monkeypatch, tablolar, durum):
+    monkeypatch.setattr(feature_store, 'load_table', lambda table: tablolar[table])
+    for table, df in tablolar.items():
+        feature_store._tabloyu_guncelle(table, durum, {'son_id': int(df['id'].max()), 'satir_sayisi': len(df)})
+    return feature_store._ozellikler(durum)
+
+
+def test_artimli_birlestirme_bastan_hesapla_ayni(monkeypatch):
+    ilk = {'yakit': YAKIT.iloc[:6], 'arac_takip': TAKIP.iloc[:3]}
+    son = {'yakit': pd.concat([YAKIT, YENI_YAKIT], ignore_index=True),
+           'arac_takip': pd.concat([TAKIP, YENI_TAKIP], ignore_index=True)}
+
+    durum = {}
+    _hesapla(monkeypatch, ilk, durum)
+    # İlk hesaptan sonra B'nin tek yakıt kaydı var: std tanımsız
+    assert np.isnan(feature_store._ozellikler(durum).loc['B', 'std_yakit'])
+    artimli = _hesapla(monkeypatch, son, durum)
+    bastan = _hesapla(monkeypatch, son, {})
+
+    pd.testing.assert_frame_equal(artimli, bastan)
+    assert artimli.index.tolist() == ['A', 'B', 'C', 'E']
+
+    # Ham satırlardan beklenen değerler
+    yakit = son['yakit'].groupby('plaka')
+    _ayni(artimli['ort_yakit'], yakit['yakit_miktari'].mean())
+    _ayni(artimli['std_yakit'], yakit['yakit_miktari'].std())
+    _ayni(artimli['sefer_sayisi'], yakit['yakit_miktari'].count().astype('float64'))
+    _ayni(artimli['ort_km'], yakit['km_bilgisi'].mean())
+    # Sadece yeni satırlarda olan, tek kayıtlı plaka
+    assert artimli.loc['E', 'ort_yakit'] == 25.0
+    assert np.isnan(artimli.loc['E', 'std_yakit'])
+    assert artimli.loc['E', 'ort_km_takip'] == 50.0
+
+    takip = son['arac_takip'].groupby('plaka')
+    assert artimli.loc['A', 'ort_km_takip'] == takip['toplam_kilometre'].mean()['A']
+    assert artimli.loc['B', 'ort_gunluk_yakit'] == 21.0
+    assert artimli.loc['C', 'ort_max_hiz'] == 80.0
+
+
+def test_silme_sonrasi_bastan_hesaplanir(monkeypatch):
+    durum = {}
+    _hesapla(monkeypatch, {'yakit': YAKIT, 'arac_takip': TAKIP}, durum)
+    # id'ler büyüdü ama bir satır silindi: birleştirme yerine baştan hesap
+    silinmis = {'yakit': pd.concat([YAKIT.iloc[1:], YENI_YAKIT], ignore_index=True), 'arac_takip': TAKIP}
+    artimli = _hesapla(monkeypatch, silinmis, durum)
+    pd.testing.assert_frame_equal(artimli, _hesapla(monkeypatch, silinmis, {}))
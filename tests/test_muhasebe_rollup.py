@@ -0,0 +1,89 @@
+"""Muhasebe: rollup'tan okunan tam aylar ve ham okunan kenarlar her günü bir kez kapsamalı"""
+from collections import Counter
+from datetime import date, timedelta
+
+import pytest
+
+import database
+from database import _tam_aylar
+
+# Sentetik veri: her gün için bir ağırlık ve bir yakıt satırı
+ILK_GUN, SON_GUN = date(2024, 11, 1), date(2025, 7, 31)
+GUNLER = [ILK_GUN + timedelta(days=i) for i in range((SON_GUN - ILK_GUN).days + 1)]
+
+
+def _araliktaki_gunler(baslangic, bitis):
+    baslangic = date.fromisoformat(baslangic) if baslangic else ILK_GUN
+    bitis = date.fromisoformat(bitis) if bitis else SON_GUN
+    return [g for g in GUNLER if baslangic <= g <= bitis]
+
+
+@pytest.mark.parametrize('baslangic, bitis, beklenen', [
+    ('2025-01-15', '2025-04-10',
+     ('2025-02-01', '2025-03-01', [('2025-01-15', '2025-01-31'), ('2025-04-01', '2025-04-10')])),
+    ('2025-03-01', '2025-03-31', ('2025-03-01', '2025-03-01', [])),
+    ('2025-02-01', '2025-02-28', ('2025-02-01', '2025-02-01', [])),
+    ('2024-12-15', '2025-01-31', ('2025-01-01', '2025-01-01', [('2024-12-15', '2024-12-31')])),
+    ('2025-02-10', None, ('2025-03-01', None, [('2025-02-10', '2025-02-28')])),
+    (None, '2025-02-10', (None, '2025-01-01', [('2025-02-01', '2025-02-10')])),
+    (None, None, (None, None, [])),
+    # Tek ay içinde ya da tam ay içermeyen aralık: hepsi ham veriden
+    ('2025-03-10', '2025-03-20', None),
+    ('2025-03-10', '2025-04-05', None),
+    ('2025-03-xx', None, None),
+])
+def test_tam_aylar(baslangic, bitis, beklenen):
+    assert _tam_aylar(baslangic, bitis) == beklenen
+
+
+@pytest.fixture
+def kapsam(monkeypatch):
+    """get_muhasebe_data'nın rollup'tan ve ham veriden okuduğu günleri say"""
+    okunan = Counter()
+    tarihsiz = []
+
+    def rollup(ilk_ay, son_ay, plaka=None):
+        satirlar = []
+        for gun in _araliktaki_gunler(ilk_ay, None):
+            ay = gun.replace(day=1).isoformat()
+            if son_ay and ay > son_ay:
+                continue
+            okunan[gun] += 1
+            satirlar.append({'plaka': 'A', 'ay': ay, 'agirlik_miktar': 1, 'yakit_maliyet': 2})
+        return satirlar
+
+    def ham(baslangic_tarihi=None, bitis_tarihi=None, plaka=None, sadece_tarihsiz=False):
+        if sadece_tarihsiz:
+            tarihsiz.append(True)
+            return [{'plaka': 'A', 'miktar': 1000}], []
+        gunler = _araliktaki_gunler(baslangic_tarihi, bitis_tarihi)
+        okunan.update(gunler)
+        return ([{'plaka': 'A', 'miktar': 1} for _ in gunler],
+                [{'plaka': 'A', 'satir_tutari': 2} for _ in gunler])
+
+    monkeypatch.setattr(database, 'flush_aylik_rollup', lambda: True)
+    monkeypatch.setattr(database, 'get_aylik_rollup', rollup)
+    monkeypatch.setattr(database, '_muhasebe_satirlari', ham)
+    return okunan, tarihsiz
+
+
+@pytest.mark.parametrize('baslangic, bitis', [
+    ('2025-01-15', '2025-04-10'),   # ortadan başlayıp ortada biten
+    ('2024-12-15', '2025-02-28'),   # yıl geçişi, ay sonunda biten
+    ('2025-03-10', '2025-03-20'),   # tek ay içinde
+    ('2025-02-10', None),           # açık uçlu
+    (None, '2025-02-10'),
+    (None, None),
+])
+def test_her_gun_bir_kez(kapsam, baslangic, bitis):
+    okunan, tarihsiz = kapsam
+    sonuc = database.get_muhasebe_data.__wrapped__(baslangic, bitis)
+
+    beklenen = _araliktaki_gunler(baslangic, bitis)
+    assert sonuc['status'] == 'success'
+    assert okunan == Counter(beklenen)
+    # Tarihsiz satırlar sadece tarih filtresi yokken eklenir
+    assert bool(tarihsiz) == (not baslangic and not bitis)
+    gelir = (len(beklenen) + (1000 if tarihsiz else 0)) * 50
+    gider = len(beklenen) * 2
+    assert sonuc['plaka_bazli']['A'] == {'gelir': gelir, 'gider': gider, 'kar': gelir - gider}
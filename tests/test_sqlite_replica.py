@@ -0,0 +1,82 @@
+"""sqlite_replica: PostgREST filtre/sıralama çevirisi Supabase ile aynı satırları döndürmeli"""
+import sqlite3
+
+import pytest
+
+from sqlite_replica import _filtre_sql, _order_sql
+
+KOLONLAR = {'id', 'plaka', 'tarih', 'miktar'}
+SATIRLAR = [
+    (1, '34 AB 1', '2025-01-05', 10),
+    (2, '34 AB 2', '2025-01-20', None),
+    (3, None, '2025-02-01', 5),
+    (4, '34 AB 1', None, 7),
+    (5, 'A, B', '2025-01-31', 3),
+]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, plaka TEXT, tarih TEXT, miktar NUMERIC)')
+    conn.executemany('INSERT INTO t VALUES (?, ?, ?, ?)', SATIRLAR)
+    yield conn
+    conn.close()
+
+
+def _idler(conn, filters=None, order=None):
+    kosullar, params = [], []
+    for column, expr in (filters or {}).items():
+        sql, p = _filtre_sql(column, expr, KOLONLAR)
+        kosullar.append(sql)
+        params.extend(p)
+    sql = 'SELECT id FROM t'
+    if kosullar:
+        sql += ' WHERE ' + ' AND '.join(kosullar)
+    if order:
+        sql += f' ORDER BY {_order_sql(order, KOLONLAR)}, id ASC'
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+@pytest.mark.parametrize('filters, beklenen', [
+    ({'plaka': 'eq.34 AB 1'}, [1, 4]),
+    ({'plaka': 'eq.34%20AB%202'}, [2]),
+    ({'miktar': 'gt.5'}, [1, 4]),
+    ({'plaka': 'in.(34 AB 2,"A, B")'}, [2, 5]),
+    ({'tarih': 'is.null'}, [4]),
+    ({'tarih': 'not.is.null'}, [1, 2, 3, 5]),
+    # PostgreSQL'de NOT (NULL = x) de NULL'dır; plaka'sı boş satır gelmez
+    ({'plaka': 'not.eq.34 AB 1'}, [2, 5]),
+    ({'plaka': 'not.in.(34 AB 1)'}, [2, 5]),
+    ({'and': '(tarih.gte.2025-01-01,tarih.lte.2025-01-31)'}, [1, 2, 5]),
+    ({'and': '(tarih.gte.2025-01-01,tarih.lte.2025-01-31)', 'plaka': 'eq.34 AB 1'}, [1]),
+])
+def test_filtre(conn, filters, beklenen):
+    assert _idler(conn, filters) == beklenen
+
+
+@pytest.mark.parametrize('column, expr', [
+    ('yok', 'eq.1'),
+    ('plaka', 'like.*AB*'),
+    ('and', '(tarih.gte.2025-01-01,or(miktar.eq.1))'),
+    ('and', '(yok.eq.1)'),
+])
+def test_desteklenmeyen_filtre(column, expr):
+    assert _filtre_sql(column, expr, KOLONLAR) is None
+
+
+@pytest.mark.parametrize('order, beklenen', [
+    # PostgreSQL: artan sırada NULL'lar sonda, azalan sırada başta
+    ('tarih', [1, 2, 5, 3, 4]),
+    ('tarih.asc', [1, 2, 5, 3, 4]),
+    ('tarih.desc', [4, 3, 5, 2, 1]),
+    ('tarih.asc.nullsfirst', [4, 1, 2, 5, 3]),
+    ('tarih.desc.nullslast', [3, 5, 2, 1, 4]),
+    ('plaka.asc,miktar.desc', [1, 4, 2, 5, 3]),
+])
+def test_siralama(conn, order, beklenen):
+    assert _idler(conn, order=order) == beklenen
+
+
+def test_desteklenmeyen_siralama():
+    assert _order_sql('yok.desc', KOLONLAR) is None
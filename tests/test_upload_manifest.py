@@ -0,0 +1,123 @@
+"""upload_manifest: sonuna satır eklenen dosyada sadece yeni kuyruk yazılır, sayaçlar değişmez"""
+import io
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import database
+import dedup
+import upload_manifest
+from excel_ingest import excel_yukle
+from upload_manifest import DosyaManifesti
+
+BASLIKLAR = ['Plaka', 'İşlem Tarihi', 'Saat', 'Yakıt Miktarı', 'Birim Fiyat']
+BLOK_SATIR = 4
+
+
+def _satir(i):
+    if i == 9:
+        return [None] * len(BASLIKLAR)                           # aradaki boş satır
+    if i in (2, 13):
+        return [None, '2025-01-02', '08:00', 10 + i, 42.5]       # plakasız
+    if i == 17:
+        return [f'34 P {i}', '2025-01-02', '08:00', 0, 42.5]     # yakıt miktarı 0
+    if i == 6:
+        return _satir(5)                                         # dosya içi tekrar
+    return [f'34 P {i}', '2025-01-02', None if i % 7 == 0 else 800 + i, 10 + i, 42.5]
+
+
+def _excel(satir_sayisi):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(BASLIKLAR)
+    for i in range(satir_sayisi):
+        ws.append(_satir(i))
+    f = io.BytesIO()
+    wb.save(f)
+    f.seek(0)
+    return f
+
+
+class SahteTablo:
+    """record_hash unique olan tablo; yaz() çağrılarını kaydeder"""
+
+    def __init__(self, hashler=()):
+        self.hashler = set(hashler)
+        self.yazilan = []
+
+    def yaz(self, table, records):
+        self.yazilan.extend(r['plaka'] for r in records)
+        yeni = [r for r in records if r['record_hash'] not in self.hashler]
+        self.hashler.update(r['record_hash'] for r in yeni)
+        return {'inserted': len(yeni), 'duplicates': len(records) - len(yeni)}
+
+
+@pytest.fixture(autouse=True)
+def ortam(monkeypatch):
+    monkeypatch.setattr(upload_manifest, 'BLOK_SATIR', BLOK_SATIR)
+    monkeypatch.setattr(dedup, 'yerel_bilinen', lambda table, hashler: pd.Series(False, index=hashler.index))
+    onceki = {}
+    monkeypatch.setattr(database, 'get_processed_file',
+                        lambda table_name, file_hash=None, head_digest=None: onceki.get(head_digest))
+    return onceki
+
+
+def _yukle(satir_sayisi, chunk_size, tablo, onceki=None):
+    manifest = DosyaManifesti('yakit', chunk_size)
+    sonuc = excel_yukle(_excel(satir_sayisi), 'yakit', yaz=tablo.yaz, chunk_size=chunk_size,
+                        manifest=manifest)
+    if onceki is not None:
+        onceki[manifest.head_digest] = {'filename': 'ilk.xlsx', 'manifest': manifest.ozet(sonuc)}
+    return sonuc, manifest
+
+
+# Bloklar parça içinde BLOK_SATIR'lık (aradaki boş satır sonraki satırla aynı parçaya
+# girer). İlk dosyanın (23 satır) son bloğu eksik kaldığı için o blok ve sonrası tekrar
+# işlenir. sinir: tekrar işlenen ilk satır
+@pytest.mark.parametrize('chunk_size, sinir', [
+    (8, 20),      # 0 4 | 8 12 | 16 20(3)
+    (10, 21),     # 0 4 8(3) | 11 15 19(2) | 21(2)
+    (7, 21),      # 0 4(3) | 7 11(3) | 14 18(3) | 21(2)
+    (1000, 20),   # 0 4 8 12 16 20(3)
+])
+def test_sonuna_eklenen_satirlar(ortam, chunk_size, sinir):
+    ilk_satir, son_satir = 23, 35
+
+    # 1. yükleme: manifest processed_files'a yazılır (sahte get_processed_file)
+    tablo = SahteTablo()
+    ilk, ilk_manifest = _yukle(ilk_satir, chunk_size, tablo, onceki=ortam)
+    assert ilk['total'] == ilk_satir and ilk['skipped'] == 4
+
+    # Aynı tablo durumunda önceki manifest olmadan tam yükleme
+    tam_tablo = SahteTablo(tablo.hashler)
+    ortam_yedek = dict(ortam)
+    ortam.clear()
+    tam, tam_manifest = _yukle(son_satir, chunk_size, tam_tablo)
+    ortam.update(ortam_yedek)
+
+    # 2. yükleme: aynı kalan bloklar atlanır
+    tablo.yazilan.clear()
+    artimli, artimli_manifest = _yukle(son_satir, chunk_size, tablo)
+
+    assert artimli == tam
+    assert tablo.hashler == tam_tablo.hashler
+    # Sonraki yüklemeler için blokların atlanan sayıları da tam yüklemeyle aynı
+    assert artimli_manifest.ozet(artimli) == tam_manifest.ozet(tam)
+
+    # Sadece ilk değişen bloktan itibaren satırlar yazıcıya gider
+    ilk_bloklar = {tuple(b[:3]) for b in ilk_manifest.bloklar}
+    assert [b[0] for b in artimli_manifest.bloklar if tuple(b[:3]) in ilk_bloklar] == \
+        [b[0] for b in artimli_manifest.bloklar if b[0] < sinir]
+    assert tablo.yazilan == [p for p in tam_tablo.yazilan if int(p.split()[-1]) >= sinir]
+    assert len(tablo.yazilan) == son_satir - sinir   # sınırdan sonra atlanan satır yok
+
+
+def test_parca_boyutu_degisirse_manifest_kullanilmaz(ortam):
+    tablo = SahteTablo()
+    _yukle(23, 8, tablo, onceki=ortam)
+    tablo.yazilan.clear()
+    # Blok sınırları parça boyutuna bağlı: önceki manifest eşleşmez, dosya baştan işlenir
+    sonuc, _ = _yukle(30, 10, tablo)
+    assert sonuc['total'] == 30
+    assert len(tablo.yazilan) == 30 - 4 - 1   # 4 atlanan (boş/plakasız/0), 1 dosya içi tekrar
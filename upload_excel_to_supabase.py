@@ -9,7 +9,11 @@ import urllib.request
 import json
 import os
 from datetime import datetime
-import hashlib
+
+from excel_ingest import create_record_hash
+from dedup import mevcut_hashler
+from bulk_writer import rapor_satirlari, yaz
+from upload_manifest import dosya_hash
 
 # .env dosyasını manuel oku
 def load_env():
@@ -28,52 +32,49 @@ env = load_env()
 SUPABASE_URL = env.get('VITE_SUPABASE_URL')
 SUPABASE_KEY = env.get('VITE_SUPABASE_ANON_KEY')
 
-def create_record_hash(record: dict) -> str:
-    """Kayıt için benzersiz hash oluştur (duplicate kontrolü için)"""
-    # Önemli alanları birleştir ve hash'le
-    key_parts = []
-    for key in sorted(record.keys()):
-        if record[key] is not None:
-            key_parts.append(f"{key}:{record[key]}")
-    hash_string = '|'.join(key_parts)
-    return hashlib.md5(hash_string.encode()).hexdigest()
-
-def supabase_insert_batch(table: str, data: list):
-    """Supabase'e toplu veri ekle"""
-    if not data:
-        return True
-
-    url = f'{SUPABASE_URL}/rest/v1/{table}'
+def refresh_aylik_rollup():
+    """plaka_aylik_rollup özet tablosunu yeniden hesapla (migration uygulanmamışsa atlanır)"""
+    url = f'{SUPABASE_URL}/rest/v1/rpc/plaka_aylik_rollup_yenile'
 
     req = urllib.request.Request(url, method='POST')
     req.add_header('apikey', SUPABASE_KEY)
     req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
     req.add_header('Content-Type', 'application/json')
-    req.add_header('Prefer', 'return=minimal')
-
-    req.data = json.dumps(data).encode()
+    req.data = json.dumps({'aylar': None}).encode()
 
     try:
         with urllib.request.urlopen(req) as response:
-            return response.status == 201
+            return response.status == 200
     except Exception as e:
-        print(f"   ❌ Hata: {e}")
+        print(f"   ⚠️  Aylık özet tablosu yenilenemedi: {e}")
         return False
 
-def get_existing_hashes(table: str) -> set:
-    """Tablodaki mevcut kayıtların hash'lerini al"""
-    try:
-        url = f'{SUPABASE_URL}/rest/v1/{table}?select=record_hash'
-
-        req = urllib.request.Request(url, method='GET')
-        req.add_header('apikey', SUPABASE_KEY)
-        req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
+def yeni_kayitlari_ayikla(table: str, records: list):
+    """Dosyada tekrarlanan ve tabloda zaten olan kayıtları çıkar (sadece bu hash'ler sorulur)"""
+    gorulen = set()
+    tekil = []
+    for r in records:
+        if r['record_hash'] not in gorulen:
+            gorulen.add(r['record_hash'])
+            tekil.append(r)
+    mevcut = mevcut_hashler(table, (r['record_hash'] for r in tekil))
+    yeni = [r for r in tekil if r['record_hash'] not in mevcut]
+    return yeni, len(records) - len(yeni)
+
+def yukle(upload_fonksiyonu, excel_file: str, table: str):
+    """Aynı içerikli dosya (MD5) tabloya daha önce yüklendiyse okumadan atla; başarılı yüklemeyi kaydet"""
+    from database import get_processed_file, record_processed_file
+
+    file_hash, file_size = dosya_hash(excel_file)
+    onceki = get_processed_file(table, file_hash=file_hash)
+    if onceki is not None:
+        print(f"\n⏭️  {excel_file}: aynı dosya daha önce yüklendi ({onceki.get('filename')}, {onceki.get('created_at')}) - atlandı")
+        return True
 
-        with urllib.request.urlopen(req) as response:
-            data = json.loads(response.read().decode())
-            return {row.get('record_hash') for row in data if row.get('record_hash')}
-    except:
-        return set()
+    if not upload_fonksiyonu(excel_file):
+        return False
+    record_processed_file(os.path.basename(excel_file), table, None, file_hash=file_hash, file_size=file_size)
+    return True
 
 def upload_yakit(excel_file):
     """Yakıt Excel dosyasını yükle"""
@@ -89,12 +90,8 @@ def upload_yakit(excel_file):
         # Kolon isimlerini düzelt
         df.columns = df.columns.str.strip().str.lower()
 
-        # Mevcut hash'leri al (duplicate kontrolü için)
-        existing_hashes = get_existing_hashes('yakit')
-
         # Verileri hazırla
         records = []
-        skipped = 0
 
         for _, row in df.iterrows():
             record = {
@@ -108,36 +105,29 @@ def upload_yakit(excel_file):
                 'km_bilgisi': float(row.get('km_bilgisi', 0)) if pd.notna(row.get('km_bilgisi')) else None
             }
 
-            # Hash oluştur ve kontrol et
-            record_hash = create_record_hash(record)
-
-            if record_hash in existing_hashes:
-                skipped += 1
-                continue
-
-            record['record_hash'] = record_hash
+            record['record_hash'] = create_record_hash(record)
             records.append(record)
 
+        # Duplicate kontrolü: sadece bu dosyanın hash'leri sorulur
+        records, skipped = yeni_kayitlari_ayikla('yakit', records)
+
         if not records:
             print(f"   ℹ️  Yeni kayıt yok - {skipped} kayıt zaten veritabanında mevcut (atlandı)")
             print(f"   ✅ Tekrarlı veri engellendi!")
             return True
 
-        # Batch olarak yükle
-        batch_size = 1000
-        success = 0
-
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i+batch_size]
-            if supabase_insert_batch('yakit', batch):
-                success += len(batch)
-                print(f"   ✅ {success}/{len(records)} yeni kayıt eklendi")
+        # Paralel batch'lerle yükle: mevcut record_hash'ler atlanır, geçici hatalar tekrar denenir, hatalı satırlar ayıklanır
+        rapor = yaz('yakit', records, on_conflict='record_hash')
+        for satir in rapor_satirlari(rapor):
+            print(f"   {satir}")
 
         if skipped > 0:
             print(f"   ℹ️  {skipped} kayıt atlandı (zaten mevcut)")
 
-        print(f"   ✅ Toplam: {success} YENİ kayıt eklendi")
-        return True
+        print(f"   ✅ Toplam: {rapor['inserted']} YENİ kayıt eklendi")
+        if rapor['failed']:
+            print(f"   ❌ {rapor['failed']} kayıt yazılamadı")
+        return rapor['failed'] == 0
 
     except Exception as e:
         print(f"   ❌ Hata: {e}")
@@ -157,10 +147,8 @@ def upload_agirlik(excel_file):
         print(f"   📊 {len(df)} satır okundu")
 
         df.columns = df.columns.str.strip().str.lower()
-        existing_hashes = get_existing_hashes('agirlik')
 
         records = []
-        skipped = 0
 
         for _, row in df.iterrows():
             record = {
@@ -174,33 +162,29 @@ def upload_agirlik(excel_file):
                 'cari_adi': str(row.get('cari_adi', '')) if pd.notna(row.get('cari_adi')) else None
             }
 
-            record_hash = create_record_hash(record)
-            if record_hash in existing_hashes:
-                skipped += 1
-                continue
-
-            record['record_hash'] = record_hash
+            record['record_hash'] = create_record_hash(record)
             records.append(record)
 
+        # Duplicate kontrolü: sadece bu dosyanın hash'leri sorulur
+        records, skipped = yeni_kayitlari_ayikla('agirlik', records)
+
         if not records:
             print(f"   ℹ️  Yeni kayıt yok - {skipped} kayıt zaten veritabanında mevcut (atlandı)")
             print(f"   ✅ Tekrarlı veri engellendi!")
             return True
 
-        batch_size = 1000
-        success = 0
-
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i+batch_size]
-            if supabase_insert_batch('agirlik', batch):
-                success += len(batch)
-                print(f"   ✅ {success}/{len(records)} yeni kayıt eklendi")
+        # Paralel batch'lerle yükle: mevcut record_hash'ler atlanır, geçici hatalar tekrar denenir, hatalı satırlar ayıklanır
+        rapor = yaz('agirlik', records, on_conflict='record_hash')
+        for satir in rapor_satirlari(rapor):
+            print(f"   {satir}")
 
         if skipped > 0:
             print(f"   ℹ️  {skipped} kayıt atlandı")
 
-        print(f"   ✅ Toplam: {success} YENİ kayıt eklendi")
-        return True
+        print(f"   ✅ Toplam: {rapor['inserted']} YENİ kayıt eklendi")
+        if rapor['failed']:
+            print(f"   ❌ {rapor['failed']} kayıt yazılamadı")
+        return rapor['failed'] == 0
 
     except Exception as e:
         print(f"   ❌ Hata: {e}")
@@ -220,10 +204,8 @@ def upload_arac_takip(excel_file):
         print(f"   📊 {len(df)} satır okundu")
 
         df.columns = df.columns.str.strip().str.lower()
-        existing_hashes = get_existing_hashes('arac_takip')
 
         records = []
-        skipped = 0
 
         for _, row in df.iterrows():
             record = {
@@ -242,33 +224,29 @@ def upload_arac_takip(excel_file):
                 'gunluk_yakit_tuketimi_l': float(row.get('gunluk_yakit_tuketimi_l', 0)) if pd.notna(row.get('gunluk_yakit_tuketimi_l')) else None
             }
 
-            record_hash = create_record_hash(record)
-            if record_hash in existing_hashes:
-                skipped += 1
-                continue
-
-            record['record_hash'] = record_hash
+            record['record_hash'] = create_record_hash(record)
             records.append(record)
 
+        # Duplicate kontrolü: sadece bu dosyanın hash'leri sorulur
+        records, skipped = yeni_kayitlari_ayikla('arac_takip', records)
+
         if not records:
             print(f"   ℹ️  Yeni kayıt yok - {skipped} kayıt zaten veritabanında mevcut (atlandı)")
             print(f"   ✅ Tekrarlı veri engellendi!")
             return True
 
-        batch_size = 1000
-        success = 0
-
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i+batch_size]
-            if supabase_insert_batch('arac_takip', batch):
-                success += len(batch)
-                print(f"   ✅ {success}/{len(records)} yeni kayıt eklendi")
+        # Paralel batch'lerle yükle: mevcut record_hash'ler atlanır, geçici hatalar tekrar denenir, hatalı satırlar ayıklanır
+        rapor = yaz('arac_takip', records, on_conflict='record_hash')
+        for satir in rapor_satirlari(rapor):
+            print(f"   {satir}")
 
         if skipped > 0:
             print(f"   ℹ️  {skipped} kayıt atlandı")
 
-        print(f"   ✅ Toplam: {success} YENİ kayıt eklendi")
-        return True
+        print(f"   ✅ Toplam: {rapor['inserted']} YENİ kayıt eklendi")
+        if rapor['failed']:
+            print(f"   ❌ {rapor['failed']} kayıt yazılamadı")
+        return rapor['failed'] == 0
 
     except Exception as e:
         print(f"   ❌ Hata: {e}")
@@ -348,21 +326,21 @@ if __name__ == '__main__':
     if 'yakit' in excel_files:
         for file in excel_files['yakit']:
             total_count += 1
-            if upload_yakit(file):
+            if yukle(upload_yakit, file, 'yakit'):
                 success_count += 1
 
     # Ağırlık dosyalarını yükle
     if 'agirlik' in excel_files:
         for file in excel_files['agirlik']:
             total_count += 1
-            if upload_agirlik(file):
+            if yukle(upload_agirlik, file, 'agirlik'):
                 success_count += 1
 
     # Araç takip dosyalarını yükle
     if 'arac_takip' in excel_files:
         for file in excel_files['arac_takip']:
             total_count += 1
-            if upload_arac_takip(file):
+            if yukle(upload_arac_takip, file, 'arac_takip'):
                 success_count += 1
 
     # Belirsiz dosyalar için kullanıcıya sor
@@ -381,13 +359,18 @@ if __name__ == '__main__':
             choice = input(f"\n'{file}' için seçim (1-4): ").strip()
             total_count += 1
 
-            if choice == '1' and upload_yakit(file):
+            if choice == '1' and yukle(upload_yakit, file, 'yakit'):
                 success_count += 1
-            elif choice == '2' and upload_agirlik(file):
+            elif choice == '2' and yukle(upload_agirlik, file, 'agirlik'):
                 success_count += 1
-            elif choice == '3' and upload_arac_takip(file):
+            elif choice == '3' and yukle(upload_arac_takip, file, 'arac_takip'):
                 success_count += 1
 
+    if success_count:
+        print("\n📊 Aylık plaka özetleri yenileniyor...")
+        if refresh_aylik_rollup():
+            print("   ✅ plaka_aylik_rollup güncellendi")
+
     print("\n" + "="*70)
     print(f"✅ TAMAMLANDI: {success_count}/{total_count} dosya başarıyla yüklendi")
     print("="*70)
@@ -0,0 +1,286 @@
+"""
+Excel yüklemeleri için kalıcı iş kuyruğu (yerel SQLite)
+
+/api/upload-excel dosyayı UPLOAD_DIR'a kaydedip bir iş oluşturur ve hemen
+job id döner; okuma/duplicate kontrolü/yazma işini arka plandaki worker
+thread'leri yapar. İşlerin durumu ve sayaçları (okunan, eklenen, duplicate,
+atlanan, yazılamayan) upload_jobs.db dosyasında tutulur, /api/upload-status/<job_id>
+buradan okur.
+
+- Her gunicorn worker'ı UPLOAD_WORKERS kadar thread çalıştırır; bir iş
+  kira (lease) ile alınır ve çalışırken kira düzenli olarak uzatılır
+- Process ölürse (yeniden başlatma, deploy) kira süresi dolunca iş başka bir
+  worker tarafından baştan alınır. Duplicate kontrolü sayesinde daha önce
+  yazılmış satırlar tekrar eklenmez, duplicate olarak sayılır
+- JOB_MAX_ATTEMPTS denemede bitmeyen iş 'hata' olarak kapanır
+- Biten işlerin dosyaları silinir; kayıtlar JOB_KEEP_DAYS gün saklanır
+- Aynı içerikli dosya daha önce yüklendiyse iş oluşturulmaz; tamamlanan işler
+  processed_files'a hash ve blok manifesti ile kaydedilir (upload_manifest.py)
+
+Kullanım:
+    kuyruk = is_ekle(request.files['file'], 'yakit')   # {'job_id': ..., 'onceki': ...}
+    is_durumu(job_id)   # {'durum': 'calisiyor', 'total': ..., 'inserted': ..., ...}
+"""
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import logging
+from typing import Dict, Optional
+
+from upload_manifest import DosyaManifesti, dosya_kaydet
+
+logger = logging.getLogger(__name__)
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+JOBS_DB_PATH = os.environ.get('UPLOAD_JOBS_DB') or os.path.join(_BASE_DIR, 'upload_jobs.db')
+UPLOAD_DIR = os.environ.get('UPLOAD_DIR') or os.path.join(_BASE_DIR, 'uploads')
+# Process başına iş thread'i
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', '1'))
+# Kira süresi (saniye); çalışan iş bunun üçte birinde bir kirasını uzatır
+JOB_LEASE_SECONDS = float(os.environ.get('UPLOAD_JOB_LEASE', '60'))
+JOB_MAX_ATTEMPTS = 3
+JOB_KEEP_DAYS = 7
+# Boşta bekleyen worker'ın kuyruğa tekrar bakma aralığı (saniye)
+BEKLEME_ARALIGI = 5
+
+SAYACLAR = ('total', 'inserted', 'duplicates', 'skipped', 'failed')
+
+_local = threading.local()
+_start_lock = threading.Lock()
+_baslatan_pid = None
+_uyandir = threading.Event()
+
+
+def get_connection() -> sqlite3.Connection:
+    """Thread ve process başına bağlantı"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(JOBS_DB_PATH) or '.', exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS upload_jobs (
+            id TEXT PRIMARY KEY,
+            dosya_adi TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            path TEXT NOT NULL,
+            durum TEXT NOT NULL DEFAULT 'bekliyor',  -- bekliyor / calisiyor / tamamlandi / hata
+            deneme INTEGER NOT NULL DEFAULT 0,
+            kiralayan TEXT,
+            kira_bitis REAL,
+            total INTEGER NOT NULL DEFAULT 0,
+            inserted INTEGER NOT NULL DEFAULT 0,
+            duplicates INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            file_hash TEXT,
+            file_size INTEGER,
+            hata TEXT,
+            olusturma REAL NOT NULL,
+            baslama REAL,
+            bitis REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_upload_jobs_durum ON upload_jobs(durum, olusturma)')
+    kolonlar = {row['name'] for row in conn.execute('PRAGMA table_info(upload_jobs)')}
+    for kolon, tanim in (('failed', 'INTEGER NOT NULL DEFAULT 0'), ('file_hash', 'TEXT'), ('file_size', 'INTEGER')):
+        if kolon not in kolonlar:
+            conn.execute(f'ALTER TABLE upload_jobs ADD COLUMN {kolon} {tanim}')
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def is_ekle(file, file_type: str) -> Dict:
+    """
+    Yüklenen dosyayı diske kaydet (aynı geçişte MD5'i hesaplanır) ve kuyruğa iş ekle
+
+    Aynı içerikli dosya tabloya daha önce başarıyla yüklendiyse iş oluşturulmaz
+    ve {'job_id': None, 'onceki': processed_files kaydı} döner; aksi halde
+    {'job_id': ..., 'onceki': None}.
+    """
+    from excel_ingest import DOSYA_TIPLERI
+    from database import get_processed_file
+
+    baslat()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    job_id = uuid.uuid4().hex
+    uzanti = os.path.splitext(file.filename or '')[1].lower()
+    path = os.path.join(UPLOAD_DIR, f'{job_id}{uzanti}')
+    file_hash, file_size = dosya_kaydet(file.stream, path)
+
+    onceki = get_processed_file(DOSYA_TIPLERI[file_type][0], file_hash=file_hash)
+    if onceki is not None:
+        _dosyayi_sil(path)
+        return {'job_id': None, 'onceki': onceki}
+
+    get_connection().execute(
+        'INSERT INTO upload_jobs (id, dosya_adi, file_type, path, file_hash, file_size, olusturma) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (job_id, file.filename or '', file_type, path, file_hash, file_size, time.time())
+    )
+    _uyandir.set()
+    return {'job_id': job_id, 'onceki': None}
+
+
+def is_durumu(job_id: str) -> Optional[Dict]:
+    """İşin durumu ve sayaçları (iş yoksa None)"""
+    row = get_connection().execute(
+        'SELECT id, dosya_adi, file_type, durum, deneme, total, inserted, duplicates, skipped, failed, '
+        'hata, olusturma, baslama, bitis FROM upload_jobs WHERE id = ?', (job_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def _kirala(kiralayan: str) -> Optional[sqlite3.Row]:
+    """Bekleyen ya da kirası dolmuş ilk işi al"""
+    conn = get_connection()
+    simdi = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            "SELECT * FROM upload_jobs WHERE durum = 'bekliyor' OR (durum = 'calisiyor' AND kira_bitis < ?) "
+            "ORDER BY olusturma LIMIT 1", (simdi,)
+        ).fetchone()
+        if row is None:
+            conn.execute('COMMIT')
+            return None
+
+        if row['deneme'] >= JOB_MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE upload_jobs SET durum = 'hata', hata = COALESCE(hata, 'İş tamamlanamadı'), bitis = ? WHERE id = ?",
+                (simdi, row['id'])
+            )
+            conn.execute('COMMIT')
+            _dosyayi_sil(row['path'])
+            return _kirala(kiralayan)
+
+        # Yeniden alınan iş baştan işlenir; sayaçlar sıfırlanır
+        conn.execute(
+            "UPDATE upload_jobs SET durum = 'calisiyor', kiralayan = ?, kira_bitis = ?, deneme = deneme + 1, "
+            "total = 0, inserted = 0, duplicates = 0, skipped = 0, failed = 0, baslama = COALESCE(baslama, ?) WHERE id = ?",
+            (kiralayan, simdi + JOB_LEASE_SECONDS, simdi, row['id'])
+        )
+        conn.execute('COMMIT')
+        return row
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _guncelle(job_id: str, kiralayan: str, **alanlar) -> bool:
+    """Kira bizdeyse alanları yaz ve kirayı uzat; kira başkasına geçtiyse False"""
+    alanlar['kira_bitis'] = time.time() + JOB_LEASE_SECONDS
+    atama = ', '.join(f'{k} = ?' for k in alanlar)
+    cursor = get_connection().execute(
+        f'UPDATE upload_jobs SET {atama} WHERE id = ? AND kiralayan = ?',
+        (*alanlar.values(), job_id, kiralayan)
+    )
+    return cursor.rowcount == 1
+
+
+def _dosyayi_sil(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class _KiraKaybedildi(Exception):
+    pass
+
+
+def _calistir(row: sqlite3.Row, kiralayan: str):
+    from excel_ingest import DOSYA_TIPLERI, EXCEL_CHUNK_SIZE, excel_yukle
+    from database import flush_aylik_rollup, record_processed_file
+
+    job_id = row['id']
+    bitti = threading.Event()
+
+    def kalp():
+        # Parça yazımı uzun sürse de kira düşmesin
+        while not bitti.wait(JOB_LEASE_SECONDS / 3):
+            _guncelle(job_id, kiralayan)
+
+    threading.Thread(target=kalp, name=f'upload-kira-{job_id[:8]}', daemon=True).start()
+
+    def ilerleme(sonuc):
+        if not _guncelle(job_id, kiralayan, **{k: sonuc[k] for k in SAYACLAR}):
+            raise _KiraKaybedildi(job_id)
+
+    try:
+        table = DOSYA_TIPLERI[row['file_type']][0]
+        manifest = DosyaManifesti(table, EXCEL_CHUNK_SIZE)
+        with open(row['path'], 'rb') as f:
+            sonuc = excel_yukle(f, row['file_type'], chunk_size=manifest.parca_satir,
+                                ilerleme=ilerleme, manifest=manifest)
+        # Tamamı yazılan dosya kaydedilir: aynı dosya tekrar okunmaz, büyüyen dosyada sadece yeni kuyruk işlenir
+        if not sonuc['failed'] and row['file_hash']:
+            record_processed_file(row['dosya_adi'], table, sonuc['total'], file_hash=row['file_hash'],
+                                  file_size=row['file_size'], head_digest=manifest.head_digest,
+                                  manifest=manifest.ozet(sonuc))
+        _guncelle(job_id, kiralayan, durum='tamamlandi', bitis=time.time(), **{k: sonuc[k] for k in SAYACLAR})
+        logger.info(f"Upload job {job_id} ({row['dosya_adi']}) - Total: {sonuc['total']}, Inserted: {sonuc['inserted']}, "
+                    f"Duplicates: {sonuc['duplicates']}, Skipped: {sonuc['skipped']}, Failed: {sonuc['failed']}")
+    except _KiraKaybedildi:
+        logger.warning(f"Upload job {job_id}: kira başka bir worker'a geçti, bırakılıyor")
+        return
+    except Exception as e:
+        logger.error(f"Upload job {job_id} error: {e}")
+        # Okunamayan dosya tekrar denense de okunamaz; iş kapatılır
+        _guncelle(job_id, kiralayan, durum='hata', hata=str(e), bitis=time.time())
+    finally:
+        bitti.set()
+        # Yazılan parçaların aylarını (plaka_aylik_rollup) yenile; iş yarıda
+        # kalsa da eklenen satırlar tablodadır. Bekleyen ay yoksa işlem yapmaz.
+        try:
+            flush_aylik_rollup()
+        except Exception as e:
+            logger.error(f"Upload job {job_id}: aylık özet yenilenemedi: {e}")
+
+    _dosyayi_sil(row['path'])
+
+
+def _temizle():
+    """JOB_KEEP_DAYS'ten eski bitmiş işleri sil"""
+    sinir = time.time() - JOB_KEEP_DAYS * 86400
+    get_connection().execute(
+        "DELETE FROM upload_jobs WHERE durum IN ('tamamlandi', 'hata') AND bitis < ?", (sinir,)
+    )
+
+
+def _worker(sira: int):
+    kiralayan = f'{socket.gethostname()}:{os.getpid()}:{sira}'
+    _temizle()
+    while True:
+        try:
+            row = _kirala(kiralayan)
+        except Exception as e:
+            logger.error(f"Upload kuyruğu okunamadı: {e}")
+            row = None
+        if row is None:
+            _uyandir.wait(BEKLEME_ARALIGI)
+            _uyandir.clear()
+            continue
+        _calistir(row, kiralayan)
+
+
+def baslat():
+    """Bu process'in iş thread'lerini başlat (birden fazla çağrılabilir)"""
+    global _baslatan_pid
+    with _start_lock:
+        if _baslatan_pid == os.getpid():
+            return
+        # Kuyruk açılamazsa sonraki çağrı tekrar denesin
+        get_connection()
+        _baslatan_pid = os.getpid()
+        for sira in range(UPLOAD_WORKERS):
+            threading.Thread(target=_worker, args=(sira,), name=f'upload-worker-{sira}', daemon=True).start()
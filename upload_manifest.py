@@ -0,0 +1,145 @@
+"""
+Yüklenen Excel dosyaları için içerik hash'i ve satır bloğu manifestleri
+
+- Dosya diske kaydedilirken aynı geçişte MD5'i hesaplanır (excel_to_sqlite.py
+  ile aynı yöntem); aynı hash'li dosya tabloya daha önce başarıyla
+  yüklendiyse (processed_files) dosya hiç okunmaz
+- Okunan her parça BLOK_SATIR'lık bloklara bölünür ve her bloğun özeti
+  (kolon adları + satır hash'leri) manifest olarak processed_files'a yazılır
+- Sonuna satır eklenmiş bir dosya tekrar yüklendiğinde ilk bloğun özeti
+  (head_digest) ile önceki manifest bulunur; özeti aynı kalan bloklar kayıt
+  oluşturma, duplicate kontrolü ve yazma adımlarına girmez, sadece yeni
+  kuyruk işlenir
+
+Blok sınırları parça boyutuna bağlıdır; EXCEL_CHUNK_SIZE değişirse önceki
+manifestler kullanılmaz (dosya baştan işlenir, duplicate kontrolü yine çalışır).
+
+Kullanım:
+    file_hash, file_size = dosya_kaydet(request.files['file'].stream, path)
+    manifest = DosyaManifesti('yakit', EXCEL_CHUNK_SIZE)
+    excel_yukle(f, 'yakit', chunk_size=manifest.parca_satir, manifest=manifest)
+    record_processed_file(..., head_digest=manifest.head_digest, manifest=manifest.ozet(sonuc))
+"""
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BLOK_SATIR = 1000
+MANIFEST_SURUM = 1
+_OKUMA_PARCASI = 1024 * 1024
+
+
+def dosya_kaydet(stream, path: str) -> Tuple[str, int]:
+    """Stream'i path'e yaz; aynı geçişte (md5, bayt) hesapla"""
+    md5 = hashlib.md5()
+    boyut = 0
+    with open(path, 'wb') as f:
+        for parca in iter(lambda: stream.read(_OKUMA_PARCASI), b''):
+            md5.update(parca)
+            boyut += len(parca)
+            f.write(parca)
+    return md5.hexdigest(), boyut
+
+
+def dosya_hash(path: str) -> Tuple[str, int]:
+    """Diskteki dosyanın (md5, bayt) değeri"""
+    md5 = hashlib.md5()
+    boyut = 0
+    with open(path, 'rb') as f:
+        for parca in iter(lambda: f.read(_OKUMA_PARCASI), b''):
+            md5.update(parca)
+            boyut += len(parca)
+    return md5.hexdigest(), boyut
+
+
+def onceki_sonuc(kayit: Dict) -> Dict:
+    """Daha önce yüklenmiş dosyanın kaydından sayaçlar (hepsi duplicate ya da atlanan)"""
+    ozet = (kayit.get('manifest') or {}).get('sonuc') or {}
+    total = ozet.get('total', kayit.get('record_count') or 0)
+    skipped = ozet.get('skipped', 0)
+    return {'total': total, 'inserted': 0, 'duplicates': total - skipped, 'skipped': skipped, 'failed': 0}
+
+
+class DosyaManifesti:
+    """Bir yüklemenin blok özetleri; önceki yüklemeyle aynı kalan blokları bulur"""
+
+    def __init__(self, table: str, parca_satir: int):
+        self.table = table
+        self.parca_satir = parca_satir
+        # [baslangic, satir, digest, atlanan]
+        self.bloklar: List[list] = []
+        self._onceki: Optional[Dict[int, list]] = None
+        self._kolonlar: Optional[List[str]] = None
+
+    @property
+    def head_digest(self) -> Optional[str]:
+        return self.bloklar[0][2] if self.bloklar else None
+
+    def _onceki_bul(self, head_digest: str):
+        """Aynı ilk bloğa sahip son başarılı yüklemenin blokları"""
+        from database import get_processed_file
+
+        self._onceki = {}
+        kayit = get_processed_file(self.table, head_digest=head_digest)
+        manifest = (kayit or {}).get('manifest') or {}
+        if (manifest.get('surum') != MANIFEST_SURUM or manifest.get('blok_satir') != BLOK_SATIR
+                or manifest.get('parca_satir') != self.parca_satir or manifest.get('kolonlar') != self._kolonlar):
+            return
+        self._onceki = {blok[0]: blok for blok in manifest.get('bloklar', [])}
+        logger.info(f"{self.table}: önceki yükleme manifesti bulundu ({kayit.get('filename')}, "
+                    f"{len(self._onceki)} blok)")
+
+    def parca(self, baslangic: int, df: pd.DataFrame) -> Tuple[np.ndarray, int]:
+        """
+        Parçanın bloklarını manifeste ekle
+
+        (önceki yüklemede aynen bulunan satırların maskesi, bu satırlardan
+        o yüklemede boş/geçersiz sayılanlar) döndürür.
+        """
+        if self._kolonlar is None:
+            self._kolonlar = [str(c) for c in df.columns]
+        satir_hash = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        on_ek = '\x1f'.join(self._kolonlar).encode()
+
+        bilinen = np.zeros(len(df), dtype=bool)
+        atlanan = 0
+        for bas in range(0, len(df), BLOK_SATIR):
+            son = min(bas + BLOK_SATIR, len(df))
+            digest = hashlib.md5(on_ek + satir_hash[bas:son].tobytes()).hexdigest()
+            if self._onceki is None:
+                self._onceki_bul(digest)
+
+            blok = [baslangic + bas, son - bas, digest, 0]
+            onceki = self._onceki.get(blok[0])
+            if onceki is not None and onceki[1] == blok[1] and onceki[2] == digest:
+                bilinen[bas:son] = True
+                blok[3] = onceki[3]
+                atlanan += onceki[3]
+            self.bloklar.append(blok)
+        return bilinen, atlanan
+
+    def atlananlar(self, baslangic: int, konumlar):
+        """Parçada boş/geçersiz sayılan satırları (parça içi konum) bloklarına yaz"""
+        if not len(konumlar):
+            return
+        sayilar = np.bincount(np.asarray(konumlar, dtype=np.int64) // BLOK_SATIR)
+        for blok in self.bloklar:
+            sira = (blok[0] - baslangic) // BLOK_SATIR
+            if blok[0] >= baslangic and sira < len(sayilar):
+                blok[3] += int(sayilar[sira])
+
+    def ozet(self, sonuc: Dict) -> Dict:
+        """processed_files.manifest kolonuna yazılacak JSON"""
+        return {
+            'surum': MANIFEST_SURUM,
+            'blok_satir': BLOK_SATIR,
+            'parca_satir': self.parca_satir,
+            'kolonlar': self._kolonlar,
+            'sonuc': {k: sonuc[k] for k in ('total', 'inserted', 'duplicates', 'skipped')},
+            'bloklar': self.bloklar,
+        }